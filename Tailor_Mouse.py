@@ -1,48 +1,103 @@
 import streamlit as st
 import os
-from pathlib import Path
+import time
+from itertools import islice
 from trim import trim
 from crop import crop
 from crop_trim import crop_trim
+from video_probe import is_session, session_members
+from dir_scan import scan_video_files, add_to_tree, sort_tree, tree_outline, parse_excludes, DEFAULT_EXCLUDES
+from sessions import group_sessions, build_sessions
+from remux_cache import seekable_sources, DEFAULT_REMUX_LIMIT_GB, REMUX_DIR
+from duplicates import find_duplicates, dedupe_selection
+from watch_folder import render_watch_folder
+from job_pool import pool_owner
+from profiler import profiled_rerun, phase, count_widgets
 
 st.set_page_config(page_title="Video Processing", layout="wide", page_icon="data/image.jpg")
 
 st.title('Video Processing - File Browser')
 
-def get_video_files_tree(root_path):
-    """Get hierarchical structure of video files"""
-    video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v'}
+SCAN_STATUS_SECONDS = 0.25
+SCAN_PREVIEW_LINES = 40
+
+def get_video_files_tree(root_path, excludes=(), skip_special=True):
+    """Get hierarchical structure of video files, showing the folders found so far while the parallel scan runs"""
     tree = {}
-    
+    if not os.path.isdir(root_path):
+        return {}
+
+    status = st.empty()
+    folders, videos, unreadable = 0, 0, []
+    last_update = 0.0
     try:
-        root = Path(root_path)
-        if not root.exists():
-            return {}
-            
-        for item in root.rglob('*'):
-            if item.is_file() and item.suffix.lower() in video_extensions:
-                parts = item.relative_to(root).parts
-
-                current = tree
-                for part in parts[:-1]: 
-                    if part not in current:
-                        current[part] = {}
-                    current = current[part]
-                
-                if '_files' not in current:
-                    current['_files'] = []
-                current['_files'].append({
-                    'name': parts[-1],
-                    'path': str(item),
-                    'size': item.stat().st_size / (1024**2)  
-                })
+        for folder, files, error in scan_video_files(root_path, excludes, skip_hidden=skip_special, skip_outputs=skip_special):
+            folders += 1
+            if error is not None:
+                unreadable.append(os.path.relpath(folder, root_path))
+                continue
+            add_to_tree(tree, root_path, folder, files)
+            videos += len(files)
+            if time.monotonic() - last_update >= SCAN_STATUS_SECONDS:
+                last_update = time.monotonic()
+                with status.container():
+                    st.caption(f"Scanned {folders} folders, found {videos} videos - {os.path.relpath(folder, root_path)}")
+                    outline = list(islice(tree_outline(tree), SCAN_PREVIEW_LINES + 1))
+                    if len(outline) > SCAN_PREVIEW_LINES:
+                        outline[-1] = "..."
+                    st.text("\n".join(outline))
     except Exception as e:
         st.error(f"Error scanning directory: {e}")
         return {}
-    
-    return tree
+    finally:
+        status.empty()
+
+    if unreadable:
+        st.warning(f"Could not read {len(unreadable)} folders: " + ", ".join(unreadable[:10]))
+    return sort_tree(tree)
+
+def tree_files(tree):
+    """Every file entry in a scanned tree"""
+    for key, value in tree.items():
+        if key == '_files':
+            yield from value
+        else:
+            yield from tree_files(value)
+
+def render_file_row(file_info, copies=None):
+    """One selectable video file; returns whether it is selected"""
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        is_selected = st.checkbox(
+            f"🎬 {file_info['name']}" + (" ⚠️ duplicate" if copies else ""), 
+            key=f"file_{file_info['path']}",
+            help=("Identical copy of: " + ", ".join(copies)) if copies else None
+        )
+    with col2:
+        st.write(f"{file_info['size']:.1f} MB")
+    with col3:
+        if st.button("ℹ️", key=f"info_{file_info['path']}", help="File info"):
+            st.info(f"Path: {file_info['path']}")
+    count_widgets(2)
+    return is_selected
+
+def render_session_row(name, files):
+    """Rolled-over files of one recording, selected together as a single session"""
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        is_selected = st.checkbox(
+            f"🎞️ {name} ({len(files)} files)",
+            key=f"session_{files[0]['path']}"
+        )
+    with col2:
+        st.write(f"{sum(f['size'] for f in files):.1f} MB")
+    with col3:
+        if st.button("ℹ️", key=f"session_info_{files[0]['path']}", help="Session files"):
+            st.info(f"{files[0]['name']} … {files[-1]['name']}")
+    count_widgets(2)
+    return is_selected
 
-def render_directory_tree(tree, path_prefix="", level=0):
+def render_directory_tree(tree, path_prefix="", level=0, sessions=False, duplicates=None):
     """Render the directory tree with checkboxes"""
     selected_files = []
     
@@ -50,21 +105,16 @@ def render_directory_tree(tree, path_prefix="", level=0):
         if key == '_files':
             if value: 
                 st.write("📁 **Files in this directory:**")
-                for file_info in value:
-                    col1, col2, col3 = st.columns([3, 1, 1])
-                    with col1:
-                        is_selected = st.checkbox(
-                            f"🎬 {file_info['name']}", 
-                            key=f"file_{file_info['path']}"
-                        )
-                    with col2:
-                        st.write(f"{file_info['size']:.1f} MB")
-                    with col3:
-                        if st.button("ℹ️", key=f"info_{file_info['path']}", help="File info"):
-                            st.info(f"Path: {file_info['path']}")
+                by_path = {file_info['path']: file_info for file_info in value}
+                groups = group_sessions(list(by_path)) if sessions else [(None, [path]) for path in by_path]
+                for name, paths in groups:
+                    if len(paths) > 1:
+                        is_selected = render_session_row(name, [by_path[path] for path in paths])
+                    else:
+                        is_selected = render_file_row(by_path[paths[0]], (duplicates or {}).get(paths[0]))
                     
                     if is_selected:
-                        selected_files.append(file_info['path'])
+                        selected_files.extend(paths)
         else:
             indent = "　" * level
             
@@ -81,12 +131,13 @@ def render_directory_tree(tree, path_prefix="", level=0):
                            help="Expand/Collapse"):
                     st.session_state[folder_key] = not st.session_state[folder_key]
                     st.rerun()
+            count_widgets()
             
             if st.session_state[folder_key]:
                 with st.container():
                     st.markdown(f'<div style="margin-left: {(level + 1) * 20}px; border-left: 2px solid #f0f0f0; padding-left: 10px;">', 
                               unsafe_allow_html=True)
-                    sub_selected = render_directory_tree(value, f"{path_prefix}/{key}", level + 1)
+                    sub_selected = render_directory_tree(value, f"{path_prefix}/{key}", level + 1, sessions, duplicates)
                     selected_files.extend(sub_selected)
                     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -100,143 +151,226 @@ def format_file_size(size_bytes):
         size_bytes /= 1024.0
     return f"{size_bytes:.1f} PB"
 
-if 'processing' not in st.session_state:
-    st.session_state.processing = False
-if 'selected_files_for_processing' not in st.session_state:
-    st.session_state.selected_files_for_processing = []
-if 'processing_type' not in st.session_state:
-    st.session_state.processing_type = ""
+with profiled_rerun():
+    if 'processing' not in st.session_state:
+        st.session_state.processing = False
+    if 'selected_files_for_processing' not in st.session_state:
+        st.session_state.selected_files_for_processing = []
+    if 'processing_type' not in st.session_state:
+        st.session_state.processing_type = ""
 
-if st.session_state.processing:
-    st.header('Processing Videos')
+    if st.session_state.processing:
+        st.header('Processing Videos')
     
-    selected_files = st.session_state.selected_files_for_processing
-    processing_type = st.session_state.processing_type
+        selected_files = st.session_state.selected_files_for_processing
+        processing_type = st.session_state.processing_type
     
-    st.info(f"Processing {len(selected_files)} files with **{processing_type}** operation")
+        st.info(f"Processing {len(selected_files)} files with **{processing_type}** operation")
+        for warning in st.session_state.get('processing_warnings', []):
+            st.warning(warning)
     
-    with st.container():
-        st.subheader("Files being processed:")
+        with st.container():
+            st.subheader("Files being processed:")
         
-        for i, file_path in enumerate(selected_files):
-            col_file1, col_file2 = st.columns([3, 1])
-            with col_file1:
-                st.write(f"**{i+1}.** `{os.path.basename(file_path)}`")
-            with col_file2:
-                st.write(f"{os.path.dirname(file_path)}")
+            for i, file_path in enumerate(selected_files):
+                col_file1, col_file2 = st.columns([3, 1])
+                if is_session(file_path):
+                    members = session_members(file_path)
+                    with col_file1:
+                        st.write(f"**{i+1}.** `{os.path.basename(file_path)}` (session of {len(members)} files)")
+                    with col_file2:
+                        st.write(f"{os.path.dirname(members[0][0]) if members else ''}")
+                    continue
+                with col_file1:
+                    st.write(f"**{i+1}.** `{os.path.basename(file_path)}`")
+                with col_file2:
+                    st.write(f"{os.path.dirname(file_path)}")
     
-    st.markdown("---")
+        st.markdown("---")
     
-    try:
-        progress_container = st.empty()
+        try:
+            progress_container = st.empty()
         
-        with st.spinner(f"Processing {len(selected_files)} files..."):
-            if processing_type == 'Crop':
-                crop(selected_files)
-            elif processing_type == 'Trim':
-                trim(selected_files)
-            elif processing_type == 'Crop and Trim':
-                crop_trim(selected_files)
+            with st.spinner(f"Processing {len(selected_files)} files..."), phase(f"{processing_type} page"):
+                if processing_type == 'Crop':
+                    crop(selected_files)
+                elif processing_type == 'Trim':
+                    trim(selected_files)
+                elif processing_type == 'Crop and Trim':
+                    crop_trim(selected_files)
         
         
-        col_back1, col_back2, col_back3 = st.columns([1, 2, 1])
-        with col_back2:
-            if st.button("Back to File Browser", type="primary", use_container_width=True):
-                st.session_state.processing = False
-                st.session_state.selected_files_for_processing = []
-                st.session_state.current_path = st.session_state.get('last_path', "/home/user/videos")
-                st.rerun()
+            col_back1, col_back2, col_back3 = st.columns([1, 2, 1])
+            with col_back2:
+                if st.button("Back to File Browser", type="primary", use_container_width=True):
+                    st.session_state.processing = False
+                    st.session_state.selected_files_for_processing = []
+                    st.session_state.current_path = st.session_state.get('last_path', "/home/user/videos")
+                    st.rerun()
             
 
-    except Exception as e:
-        st.error(f"Processing error: {str(e)}")
+        except Exception as e:
+            st.error(f"Processing error: {str(e)}")
         
-        col_back1, col_back2, col_back3 = st.columns([1, 2, 1])
-        with col_back2:
-            if st.button("Back to File Browser", type="primary", use_container_width=True):
-                st.session_state.processing = False
-                st.session_state.selected_files_for_processing = []
-                st.session_state.current_path = st.session_state.get('last_path', "/home/user/videos")
-                st.rerun()
+            col_back1, col_back2, col_back3 = st.columns([1, 2, 1])
+            with col_back2:
+                if st.button("Back to File Browser", type="primary", use_container_width=True):
+                    st.session_state.processing = False
+                    st.session_state.selected_files_for_processing = []
+                    st.session_state.current_path = st.session_state.get('last_path', "/home/user/videos")
+                    st.rerun()
 
-else:
-    col1, col2 = st.columns([1, 2])
+    else:
+        col1, col2 = st.columns([1, 2])
 
-    with col1:
-        st.header('Processing Options')
-        crop_trim_selected = st.radio('Processing Options', ['Crop', 'Trim', 'Crop and Trim'])
+        with col1:
+            st.header('Processing Options')
+            crop_trim_selected = st.radio('Processing Options', ['Crop', 'Trim', 'Crop and Trim', 'Watch Folder'])
         
-        st.header('Directory Settings')
+            st.header('Directory Settings')
         
-        default_path = st.text_input(
-            "Root directory path:", 
-            value="/home/user/videos",
-            help="Enter the root path to scan for video files"
-        )
+            default_path = st.text_input(
+                "Root directory path:", 
+                value="/home/user/videos",
+                help="Enter the root path to scan for video files, or the folder to watch in Watch Folder mode"
+            )
         
-        scan_button = st.button("Scan Directory", type="primary")
+            group_into_sessions = st.checkbox(
+                "Group rolled-over recordings into sessions", value=False,
+                help="Files in one folder that differ only by a trailing counter or timestamp (cam1_001.mp4, cam1_002.mp4, ...) "
+                     "are processed as one continuous recording, so bins and crops span the whole session"
+            )
 
-    with col2:
-        st.header('Video File Browser')
+            remux_sources = st.checkbox(
+                "Remux poorly indexed recordings for fast seeking", value=True,
+                help="AVI and WMV files without a seek index, FLV and MPEG streams are copied once into an indexed "
+                     "Matroska file in the remux cache folder, so every bin and frame seeks straight to its start "
+                     "instead of reading the file from the beginning"
+            )
+            if remux_sources:
+                remux_dir = st.text_input("Remux cache folder", REMUX_DIR,
+                                          help="Put this on a disk with room for copies of your legacy recordings")
+                remux_limit_gb = st.number_input("Remux cache size limit (GB)", 1, 100000, DEFAULT_REMUX_LIMIT_GB, format="%d")
+
+            exclude_text = st.text_input(
+                "Exclude folders", value=DEFAULT_EXCLUDES,
+                help="Comma separated folder names or patterns that are not scanned, e.g. output folders or backups"
+            )
+            skip_special = st.checkbox(
+                "Skip hidden and output folders", value=True,
+                help="Leaves out folders whose names start with a dot and folders holding a run manifest"
+            )
         
-        if 'current_path' not in st.session_state:
-            st.session_state.current_path = default_path
+            scan_button = st.button("Scan Directory", type="primary")
+
+        with col2:
+            if crop_trim_selected == 'Watch Folder':
+                st.header('Watch Folder')
+                render_watch_folder(default_path)
+            else:
+                st.header('Video File Browser')
         
-        if scan_button:
-            st.session_state.current_path = default_path
+                if 'current_path' not in st.session_state:
+                    st.session_state.current_path = default_path
         
-        current_path = st.session_state.current_path
+                if scan_button:
+                    st.session_state.current_path = default_path
         
-        if current_path:
+                current_path = st.session_state.current_path
+        
+                if current_path:
             
-            with st.spinner("Scanning directory..."):
-                video_tree = get_video_files_tree(current_path)
+                    excludes = parse_excludes(exclude_text)
+                    scan_key = (current_path, tuple(excludes), skip_special)
+                    if scan_button or st.session_state.get('scan_key') != scan_key:
+                        with st.spinner("Scanning directory..."), phase("scan"):
+                            st.session_state.video_tree = get_video_files_tree(current_path, excludes, skip_special)
+                            st.session_state.duplicates = find_duplicates(list(tree_files(st.session_state.video_tree)))
+                            st.session_state.scan_key = scan_key
+                    video_tree = st.session_state.video_tree
+                    duplicates = st.session_state.duplicates
             
-            if video_tree:
-                total_files = sum(len(d.get('_files', [])) for d in [video_tree] + 
-                                [v for v in video_tree.values() if isinstance(v, dict)])
+                    if video_tree:
+                        total_files = sum(len(d.get('_files', [])) for d in [video_tree] + 
+                                        [v for v in video_tree.values() if isinstance(v, dict)])
+                
+                        def count_files_recursive(tree):
+                            count = 0
+                            for key, value in tree.items():
+                                if key == '_files':
+                                    count += len(value)
+                                elif isinstance(value, dict):
+                                    count += count_files_recursive(value)
+                            return count
                 
-                def count_files_recursive(tree):
-                    count = 0
-                    for key, value in tree.items():
-                        if key == '_files':
-                            count += len(value)
-                        elif isinstance(value, dict):
-                            count += count_files_recursive(value)
-                    return count
+                        total_files = count_files_recursive(video_tree)
                 
-                total_files = count_files_recursive(video_tree)
+                        st.subheader("Select Videos to Process")
                 
-                st.subheader("Select Videos to Process")
+                        col_a, col_b, col_c = st.columns([1, 1, 2])
+                        with col_a:
+                            if st.button("Select All"):
+                                st.info("Use individual checkboxes to select files")
+                        with col_b:
+                            if st.button("Clear All"):
+                                st.rerun()
                 
-                col_a, col_b, col_c = st.columns([1, 1, 2])
-                with col_a:
-                    if st.button("Select All"):
-                        st.info("Use individual checkboxes to select files")
-                with col_b:
-                    if st.button("Clear All"):
-                        st.rerun()
+                        with phase("tree render"):
+                            selected_files = render_directory_tree(video_tree, sessions=group_into_sessions, duplicates=duplicates)
                 
-                selected_files = render_directory_tree(video_tree)
+                        selected_set = set(selected_files)
+                        possible_copies = [path for path in selected_files
+                                           if any(other in selected_set for other in duplicates.get(path, []))]
+                        skip_copies = False
+                        if possible_copies:
+                            st.warning(f"{len(possible_copies)} selected files look like copies of each other: "
+                                       + ", ".join(os.path.basename(path) for path in possible_copies))
+                            skip_copies = st.checkbox(
+                                "Skip identical copies", value=True,
+                                help="Files are compared in full when processing starts; only exact copies are skipped, "
+                                     "and files that are part of a recording session are always kept"
+                            )
                 
-                if selected_files:
-                    st.success(f"Selected {len(selected_files)} files for processing")
+                        if selected_files:
+                            st.success(f"Selected {len(selected_files)} files for processing")
                     
-                    with st.expander("Selected Files", expanded=False):
-                        for i, file_path in enumerate(selected_files, 1):
-                            st.write(f"{i}. `{file_path}`")
+                            with st.expander("Selected Files", expanded=False):
+                                for i, file_path in enumerate(selected_files, 1):
+                                    st.write(f"{i}. `{file_path}`")
                     
-                    if st.button("Process Selected Files", type="primary"):
-                        st.session_state.last_path = current_path
-                        st.session_state.processing = True
-                        st.session_state.selected_files_for_processing = selected_files.copy()
-                        st.session_state.processing_type = crop_trim_selected
-                        st.rerun()
-                else:
-                    st.info("Select video files using the checkboxes above")
+                            if st.button("Process Selected Files", type="primary"):
+                                copy_warnings = []
+                                if skip_copies:
+                                    keep = [path for _, paths in group_sessions(selected_files) if len(paths) > 1
+                                            for path in paths] if group_into_sessions else []
+                                    with st.spinner("Comparing possible copies..."):
+                                        selected_files, skipped = dedupe_selection(selected_files, duplicates, keep)
+                                    if skipped:
+                                        copy_warnings.append(f"Skipped {len(skipped)} identical copies of other selected files: "
+                                                             + ", ".join(os.path.basename(path) for path in skipped))
+                                session_errors = []
+                                if group_into_sessions:
+                                    with st.spinner("Building recording sessions..."):
+                                        selected_files, session_errors = build_sessions(selected_files)
+                                for error in session_errors:
+                                    st.error(error)
+                                remux_errors = []
+                                if remux_sources and not session_errors:
+                                    with st.spinner("Remuxing poorly indexed recordings..."):
+                                        selected_files, remux_errors = seekable_sources(
+                                            selected_files, int(remux_limit_gb) * 1024**3, remux_dir, owner=pool_owner())
+                                if not session_errors:
+                                    st.session_state.processing_warnings = copy_warnings + remux_errors
+                                    st.session_state.last_path = current_path
+                                    st.session_state.processing = True
+                                    st.session_state.selected_files_for_processing = selected_files.copy()
+                                    st.session_state.processing_type = crop_trim_selected
+                                    st.rerun()
+                        else:
+                            st.info("Select video files using the checkboxes above")
                     
-            else:
-                st.warning("No video files found in the specified directory")
-                st.info("Supported formats: MP4, AVI, MOV, MKV, WMV, FLV, WebM, M4V")
-        else:
-            st.info("Enter a directory path and click 'Scan Directory'")
+                    else:
+                        st.warning("No video files found in the specified directory")
+                        st.info("Supported formats: MP4, AVI, MOV, MKV, WMV, FLV, WebM, M4V")
+                else:
+                    st.info("Enter a directory path and click 'Scan Directory'")
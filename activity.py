@@ -0,0 +1,184 @@
+import subprocess
+import tempfile
+import ffmpeg
+import numpy as np
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import order_jobs
+from job_pool import shared_pool
+from video_probe import probe_video, describe_ffmpeg_error, source_input_kwargs
+
+ANALYSIS_WIDTH = 160
+DEFAULT_ACTIVITY_FPS = 1.0
+DEFAULT_ACTIVITY_THRESHOLD = 2.0
+CHUNK_FRAMES = 256
+SKIP_INACTIVE = "Skip inactive bins"
+CHEAP_INACTIVE = "Encode inactive bins with a fast, low-quality profile"
+CHEAP_PROFILE = {'preset': 'ultrafast', 'crf': 35}
+
+
+def render_activity_options(key_prefix):
+    """Sidebar controls for the activity pre-pass; None when disabled"""
+    st.sidebar.subheader("Activity Filter")
+    enabled = st.sidebar.checkbox(
+        "Detect inactive bins before encoding",
+        value=False,
+        key=f"{key_prefix}_activity",
+        help="Decodes a low-resolution, low-fps copy of each source and measures frame-to-frame change per bin"
+    )
+    if not enabled:
+        return None
+    threshold = st.sidebar.number_input(
+        "Activity threshold (mean pixel change, 0-255)", 0.0, 255.0, DEFAULT_ACTIVITY_THRESHOLD, step=0.1,
+        key=f"{key_prefix}_activity_threshold"
+    )
+    fps = st.sidebar.number_input(
+        "Analysis frame rate (fps)", 0.1, 10.0, DEFAULT_ACTIVITY_FPS, step=0.1,
+        key=f"{key_prefix}_activity_fps"
+    )
+    action = st.sidebar.radio("Bins below the threshold:", [SKIP_INACTIVE, CHEAP_INACTIVE], key=f"{key_prefix}_activity_action")
+    return {'threshold': float(threshold), 'fps': float(fps), 'action': action}
+
+
+def analysis_regions(crops, width, height, frame_w, frame_h):
+    """Map crop boxes (or the full frame for None) to analysis-frame slices"""
+    scale_x = frame_w / width
+    scale_y = frame_h / height
+    regions = {}
+    for crop in crops:
+        if crop is None:
+            regions[None] = (0, 0, frame_w, frame_h)
+            continue
+        x0 = min(frame_w - 1, int(crop['x'] * scale_x))
+        y0 = min(frame_h - 1, int(crop['y'] * scale_y))
+        x1 = max(x0 + 1, int(round((crop['x'] + crop['w']) * scale_x)))
+        y1 = max(y0 + 1, int(round((crop['y'] + crop['h']) * scale_y)))
+        regions[crop_key(crop)] = (x0, y0, x1, y1)
+    return regions
+
+
+def crop_key(crop):
+    return None if crop is None else (crop['x'], crop['y'], crop['w'], crop['h'])
+
+
+def measure_activity(path, crops=(None,), fps=DEFAULT_ACTIVITY_FPS, analysis_width=ANALYSIS_WIDTH):
+    """Frame-to-frame change over time for each crop region, from one low-resolution decode.
+
+    Returns (times, {crop_key: scores}) where scores[i] is the mean absolute
+    grayscale difference between the analysis frames ending at times[i].
+    Raises ffmpeg.Error if the decode fails part way, so a damaged source is
+    never scored from the frames read before the failure.
+    """
+    info = probe_video(path)
+    scale = min(1.0, analysis_width / info['width'])
+    frame_w = max(2, int(info['width'] * scale) // 2 * 2)
+    frame_h = max(2, int(info['height'] * scale) // 2 * 2)
+    regions = analysis_regions(crops, info['width'], info['height'], frame_w, frame_h)
+
+    args = (
+        ffmpeg.input(path, **source_input_kwargs(path))
+        .filter('fps', fps)
+        .filter('scale', frame_w, frame_h)
+        .output('pipe:', format='rawvideo', pix_fmt='gray')
+        .global_args('-loglevel', 'error')
+        .compile()
+    )
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr)
+
+    frame_bytes = frame_w * frame_h
+    scores = {key: [] for key in regions}
+    previous = None
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * CHUNK_FRAMES)
+            count = len(data) // frame_bytes
+            if count == 0:
+                break
+            frames = np.frombuffer(data, np.uint8, count * frame_bytes).reshape(count, frame_h, frame_w).astype(np.int16)
+            if previous is not None:
+                frames = np.concatenate([previous[None], frames])
+            diffs = np.abs(np.diff(frames, axis=0))
+            for key, (x0, y0, x1, y1) in regions.items():
+                scores[key].append(diffs[:, y0:y1, x0:x1].mean(axis=(1, 2)))
+            previous = frames[-1]
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr.seek(0)
+        error_output = stderr.read()
+        stderr.close()
+    if process.returncode:
+        raise ffmpeg.Error('ffmpeg', b'', error_output)
+
+    scores = {key: np.concatenate(values) if values else np.zeros(0) for key, values in scores.items()}
+    times = np.arange(1, len(next(iter(scores.values()))) + 1) / fps
+    return times, scores
+
+
+def window_activity(times, scores, windows):
+    """Mean score inside each (start, end) window, vectorized with a cumulative sum; NaN for windows without samples"""
+    windows = np.asarray(windows, dtype=np.float64).reshape(-1, 2)
+    cumulative = np.concatenate([[0.0], np.cumsum(scores)])
+    lo = np.searchsorted(times, windows[:, 0], side='left')
+    hi = np.searchsorted(times, windows[:, 1], side='right')
+    counts = hi - lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (cumulative[hi] - cumulative[lo]) / counts
+    return np.where(counts > 0, means, np.nan)
+
+
+def mark_activity(jobs, threshold, fps=DEFAULT_ACTIVITY_FPS, max_workers=2, owner=None):
+    """Set job['activity'] and job['inactive'] for every job; returns {source: error} for sources that could not be measured.
+
+    With an owner, each decode waits for a slot in the server-wide job pool.
+    """
+    by_source = order_jobs(jobs)
+
+    def measure(source):
+        crops = {crop_key(job['crop']): job['crop'] for job in by_source[source]}
+        return measure_activity(source, list(crops.values()), fps)
+
+    if owner is not None:
+        measure = shared_pool().wrap(owner, measure)
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {source: executor.submit(measure, source) for source in by_source}
+        for source, future in futures.items():
+            try:
+                times, scores = future.result()
+            except Exception as e:
+                errors[source] = describe_ffmpeg_error(e)
+                continue
+            for job in by_source[source]:
+                start = job['start'] or 0.0
+                end = start + job['duration'] if job['duration'] is not None else np.inf
+                activity = float(window_activity(times, scores[crop_key(job['crop'])], [(start, end)])[0])
+                job['activity'] = activity
+                job['inactive'] = not np.isnan(activity) and activity < threshold
+    return errors
+
+
+def apply_activity_filter(jobs, options, max_workers=2, owner=None):
+    """Measure activity and skip or downgrade inactive jobs; returns (jobs_to_run, inactive_jobs, errors)"""
+    errors = mark_activity(jobs, options['threshold'], options['fps'], max_workers, owner)
+    inactive_jobs = [job for job in jobs if job.get('inactive')]
+    if options['action'] == SKIP_INACTIVE:
+        return [job for job in jobs if not job.get('inactive')], inactive_jobs, errors
+    for job in inactive_jobs:
+        job['output_kwargs'].update(CHEAP_PROFILE)
+    return jobs, inactive_jobs, errors
+
+
+def render_activity_report(jobs, inactive_jobs, errors, options):
+    for source, error in errors.items():
+        st.warning(f"Could not measure activity in {source}, encoding all of its bins: {error}")
+    verb = "skipping" if options['action'] == SKIP_INACTIVE else "encoding with the fast profile"
+    st.info(f"{len(inactive_jobs)} of {len(jobs)} bins fall below activity {options['threshold']:.1f}, {verb}")
+    if inactive_jobs:
+        with st.expander("Inactive bins", expanded=False):
+            st.dataframe([
+                {"Source": job['source'], "Bin": job['label'], "Activity": f"{job['activity']:.2f}"}
+                for job in inactive_jobs
+            ], use_container_width=True, hide_index=True)
@@ -0,0 +1,191 @@
+import os
+import ffmpeg
+import numpy as np
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image, ImageDraw
+from crop_boxes import even_crop_box
+from job_pool import shared_pool, pool_owner
+from video_probe import init_probe_state, probe_videos, store_probe_result, describe_ffmpeg_error, source_input_kwargs
+
+ANALYSIS_WIDTH = 640
+DEFAULT_SAMPLE_FRAMES = 5
+MIN_CAGE_FRACTION = 0.05
+MIN_CELL_FILL = 0.3
+BOX_MARGIN_FRACTION = 0.02
+DETECTION_WORKERS = 4
+
+
+def sample_frames(path, duration, width, height, num_frames=DEFAULT_SAMPLE_FRAMES, analysis_width=ANALYSIS_WIDTH):
+    """Decode evenly spaced grayscale frames at analysis resolution, as a (n, h, w) uint8 array"""
+    scale = min(1.0, analysis_width / width)
+    frame_w = max(2, int(width * scale) // 2 * 2)
+    frame_h = max(2, int(height * scale) // 2 * 2)
+
+    frames = []
+    for t in np.linspace(0, duration, num_frames + 2)[1:-1]:
+        out, _ = (
+            ffmpeg.input(path, ss=float(t), **source_input_kwargs(path))
+            .filter('scale', frame_w, frame_h)
+            .output('pipe:', vframes=1, format='rawvideo', pix_fmt='gray')
+            .run(capture_stdout=True, quiet=True)
+        )
+        if len(out) == frame_w * frame_h:
+            frames.append(np.frombuffer(out, np.uint8).reshape(frame_h, frame_w))
+
+    if not frames:
+        raise ValueError("Could not decode any frames")
+    return np.stack(frames)
+
+
+def otsu_threshold(image):
+    hist = np.bincount(image.ravel(), minlength=256).astype(np.float64)
+    prob = hist / hist.sum()
+    omega = np.cumsum(prob)
+    mu = np.cumsum(prob * np.arange(256))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between_var = (mu[-1] * omega - mu) ** 2 / (omega * (1 - omega))
+    return int(np.nanargmax(between_var))
+
+
+def find_runs(active, min_length):
+    """(start, end) index pairs of consecutive True runs at least min_length long"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) >= min_length
+    return list(zip(starts[keep], ends[keep]))
+
+
+def arena_mask(frames):
+    """Foreground mask of the cages from the per-pixel median of the sampled frames"""
+    background = np.median(frames, axis=0).astype(np.uint8)
+    mask = background > otsu_threshold(background)
+    border = np.concatenate([mask[0], mask[-1], mask[:, 0], mask[:, -1]])
+    if border.mean() > 0.5:
+        mask = ~mask
+    return background, mask
+
+
+def detect_cages(frames):
+    """Propose one box per cage, ordered row by row, in analysis-frame pixels"""
+    background, mask = arena_mask(frames)
+    height, width = mask.shape
+
+    col_profile = mask.mean(axis=0)
+    row_profile = mask.mean(axis=1)
+    col_runs = find_runs(col_profile > 0.5 * col_profile.max(), MIN_CAGE_FRACTION * width)
+    row_runs = find_runs(row_profile > 0.5 * row_profile.max(), MIN_CAGE_FRACTION * height)
+
+    boxes = []
+    for r0, r1 in row_runs:
+        for c0, c1 in col_runs:
+            cell = mask[r0:r1, c0:c1]
+            if cell.mean() < MIN_CELL_FILL:
+                continue
+            rows = np.flatnonzero(cell.any(axis=1))
+            cols = np.flatnonzero(cell.any(axis=0))
+            boxes.append((c0 + cols[0], r0 + rows[0], cols[-1] - cols[0] + 1, rows[-1] - rows[0] + 1))
+    return background, boxes
+
+
+def propose_crops(path, duration, width, height, num_frames=DEFAULT_SAMPLE_FRAMES):
+    """Detected cage boxes in source pixels, plus a preview image with the proposals drawn on it"""
+    frames = sample_frames(path, duration, width, height, num_frames)
+    background, boxes = detect_cages(frames)
+    scale_x = width / frames.shape[2]
+    scale_y = height / frames.shape[1]
+
+    crops = []
+    for x, y, w, h in boxes:
+        margin_x = w * BOX_MARGIN_FRACTION
+        margin_y = h * BOX_MARGIN_FRACTION
+        crops.append(even_crop_box(
+            (x - margin_x) * scale_x, (y - margin_y) * scale_y,
+            (w + 2 * margin_x) * scale_x, (h + 2 * margin_y) * scale_y,
+            width, height
+        ))
+
+    preview = Image.fromarray(background).convert('RGB')
+    draw = ImageDraw.Draw(preview)
+    for i, (x, y, w, h) in enumerate(boxes, 1):
+        draw.rectangle([x, y, x + w - 1, y + h - 1], outline=(0, 0, 255), width=2)
+        draw.text((x + 4, y + 4), str(i), fill=(255, 0, 0))
+    return crops, preview
+
+
+def assign_mouse_ids(existing_ids, crops):
+    """Keep the user's mouse IDs when they match the number of cages, otherwise number cages 1..N"""
+    ids = sorted(existing_ids) if len(existing_ids) == len(crops) else list(range(1, len(crops) + 1))
+    return {str(mouse_id): crop for mouse_id, crop in zip(ids, crops)}
+
+
+def render_arena_detection(temp_file_paths, key_prefix):
+    """Sidebar action that fills crop_settings for every selected video from detected cages"""
+    init_probe_state()
+    if 'arena_previews' not in st.session_state:
+        st.session_state.arena_previews = {}
+
+    st.sidebar.subheader("Automatic Cage Detection")
+    num_frames = st.sidebar.number_input(
+        "Frames to sample per video", 1, 50, DEFAULT_SAMPLE_FRAMES,
+        key=f"{key_prefix}_arena_frames", format="%d"
+    )
+    if not st.sidebar.button("Detect Cages in All Videos", key=f"{key_prefix}_detect_arenas"):
+        return
+
+    unprobed = [path for path in temp_file_paths if os.path.basename(path) not in st.session_state.video_resolutions]
+    for path, info, error in probe_videos(unprobed):
+        store_probe_result(path, info, error)
+
+    propose = shared_pool().wrap(pool_owner(st.session_state.get(f"{key_prefix}_pool_user", "")), propose_crops)
+    progress = st.sidebar.progress(0)
+    detected = 0
+    problems = []
+    with ThreadPoolExecutor(max_workers=DETECTION_WORKERS) as executor:
+        futures = {}
+        for path in temp_file_paths:
+            name = os.path.basename(path)
+            if name not in st.session_state.video_resolutions:
+                problems.append(f"Cage detection skipped for {name}: {st.session_state.probe_errors.get(name, 'unknown resolution')}")
+                continue
+            width, height = st.session_state.video_resolutions[name]
+            duration = st.session_state.video_durations[name]
+            futures[executor.submit(propose, path, duration, width, height, int(num_frames))] = path
+
+        for completed, future in enumerate(as_completed(futures), 1):
+            name = os.path.basename(futures[future])
+            progress.progress(completed / len(futures))
+            try:
+                crops, preview = future.result()
+            except Exception as e:
+                problems.append(f"Cage detection failed for {name}: {describe_ffmpeg_error(e)}")
+                continue
+            if not crops:
+                problems.append(f"No cages detected in {name}")
+                continue
+
+            existing = st.session_state.crop_settings.get(name, {})
+            existing_ids = [int(mid) for mid in existing if mid.isdigit()]
+            st.session_state.crop_settings[name] = assign_mouse_ids(existing_ids, crops)
+            st.session_state.arena_previews[name] = preview
+            st.session_state[f"reset_mouse_ids_{name}"] = True
+            detected += 1
+
+    st.session_state[f"{key_prefix}_arena_message"] = {
+        'summary': f"Proposed crops for {detected}/{len(temp_file_paths)} videos. Review them below and adjust any mouse with the cropper.",
+        'problems': problems,
+    }
+    st.rerun()
+
+
+def render_arena_preview(video_name, key_prefix):
+    """Show the detected cage proposals of the selected video for confirmation"""
+    message = st.session_state.pop(f"{key_prefix}_arena_message", None)
+    if message:
+        st.success(message['summary'])
+        for problem in message['problems']:
+            st.warning(problem)
+    preview = st.session_state.get('arena_previews', {}).get(video_name)
+    if preview is not None:
+        with st.expander(f"Detected cages in {video_name}", expanded=True):
+            st.image(preview, caption="Boxes are numbered in mouse ID order", use_container_width=True)
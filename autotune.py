@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import math
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import itertools
+from collections import Counter
+from video_probe import probe_video
+
+AUTOTUNE_FILE = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "autotune.json")
+AUTOTUNE_WINDOW_SECONDS = 30
+CPU_BUSY_TARGET = 0.85
+IOWAIT_HIGH = 0.25
+MIN_GAIN = 0.05
+PROGRESS_TAIL_BYTES = 4096
+PROGRESS_FRAME = re.compile(rb'^frame=(\d+)', re.M)
+
+_file_lock = threading.Lock()
+
+
+def cpu_times():
+    """(total, idle, iowait) jiffies from /proc/stat; None where it is not available"""
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(value) for value in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    return sum(fields[:8]), fields[3], fields[4] if len(fields) > 4 else 0
+
+
+def cpu_usage(before, after):
+    """Busy and I/O wait fractions of all CPUs between two cpu_times samples"""
+    if before is None or after is None or after[0] <= before[0]:
+        return None, None
+    total = after[0] - before[0]
+    idle = after[1] - before[1]
+    iowait = after[2] - before[2]
+    return 1 - (idle + iowait) / total, iowait / total
+
+
+def workload_key(jobs):
+    """Coarse description of a batch: the most common kind of job and its crop size"""
+    kinds = Counter()
+    for job in jobs:
+        kind = "export" if job['export'] else job['output_kwargs'].get('vcodec', 'encode')
+        crop = job['crop']
+        size = f"crop{int(round(math.sqrt(crop['w'] * crop['h']), -2))}" if crop else "full"
+        kinds[f"{kind}:{size}"] += 1
+    return kinds.most_common(1)[0][0] if kinds else "empty"
+
+
+def is_x264_encode(job):
+    """Whether a job runs one libx264 encode through run_job, the only kind that takes ffmpeg threads and progress"""
+    return not job['export'] and job['output_kwargs'].get('vcodec') == 'libx264'
+
+
+def frames_done(progress_path):
+    """Last frame count ffmpeg wrote to a -progress file; 0 before it has written one"""
+    try:
+        with open(progress_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - PROGRESS_TAIL_BYTES))
+            frames = PROGRESS_FRAME.findall(f.read())
+    except OSError:
+        return 0
+    return int(frames[-1]) if frames else 0
+
+
+def host_key(workload):
+    return f"{socket.gethostname()}|{workload}"
+
+
+def load_tuned():
+    try:
+        with open(AUTOTUNE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def recorded_settings(workload):
+    """Settings picked on an earlier run of this workload on this host, or None"""
+    return load_tuned().get(host_key(workload))
+
+
+def host_settings():
+    """{workload: settings} recorded for this host"""
+    prefix = f"{socket.gethostname()}|"
+    return {key[len(prefix):]: value for key, value in load_tuned().items() if key.startswith(prefix)}
+
+
+class Autotuner:
+    """Adjusts how many jobs run at once to maximize the pixels encoded per second.
+
+    Every AUTOTUNE_WINDOW_SECONDS it looks at the work done in the window
+    and at CPU and I/O wait. It backs off while the disks or the network
+    share are the bottleneck, adds a job while CPUs sit idle, and undoes an
+    added job that did not raise throughput by at least MIN_GAIN. Each
+    libx264 job's ffmpeg gets an equal share of the cores.
+
+    Work is counted as it happens: libx264 encodes report their frame count
+    through ffmpeg's -progress file, and other jobs have their pixels spread
+    evenly over their wall time once they finish, so long bins do not make
+    throughput jump between windows. The best setting seen is recorded per
+    host and workload and used as the next run's starting point.
+    """
+
+    def __init__(self, jobs, start_jobs, max_jobs=None):
+        self.workload = workload_key(jobs)
+        self.max_jobs = max(1, max_jobs or os.cpu_count() or 1, start_jobs)
+        recorded = recorded_settings(self.workload)
+        self.limit = min(self.max_jobs, max(1, recorded['jobs'] if recorded else start_jobs))
+        self.ceiling = self.max_jobs
+        self.sources = {}
+        self.running = {}
+        self.windows = []
+        self.pending_step = None
+        self.lock = threading.Lock()
+        self.progress_dir = tempfile.mkdtemp(prefix="tailor_mouse_progress_")
+        self.progress_ids = itertools.count()
+        self._start_window()
+
+    @property
+    def threads(self):
+        return max(1, (os.cpu_count() or 1) // self.limit)
+
+    def _start_window(self):
+        self.window = {'start': time.monotonic(), 'end': None, 'limit': self.limit, 'work': 0.0}
+        self.cpu_sample = cpu_times()
+
+    def _source_info(self, source):
+        if source not in self.sources:
+            try:
+                self.sources[source] = probe_video(source)
+            except Exception:
+                self.sources[source] = {}
+        return self.sources[source]
+
+    def frame_pixels(self, job):
+        crop = job['crop']
+        if crop:
+            return crop['w'] * crop['h']
+        info = self._source_info(job['source'])
+        return info.get('width', 1) * info.get('height', 1)
+
+    def job_work(self, job):
+        """Pixels a job has to encode"""
+        info = self._source_info(job['source'])
+        duration = job['duration'] if job['duration'] is not None else info.get('duration', 0)
+        return duration * (info.get('fps') or 1) * self.frame_pixels(job)
+
+    def _spread(self, work, started, finished):
+        """Credit work done between two times to the windows it overlapped, in proportion to the overlap"""
+        span = max(finished - started, 1e-6)
+        for window in self.windows + [self.window]:
+            end = window['end'] if window['end'] is not None else finished
+            overlap = min(end, finished) - max(window['start'], started)
+            if overlap > 0:
+                window['work'] += work * overlap / span
+
+    def run(self, run, job):
+        """Run a job with this tuner's settings, counting the work it does"""
+        state = {'started': time.monotonic(), 'progress': None, 'credited': 0.0,
+                 'frame_pixels': self.frame_pixels(job), 'work': self.job_work(job)}
+        if is_x264_encode(job):
+            state['progress'] = os.path.join(self.progress_dir, f"{next(self.progress_ids)}.txt")
+            job = dict(job, output_kwargs=dict(job['output_kwargs'], threads=self.threads), progress=state['progress'])
+        with self.lock:
+            self.running[id(state)] = state
+        try:
+            result = run(job)
+        except BaseException:
+            with self.lock:
+                del self.running[id(state)]
+            raise
+        with self.lock:
+            del self.running[id(state)]
+            remaining = max(0.0, state['work'] - state['credited'])
+            if state['credited']:
+                self.window['work'] += remaining
+            else:
+                self._spread(remaining, state['started'], time.monotonic())
+        return result
+
+    def _collect_progress(self):
+        for state in self.running.values():
+            if state['progress']:
+                done = min(state['work'], frames_done(state['progress']) * state['frame_pixels'])
+                self.window['work'] += max(0.0, done - state['credited'])
+                state['credited'] = max(state['credited'], done)
+
+    def _decide(self, rate, busy, iowait):
+        if self.pending_step is not None and rate is not None:
+            step, rate_before = self.pending_step
+            self.pending_step = None
+            if step > 0 and rate_before and rate < rate_before * (1 + MIN_GAIN):
+                self.ceiling = self.limit - 1
+                return -1
+        if iowait is not None and iowait > IOWAIT_HIGH and self.limit > 1:
+            return -1
+        if busy is not None and busy < CPU_BUSY_TARGET and self.limit < self.ceiling and self.pending_step is None:
+            return 1
+        return 0
+
+    def observe(self):
+        """Called every few seconds while jobs run; returns True when the job limit changed"""
+        now = time.monotonic()
+        elapsed = now - self.window['start']
+        if elapsed < AUTOTUNE_WINDOW_SECONDS:
+            return False
+        busy, iowait = cpu_usage(self.cpu_sample, cpu_times())
+        with self.lock:
+            self._collect_progress()
+            self.window['end'] = now
+            self.windows.append(self.window)
+            rate = self.window['work'] / elapsed if self.window['work'] else None
+
+            step = self._decide(rate, busy, iowait)
+            if step:
+                if step > 0:
+                    self.pending_step = (step, rate)
+                self.limit = min(self.max_jobs, max(1, self.limit + step))
+            self._start_window()
+        return bool(step)
+
+    def rates(self):
+        """Best throughput seen at each job limit, in pixels per second"""
+        rates = {}
+        for window in self.windows:
+            if window['work']:
+                rate = window['work'] / (window['end'] - window['start'])
+                rates[window['limit']] = max(rates.get(window['limit'], 0.0), rate)
+        return rates
+
+    def best(self):
+        rates = self.rates()
+        if not rates:
+            return self.limit
+        return max(rates, key=rates.get)
+
+    def save(self):
+        """Record the best setting seen for this host and workload and remove the progress files"""
+        shutil.rmtree(self.progress_dir, ignore_errors=True)
+        rates = self.rates()
+        if not rates:
+            return
+        jobs = max(rates, key=rates.get)
+        with _file_lock:
+            tuned = load_tuned()
+            tuned[host_key(self.workload)] = {
+                'jobs': jobs,
+                'threads': max(1, (os.cpu_count() or 1) // jobs),
+                'pixels_per_second': round(rates[jobs]),
+                'updated': time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            os.makedirs(os.path.dirname(AUTOTUNE_FILE), exist_ok=True)
+            partial_path = AUTOTUNE_FILE + ".partial"
+            with open(partial_path, 'w') as f:
+                json.dump(tuned, f, indent=2, sort_keys=True)
+            os.replace(partial_path, AUTOTUNE_FILE)
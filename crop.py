@@ -1,10 +1,27 @@
 import streamlit as st
 import os
-import ffmpeg
 import zipfile
 from streamlit_cropper import st_cropper
 from PIL import Image
 import tempfile
+from encoding import render_encoding_options
+from jobs import build_job, run_job
+from rig_configs import render_save_rig, rig_config
+from frame_export import render_output_format, export_output_path, run_frame_export, export_files
+from mosaic import render_mosaic_option, mosaic_tiles, write_mosaic_sidecars
+from manifest import write_manifest
+from preview import render_preview, preview_target
+from scheduler import render_scheduler_options, run_jobs
+from profiler import phase, count_fs_calls
+from job_pool import render_queue_status
+from staging import render_staging_options, ScratchStager
+from verify import render_failure_report
+from output_cache import render_cache_options, OutputCache
+from packet_index import frame_input
+from crop_boxes import make_proxy_image, proxy_box_to_source
+from arena_detection import render_arena_detection, render_arena_preview
+from crop_qa import render_crop_qa, render_crop_qa_sheets
+from video_probe import render_probed_table, probe_columns, file_size_mb, init_probe_state, describe_ffmpeg_error, probe_video
 
 
 def crop(temp_file_paths):
@@ -21,8 +38,10 @@ def crop(temp_file_paths):
         if 'frame_images' not in st.session_state:
             st.session_state.frame_images = {}
 
-        if 'video_durations' not in st.session_state:
-            st.session_state.video_durations = {}
+        if 'frame_source_sizes' not in st.session_state:
+            st.session_state.frame_source_sizes = {}
+
+        init_probe_state()
 
         st.header(f"Uploaded Files ({len(temp_file_paths)})")
         
@@ -40,6 +59,9 @@ def crop(temp_file_paths):
         selected_video_path = temp_file_paths[selected_idx]
         selected_video_name = os.path.basename(selected_video_path)
 
+        render_arena_detection(temp_file_paths, "crop")
+        render_crop_qa(temp_file_paths, "crop")
+
         st.sidebar.subheader("Mouse IDs Setup")
         
         saved_mouse_ids = []
@@ -48,6 +70,9 @@ def crop(temp_file_paths):
         
         input_key = f"mouse_ids_{selected_video_name}"
         
+        if st.session_state.pop(f"reset_{input_key}", False):
+            st.session_state.pop(input_key, None)
+        
         if input_key in st.session_state and st.session_state[input_key]:
             default_mouse_ids_str = st.session_state[input_key]
         else:
@@ -76,54 +101,45 @@ def crop(temp_file_paths):
             if str(mid) not in st.session_state.crop_settings[selected_video_name]:
                 st.session_state.crop_settings[selected_video_name][str(mid)] = None
 
-        def render_file_info_table():
-            file_info_data = []
-            for path in temp_file_paths:
-                file_name = os.path.basename(path)
-                try:
-                    size_mb = os.path.getsize(path) / (1024 * 1024)
-                except:
-                    size_mb = 0
-
-                try:
-                    if file_name not in st.session_state.video_durations:
-                        duration_val = float(ffmpeg.probe(path)['format']['duration'])
-                        st.session_state.video_durations[file_name] = duration_val
-                    else:
-                        duration_val = st.session_state.video_durations[file_name]
-                    duration_str = f"{duration_val:.1f}s"
-                except:
-                    duration_str = "Unknown"
+        def build_file_info_row(path):
+            file_name = os.path.basename(path)
+            size_mb = file_size_mb(path)
 
-                crops_dict = st.session_state.crop_settings.get(file_name, {})
-                
-                if file_name == selected_video_name:
-                    total_crops = len(mouse_ids)
-                    set_mice = []
-                    for m in sorted(mouse_ids):
-                        if crops_dict.get(str(m)) is not None:
-                            set_mice.append(f"Mouse {m}")
-                    crops_set = len(set_mice)
-                else:
-                    crops_set = sum(1 for c in crops_dict.values() if c is not None)
-                    total_crops = len(crops_dict) if crops_dict else 0
-                    set_mice = [f"Mouse {m}" for m in sorted([int(mid) for mid in crops_dict.keys() if mid.isdigit()]) if crops_dict[str(m)] is not None]
-                
-                if set_mice:
-                    crops_detail = f"{crops_set}/{total_crops} ({', '.join(set_mice)})"
-                else:
-                    crops_detail = f"{crops_set}/{total_crops}"
-
-                file_info_data.append({
-                    "File Name": file_name,
-                    "Size (MB)": f"{size_mb:.1f}",
-                    "Duration": duration_str,
-                    "Crops Set": crops_detail
-                })
+            crops_dict = st.session_state.crop_settings.get(file_name, {})
+            
+            if file_name == selected_video_name:
+                total_crops = len(mouse_ids)
+                set_mice = []
+                for m in sorted(mouse_ids):
+                    if crops_dict.get(str(m)) is not None:
+                        set_mice.append(f"Mouse {m}")
+                crops_set = len(set_mice)
+            else:
+                crops_set = sum(1 for c in crops_dict.values() if c is not None)
+                total_crops = len(crops_dict) if crops_dict else 0
+                set_mice = [f"Mouse {m}" for m in sorted([int(mid) for mid in crops_dict.keys() if mid.isdigit()]) if crops_dict[str(m)] is not None]
+            
+            if set_mice:
+                crops_detail = f"{crops_set}/{total_crops} ({', '.join(set_mice)})"
+            else:
+                crops_detail = f"{crops_set}/{total_crops}"
+
+            probe_info = probe_columns(file_name)
+            return {
+                "File Name": file_name,
+                "Size (MB)": f"{size_mb:.1f}",
+                "Duration": probe_info["Duration"],
+                "Resolution": probe_info["Resolution"],
+                "Crops Set": crops_detail,
+                "Status": probe_info["Status"]
+            }
 
-            st.dataframe(file_info_data, use_container_width=True, hide_index=True)
+        def render_file_info_table():
+            render_probed_table(temp_file_paths, build_file_info_row)
 
         render_file_info_table()
+        render_arena_preview(selected_video_name, "crop")
+        render_crop_qa_sheets("crop")
 
         st.sidebar.markdown("---")
         
@@ -133,7 +149,7 @@ def crop(temp_file_paths):
 
         try:
             if selected_video_name not in st.session_state.video_durations:
-                duration = float(ffmpeg.probe(selected_video_path)['format']['duration'])
+                duration = probe_video(selected_video_path)['duration']
                 st.session_state.video_durations[selected_video_name] = duration
             else:
                 duration = st.session_state.video_durations[selected_video_name]
@@ -158,14 +174,14 @@ def crop(temp_file_paths):
             temp_frame_path = tempfile.mktemp(suffix='.jpg')
             try:
                 (
-                    ffmpeg
-                    .input(selected_video_path, ss=frame_time)
+                    frame_input(selected_video_path, frame_time)
                     .output(temp_frame_path, vframes=1, format='image2', vcodec='mjpeg')
                     .overwrite_output()
                     .run(quiet=True)
                 )
                 frame_image = Image.open(temp_frame_path)
-                st.session_state.frame_images[selected_video_name] = frame_image.copy()
+                st.session_state.frame_images[selected_video_name] = make_proxy_image(frame_image)
+                st.session_state.frame_source_sizes[selected_video_name] = frame_image.size
                 st.session_state[f"frame_extracted_{selected_video_name}"] = True
                 frame_image.close()
             except Exception as e:
@@ -176,23 +192,23 @@ def crop(temp_file_paths):
 
         if st.session_state.get(f"frame_extracted_{selected_video_name}", False):
             st.subheader(f"Draw Crop Box for Mouse {selected_mouse_id}")
-            crop_box = st_cropper(
-                st.session_state.frame_images[selected_video_name],
-                realtime_update=True,
-                box_color='#0000FF',
-                aspect_ratio=None,
-                return_type='box',
-            )
+            with phase("cropper"):
+                crop_box = st_cropper(
+                    st.session_state.frame_images[selected_video_name],
+                    realtime_update=True,
+                    box_color='#0000FF',
+                    aspect_ratio=None,
+                    return_type='box',
+                )
 
             if st.button("Set Crop for This Mouse"):
                 try:
                     if crop_box and all(k in crop_box for k in ['left', 'top', 'width', 'height']):
-                        crop_data = {
-                            'x': int(round(crop_box['left'])),
-                            'y': int(round(crop_box['top'])),
-                            'w': int(round(crop_box['width'])),
-                            'h': int(round(crop_box['height']))
-                        }
+                        proxy_image = st.session_state.frame_images[selected_video_name]
+                        crop_data = proxy_box_to_source(
+                            crop_box, proxy_image.size,
+                            st.session_state.frame_source_sizes.get(selected_video_name, proxy_image.size)
+                        )
                         
                         if selected_video_name not in st.session_state.crop_settings:
                             st.session_state.crop_settings[selected_video_name] = {}
@@ -214,7 +230,9 @@ def crop(temp_file_paths):
         
         folder_exists = os.path.exists(OUTPUT_DIR)
         if folder_exists:
-            existing_files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.mp4')]
+            with phase("output folder scan"):
+                existing_files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.mp4')]
+                count_fs_calls()
             if existing_files:
                 st.sidebar.warning(f"Folder exists with {len(existing_files)} video files!")
                 overwrite_option = st.sidebar.radio(
@@ -235,6 +253,14 @@ def crop(temp_file_paths):
         else:
             final_output_dir = OUTPUT_DIR
 
+        with phase("sidebar options"):
+            encoding_options = render_encoding_options("crop")
+            export_options = render_output_format("crop")
+            mosaic = render_mosaic_option("crop") if not export_options else False
+            scheduler_options = render_scheduler_options("crop")
+            staging_options = render_staging_options("crop")
+            cache_options = render_cache_options("crop")
+
         st.sidebar.subheader("File Naming")
         
         if "prefix_settings" not in st.session_state:
@@ -297,6 +323,17 @@ def crop(temp_file_paths):
             st.sidebar.info("Please ensure each video has a unique prefix, or use different mouse IDs for videos with the same prefix.")
             duplicate_found = True
 
+        render_save_rig(rig_config(crops=st.session_state.crop_settings.get(selected_video_name), encoding=encoding_options), "crop")
+
+        st.sidebar.subheader("Preview")
+        preview_targets = []
+        for path in temp_file_paths:
+            video_name = os.path.basename(path)
+            for mid, crop_data in st.session_state.crop_settings.get(video_name, {}).items():
+                if crop_data and mid.isdigit() and (video_name != selected_video_name or int(mid) in mouse_ids):
+                    preview_targets.append(preview_target(f"{video_name} Mouse {mid}", path, crop_data))
+        render_preview(preview_targets, "crop", scheduler_options['max_workers'], scheduler_options['owner'])
+
         st.sidebar.markdown("---")
         
         st.sidebar.header("4. Process Videos")
@@ -318,6 +355,8 @@ def crop(temp_file_paths):
             else:
                 st.subheader("Cropping Process")
                 output_files = []
+                jobs = []
+                job_status = {}
                 
                 used_filenames = set()
 
@@ -338,6 +377,34 @@ def crop(temp_file_paths):
 
                     st.write(f"**Processing {video_name}** with mice: {current_mouse_ids}")
 
+                    if mosaic:
+                        crops_dict = st.session_state.crop_settings.get(video_name, {})
+                        tiles = mosaic_tiles({str(mid): crops_dict.get(str(mid)) for mid in current_mouse_ids})
+                        if not tiles:
+                            st.warning(f"Skipping {video_name}: no crops defined.")
+                            continue
+
+                        base_filename = f'{video_prefix}_mosaic.mp4'
+                        output_filename = base_filename
+                        counter = 1
+                        while output_filename in used_filenames:
+                            output_filename = f"{os.path.splitext(base_filename)[0]}_{counter}.mp4"
+                            counter += 1
+                        used_filenames.add(output_filename)
+                        output_file = os.path.join(final_output_dir, output_filename)
+
+                        st.write(f"**{video_name}** → {output_filename} ({len(tiles)} mice tiled)")
+                        status_text = st.empty()
+                        status_text.info(f"Queued {video_name} mosaic")
+                        job_status[output_file] = status_text
+
+                        jobs.append(build_job(
+                            video_path, output_file, f"{video_name} mosaic", output_kwargs={'vcodec': 'libx264', 'an': None},
+                            encoding=encoding_options, tiles=tiles
+                        ))
+                        st.write("---")
+                        continue
+
                     for mouse_id in current_mouse_ids:
                         crop_data = st.session_state.crop_settings.get(video_name, {}).get(str(mouse_id))
                         
@@ -356,41 +423,84 @@ def crop(temp_file_paths):
                         
                         used_filenames.add(output_filename)
                         output_file = os.path.join(final_output_dir, output_filename)
+                        if export_options:
+                            output_file = export_output_path(output_file)
+                            output_filename = os.path.basename(output_file)
 
                         st.write(f"**{video_name} (Mouse {mouse_id})** → {output_filename}")
                         st.write(f"Cropping to {crop_data['w']}x{crop_data['h']} at ({crop_data['x']}, {crop_data['y']})")
 
-                        progress_bar = st.progress(0)
                         status_text = st.empty()
-                        status_text.info(f"Processing {video_name} Mouse {mouse_id}...")
+                        status_text.info(f"Queued {video_name} Mouse {mouse_id}")
+                        job_status[output_file] = status_text
 
-                        try:
-                            (
-                                ffmpeg
-                                .input(video_path)
-                                .filter('crop', crop_data['w'], crop_data['h'], crop_data['x'], crop_data['y'])
-                                .output(output_file, vcodec='libx264', acodec='aac', an=None)
-                                .overwrite_output()
-                                .run(quiet=True)
-                            )
-
-                            output_files.append(output_file)
-                            progress_bar.progress(1.0)
-                            status_text.success(f"Completed {video_name} Mouse {mouse_id}")
-
-                        except Exception as e:
-                            status_text.error(f"Error cropping {video_name} Mouse {mouse_id}: {str(e)}")
+                        jobs.append(build_job(
+                            video_path, output_file, f"{video_name} Mouse {mouse_id}", crop=crop_data,
+                            output_kwargs={'vcodec': 'libx264', 'acodec': 'aac', 'an': None},
+                            encoding=encoding_options, export=export_options, mouse_id=mouse_id
+                        ))
 
                         st.write("---")
 
+                progress_bar = st.progress(0)
+                cache = OutputCache(**cache_options) if cache_options else None
+                reused_jobs = []
+                if cache and jobs:
+                    jobs, reused_jobs = cache.reuse(jobs, "run_job")
+                    for job in reused_jobs:
+                        output_files.append(job['output'])
+                        job_status[job['output']].success(f"Reused {job['label']} from the output cache")
+                    if reused_jobs:
+                        st.info(f"{len(reused_jobs)} outputs reused from the output cache")
+                    if not jobs:
+                        progress_bar.progress(1.0)
+                if export_options and staging_options:
+                    st.info("Local scratch staging is not used for .npy frame export")
+                stager = ScratchStager(jobs, **staging_options) if staging_options and not export_options else None
+                run = run_frame_export if export_options else (stager.run if stager else run_job)
+                queue_status = st.empty()
+                on_wait = lambda: render_queue_status(queue_status, scheduler_options['owner'])
+                failures = []
+                finished_jobs = run_jobs(jobs, run=run, on_wait=on_wait,
+                                         wait_published=stager.wait_published if stager else None,
+                                         job_done=stager.job_done if stager else None, **scheduler_options)
+                for completed, (job, error) in enumerate(finished_jobs, 1):
+                    if error is None:
+                        output_files.append(job['output'])
+                        job_status[job['output']].success(f"Completed {job['label']}")
+                    else:
+                        failures.append((job, error))
+                        job_status[job['output']].error(f"Error cropping {job['label']}: {describe_ffmpeg_error(error)}")
+                    progress_bar.progress(completed / len(jobs))
+                queue_status.empty()
+
+                jobs_by_output = {job['output']: job for job in jobs + reused_jobs}
+                if stager:
+                    for output_path, error in stager.finish():
+                        if output_path in output_files:
+                            output_files.remove(output_path)
+                            failures.append((jobs_by_output[output_path], error))
+                        job_status[output_path].error(f"Error moving {os.path.basename(output_path)} to the output folder: {error}")
+                mosaic_sidecars = write_mosaic_sidecars(output_files, failures, jobs_by_output) if mosaic else []
+                render_failure_report(failures)
+
+                if cache:
+                    finished = set(output_files)
+                    cache.store_outputs([job for job in jobs if job['output'] in finished])
+
                 st.write(f"**Total files processed: {len(output_files)}**")
 
-                total_size_mb = sum(os.path.getsize(f) for f in output_files) / (1024 * 1024)
+                if output_files:
+                    manifest_path = write_manifest([jobs_by_output[f] for f in output_files], final_output_dir)
+                    st.info(f"Run manifest written to: {manifest_path}")
+
+                written_files = [f for output in output_files for f in (export_files(output) if export_options else [output])]
+                total_size_mb = sum(os.path.getsize(f) for f in written_files) / (1024 * 1024)
                 if total_size_mb >= ZIP_THRESHOLD_MB:
                     zip_name = os.path.basename(os.path.normpath(final_output_dir)) + ".zip"
                     zip_path = os.path.join(final_output_dir, zip_name)                  
                     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                        for f in output_files:
+                        for f in written_files + mosaic_sidecars:
                             zipf.write(f, os.path.basename(f))
                     st.success(f"Files zipped to: {zip_path}")
                 else:
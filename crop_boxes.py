@@ -0,0 +1,35 @@
+from PIL import Image
+
+CROPPER_DISPLAY_WIDTH = 960
+
+
+def even_crop_box(x, y, w, h, frame_width=None, frame_height=None):
+    """Clamp a crop box to the frame and round it to the even offsets and sizes libx264 needs"""
+    left = max(0, 2 * int(round(x / 2)))
+    top = max(0, 2 * int(round(y / 2)))
+    right = 2 * int(round((x + w) / 2))
+    bottom = 2 * int(round((y + h) / 2))
+    if frame_width:
+        right = min(right, frame_width - frame_width % 2)
+    if frame_height:
+        bottom = min(bottom, frame_height - frame_height % 2)
+    return {'x': left, 'y': top, 'w': max(2, right - left), 'h': max(2, bottom - top)}
+
+
+def make_proxy_image(image, max_width=CROPPER_DISPLAY_WIDTH):
+    """Downscaled copy of a frame for the cropper; the full-resolution frame is not kept"""
+    if image.width <= max_width:
+        return image.copy()
+    height = max(1, round(image.height * max_width / image.width))
+    return image.resize((max_width, height), Image.LANCZOS)
+
+
+def proxy_box_to_source(box, proxy_size, source_size):
+    """Map a cropper box on the proxy image back to an even crop box in source pixels"""
+    scale_x = source_size[0] / proxy_size[0]
+    scale_y = source_size[1] / proxy_size[1]
+    return even_crop_box(
+        box['left'] * scale_x, box['top'] * scale_y,
+        box['width'] * scale_x, box['height'] * scale_y,
+        source_size[0], source_size[1]
+    )
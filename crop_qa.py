@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import queue
+import threading
+import ffmpeg
+import numpy as np
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image, ImageDraw
+from frame_export import PTS_TIME_PATTERN
+from job_pool import shared_pool, pool_owner
+from video_probe import probe_videos, store_probe_result, describe_ffmpeg_error, source_input_kwargs
+
+QA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "qa")
+DEFAULT_QA_SAMPLES = 12
+QA_FRAME_WIDTH = 1280
+TILE_WIDTH = 160
+TILE_HEIGHT = 120
+LABEL_WIDTH = 80
+HEADER_HEIGHT = 20
+KEYFRAME_ONLY_INTERVAL = 30
+QA_WORKERS = 4
+QA_SHEET_VERSION = 2
+
+
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+
+
+def qa_sheet_path(path, crops, num_samples):
+    """Cache file for a contact sheet, keyed by source identity, crops and sample count"""
+    stat = os.stat(path)
+    key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, crops, num_samples, TILE_WIDTH, TILE_HEIGHT,
+                      QA_SHEET_VERSION],
+                     sort_keys=True)
+    return os.path.join(QA_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:20] + ".jpg")
+
+
+def sample_select(interval):
+    """select filter expression keeping the first frame at or after the middle of each interval"""
+    half = interval / 2
+    return (f"if(isnan(prev_selected_t),gte(t,{half}),"
+            f"gt(floor((t-{half})/{interval}),floor((prev_selected_t-{half})/{interval})))")
+
+
+def decode_samples(path, duration, width, height, num_samples):
+    """Yield (time, RGB frame, scale) for evenly spaced frames, decoded in one pass over the file.
+
+    The time is the frame's own timestamp as reported by showinfo, so labels
+    stay right when only keyframes are decoded.
+    """
+    scale = min(1.0, QA_FRAME_WIDTH / width)
+    frame_w = max(2, int(width * scale) // 2 * 2)
+    frame_h = max(2, int(height * scale) // 2 * 2)
+    interval = duration / num_samples
+    input_kwargs = source_input_kwargs(path)
+    if interval >= KEYFRAME_ONLY_INTERVAL:
+        input_kwargs['skip_frame'] = 'nokey'
+
+    process = (
+        ffmpeg.input(path, **input_kwargs)
+        .filter('select', sample_select(interval))
+        .filter('showinfo')
+        .filter('scale', frame_w, frame_h)
+        .output('pipe:', vframes=num_samples, format='rawvideo', pix_fmt='rgb24', fps_mode='passthrough')
+        .global_args('-hide_banner', '-nostats')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    times = queue.Queue()
+    stderr_lines = []
+
+    def read_stderr():
+        for raw_line in process.stderr:
+            line = raw_line.decode(errors='replace')
+            match = PTS_TIME_PATTERN.search(line) if 'Parsed_showinfo' in line else None
+            if match:
+                times.put(float(match.group(1)))
+            elif 'Parsed_showinfo' not in line:
+                stderr_lines.append(line)
+        times.put(None)
+
+    stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+    stderr_reader.start()
+
+    frame_bytes = frame_w * frame_h * 3
+    try:
+        for i in range(num_samples):
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            t = times.get()
+            yield (i + 0.5) * interval if t is None else t, np.frombuffer(data, np.uint8).reshape(frame_h, frame_w, 3), scale
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr_reader.join()
+    if process.returncode not in (0, None):
+        raise ffmpeg.Error('ffmpeg', b'', "".join(stderr_lines).encode())
+
+
+def fit_tile(region):
+    """Scale a crop region to fit a tile, keeping its aspect ratio, centered on a dark background"""
+    image = Image.fromarray(region)
+    image.thumbnail((TILE_WIDTH, TILE_HEIGHT), Image.BILINEAR)
+    tile = Image.new('RGB', (TILE_WIDTH, TILE_HEIGHT), (32, 32, 32))
+    tile.paste(image, ((TILE_WIDTH - image.width) // 2, (TILE_HEIGHT - image.height) // 2))
+    return tile
+
+
+def build_contact_sheet(path, duration, width, height, crops, num_samples=DEFAULT_QA_SAMPLES):
+    """Tile every mouse's crop region (rows) at evenly spaced times (columns) into one image, cached on disk"""
+    sheet_path = qa_sheet_path(path, crops, num_samples)
+    if os.path.exists(sheet_path):
+        return sheet_path
+
+    mouse_ids = sorted(crops, key=int)
+    sheet = Image.new('RGB', (LABEL_WIDTH + num_samples * TILE_WIDTH, HEADER_HEIGHT + len(mouse_ids) * TILE_HEIGHT), 'white')
+    draw = ImageDraw.Draw(sheet)
+    for row, mouse_id in enumerate(mouse_ids):
+        draw.text((6, HEADER_HEIGHT + row * TILE_HEIGHT + TILE_HEIGHT // 2 - 6), f"Mouse {mouse_id}", fill='black')
+
+    for column, (t, frame, scale) in enumerate(decode_samples(path, duration, width, height, num_samples)):
+        x = LABEL_WIDTH + column * TILE_WIDTH
+        draw.text((x + 4, 4), format_time(t), fill='black')
+        for row, mouse_id in enumerate(mouse_ids):
+            crop = crops[mouse_id]
+            x0, y0 = int(crop['x'] * scale), int(crop['y'] * scale)
+            x1, y1 = max(x0 + 1, int((crop['x'] + crop['w']) * scale)), max(y0 + 1, int((crop['y'] + crop['h']) * scale))
+            sheet.paste(fit_tile(frame[y0:y1, x0:x1]), (x, HEADER_HEIGHT + row * TILE_HEIGHT))
+
+    os.makedirs(QA_CACHE_DIR, exist_ok=True)
+    partial_path = sheet_path + ".partial"
+    sheet.save(partial_path, format='JPEG', quality=85)
+    os.replace(partial_path, sheet_path)
+    return sheet_path
+
+
+def render_crop_qa(temp_file_paths, key_prefix):
+    """Sidebar action that builds a mice × time contact sheet of every video's crops"""
+    st.sidebar.subheader("Crop QA")
+    num_samples = st.sidebar.number_input(
+        "Time points per contact sheet", 2, 96, DEFAULT_QA_SAMPLES,
+        key=f"{key_prefix}_qa_samples", format="%d"
+    )
+    if not st.sidebar.button("Build Crop QA Sheets", key=f"{key_prefix}_build_qa"):
+        return
+
+    unprobed = [path for path in temp_file_paths if os.path.basename(path) not in st.session_state.video_resolutions]
+    for path, info, error in probe_videos(unprobed):
+        store_probe_result(path, info, error)
+
+    build = shared_pool().wrap(pool_owner(st.session_state.get(f"{key_prefix}_pool_user", "")), build_contact_sheet)
+    sheets = {}
+    problems = []
+    with st.spinner("Sampling frames across each recording..."):
+        with ThreadPoolExecutor(max_workers=QA_WORKERS) as executor:
+            futures = {}
+            for path in temp_file_paths:
+                name = os.path.basename(path)
+                crops = {mid: crop for mid, crop in st.session_state.crop_settings.get(name, {}).items() if mid.isdigit() and crop}
+                if not crops:
+                    continue
+                if name not in st.session_state.video_resolutions:
+                    problems.append(f"Crop QA skipped for {name}: {st.session_state.probe_errors.get(name, 'unknown resolution')}")
+                    continue
+                width, height = st.session_state.video_resolutions[name]
+                futures[executor.submit(build, path, st.session_state.video_durations[name],
+                                        width, height, crops, int(num_samples))] = name
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    sheets[name] = future.result()
+                except Exception as e:
+                    problems.append(f"Crop QA failed for {name}: {describe_ffmpeg_error(e)}")
+
+    st.session_state[f"{key_prefix}_qa_sheets"] = {'sheets': sheets, 'problems': problems}
+
+
+def render_crop_qa_sheets(key_prefix):
+    """Show the contact sheets built by render_crop_qa"""
+    result = st.session_state.get(f"{key_prefix}_qa_sheets")
+    if not result:
+        return
+    for problem in result['problems']:
+        st.warning(problem)
+    for name, sheet_path in sorted(result['sheets'].items()):
+        if os.path.exists(sheet_path):
+            with st.expander(f"Crop QA: {name}", expanded=len(result['sheets']) == 1):
+                st.image(sheet_path, caption="Rows are mice, columns are evenly spaced times", use_container_width=True)
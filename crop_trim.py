@@ -1,11 +1,29 @@
 import streamlit as st
 import os
-import ffmpeg
 import zipfile
 import tempfile
 import math
 from streamlit_cropper import st_cropper
 from PIL import Image
+from encoding import render_encoding_options
+from jobs import build_job, run_job
+from rig_configs import render_save_rig, rig_config
+from frame_export import render_output_format, export_output_path, run_frame_export, export_files
+from mosaic import render_mosaic_option, mosaic_tiles, write_mosaic_sidecars
+from manifest import write_manifest
+from preview import render_preview, preview_target
+from scheduler import render_scheduler_options, run_jobs
+from profiler import phase, count_fs_calls
+from job_pool import render_queue_status
+from staging import render_staging_options, ScratchStager
+from verify import render_failure_report
+from output_cache import render_cache_options, OutputCache
+from packet_index import render_index_option, build_indexes, frame_input
+from activity import render_activity_options, apply_activity_filter, render_activity_report, SKIP_INACTIVE
+from crop_boxes import make_proxy_image, proxy_box_to_source
+from arena_detection import render_arena_detection, render_arena_preview
+from crop_qa import render_crop_qa, render_crop_qa_sheets
+from video_probe import render_probed_table, probe_columns, file_size_mb, init_probe_state, describe_ffmpeg_error, probe_video
 
 def hms_to_seconds(h, m, s):
     return h * 3600 + m * 60 + s
@@ -24,9 +42,10 @@ def crop_trim(temp_file_paths):
     ZIP_THRESHOLD_MB = 500
 
     try:
-        for state_key in ['crop_settings', 'frame_images', 'video_durations', 'video_settings', 'prefix_settings']:
+        for state_key in ['crop_settings', 'frame_images', 'frame_source_sizes', 'video_durations', 'video_settings', 'prefix_settings']:
             if state_key not in st.session_state:
                 st.session_state[state_key] = {}
+        init_probe_state()
 
         st.header("Uploaded Files Info")
         
@@ -39,6 +58,9 @@ def crop_trim(temp_file_paths):
         selected_video_path = temp_file_paths[selected_idx]
         selected_video_name = os.path.basename(selected_video_path)
 
+        render_arena_detection(temp_file_paths, "crop_trim")
+        render_crop_qa(temp_file_paths, "crop_trim")
+
         st.sidebar.markdown("---")
         
         st.sidebar.header("2. Mouse Setup")
@@ -51,6 +73,9 @@ def crop_trim(temp_file_paths):
         
         input_key = f"mouse_ids_{selected_video_name}"
         
+        if st.session_state.pop(f"reset_{input_key}", False):
+            st.session_state.pop(input_key, None)
+        
         if input_key in st.session_state and st.session_state[input_key]:
             default_mouse_ids_str = st.session_state[input_key]
         else:
@@ -67,57 +92,51 @@ def crop_trim(temp_file_paths):
             st.sidebar.warning("Please enter at least one mouse ID.")
             return
 
-        def render_file_info_table():
-            file_info_data = []
-            for path in temp_file_paths:
-                file_name = os.path.basename(path)
-                size_mb = os.path.getsize(path) / (1024 * 1024)
-                try:
-                    if file_name not in st.session_state.video_durations:
-                        duration_val = float(ffmpeg.probe(path)['format']['duration'])
-                        st.session_state.video_durations[file_name] = duration_val
-                    else:
-                        duration_val = st.session_state.video_durations[file_name]
-                    duration_str = f"{duration_val:.1f}s"
-                except:
-                    duration_val = 0
-                    duration_str = "Unknown"
-
-                crops_dict = st.session_state.crop_settings.get(file_name, {})
-
-                if file_name == selected_video_name:
-                    total_crops = len(mouse_ids)
-                    set_mice = []
-                    for m in sorted(mouse_ids):
-                        if crops_dict.get(str(m)) is not None:
-                            set_mice.append(f"Mouse {m}")
-                    crops_set = len(set_mice)
-                else:
-                    crops_set = sum(1 for c in crops_dict.values() if c is not None)
-                    total_crops = len(crops_dict) if crops_dict else 0
-                    set_mice = [f"Mouse {m}" for m in sorted([int(mid) for mid in crops_dict.keys() if mid.isdigit()]) if crops_dict[str(m)] is not None]
-                
-                if set_mice:
-                    crops_detail = f"{crops_set}/{total_crops} ({', '.join(set_mice)})"
-                else:
-                    crops_detail = f"{crops_set}/{total_crops}"
+        def build_file_info_row(path):
+            file_name = os.path.basename(path)
+            size_mb = file_size_mb(path)
 
-                trim_config = st.session_state.video_settings.get(file_name, {})
-                start_time = hms_to_seconds(trim_config.get("start_h", 0), trim_config.get("start_m", 0), trim_config.get("start_s", 0))
-                chunk_time = hms_to_seconds(trim_config.get("chunk_h", 1), trim_config.get("chunk_m", 0), trim_config.get("chunk_s", 0))
+            crops_dict = st.session_state.crop_settings.get(file_name, {})
 
-                file_info_data.append({
-                    "File Name": file_name,
-                    "Size (MB)": f"{size_mb:.1f}",
-                    "Duration": duration_str,
-                    "Crops Set": crops_detail,
-                    "Start Time": seconds_to_hms(start_time),
-                    "Bin Duration": seconds_to_hms(chunk_time)
-                })
+            if file_name == selected_video_name:
+                total_crops = len(mouse_ids)
+                set_mice = []
+                for m in sorted(mouse_ids):
+                    if crops_dict.get(str(m)) is not None:
+                        set_mice.append(f"Mouse {m}")
+                crops_set = len(set_mice)
+            else:
+                crops_set = sum(1 for c in crops_dict.values() if c is not None)
+                total_crops = len(crops_dict) if crops_dict else 0
+                set_mice = [f"Mouse {m}" for m in sorted([int(mid) for mid in crops_dict.keys() if mid.isdigit()]) if crops_dict[str(m)] is not None]
+            
+            if set_mice:
+                crops_detail = f"{crops_set}/{total_crops} ({', '.join(set_mice)})"
+            else:
+                crops_detail = f"{crops_set}/{total_crops}"
+
+            trim_config = st.session_state.video_settings.get(file_name, {})
+            start_time = hms_to_seconds(trim_config.get("start_h", 0), trim_config.get("start_m", 0), trim_config.get("start_s", 0))
+            chunk_time = hms_to_seconds(trim_config.get("chunk_h", 1), trim_config.get("chunk_m", 0), trim_config.get("chunk_s", 0))
+
+            probe_info = probe_columns(file_name)
+            return {
+                "File Name": file_name,
+                "Size (MB)": f"{size_mb:.1f}",
+                "Duration": probe_info["Duration"],
+                "Resolution": probe_info["Resolution"],
+                "Crops Set": crops_detail,
+                "Start Time": seconds_to_hms(start_time),
+                "Bin Duration": seconds_to_hms(chunk_time),
+                "Status": probe_info["Status"]
+            }
 
-            st.dataframe(file_info_data, use_container_width=True, hide_index=True)
+        def render_file_info_table():
+            render_probed_table(temp_file_paths, build_file_info_row)
 
         render_file_info_table()
+        render_arena_preview(selected_video_name, "crop_trim")
+        render_crop_qa_sheets("crop_trim")
 
         if selected_video_name not in st.session_state.crop_settings:
             st.session_state.crop_settings[selected_video_name] = {}
@@ -140,7 +159,7 @@ def crop_trim(temp_file_paths):
 
         try:
             if selected_video_name not in st.session_state.video_durations:
-                duration = float(ffmpeg.probe(selected_video_path)['format']['duration'])
+                duration = probe_video(selected_video_path)['duration']
                 st.session_state.video_durations[selected_video_name] = duration
             else:
                 duration = st.session_state.video_durations[selected_video_name]
@@ -160,12 +179,13 @@ def crop_trim(temp_file_paths):
             temp_frame_path = tempfile.mktemp(suffix='.jpg')
             try:
                 (
-                    ffmpeg.input(selected_video_path, ss=frame_time)
+                    frame_input(selected_video_path, frame_time)
                     .output(temp_frame_path, vframes=1, format='image2', vcodec='mjpeg')
                     .overwrite_output().run(quiet=True)
                 )
                 frame_image = Image.open(temp_frame_path)
-                st.session_state.frame_images[selected_video_name] = frame_image.copy()
+                st.session_state.frame_images[selected_video_name] = make_proxy_image(frame_image)
+                st.session_state.frame_source_sizes[selected_video_name] = frame_image.size
                 st.session_state[f"frame_extracted_{selected_video_name}"] = True
                 frame_image.close()
             except Exception as e:
@@ -176,20 +196,20 @@ def crop_trim(temp_file_paths):
 
         if st.session_state.get(f"frame_extracted_{selected_video_name}", False):
             st.subheader(f"Draw Crop Box for Mouse {selected_mouse_id}")
-            crop_box = st_cropper(
-                st.session_state.frame_images[selected_video_name],
-                realtime_update=True, box_color='#0000FF', aspect_ratio=None, return_type='box',
-            )
+            with phase("cropper"):
+                crop_box = st_cropper(
+                    st.session_state.frame_images[selected_video_name],
+                    realtime_update=True, box_color='#0000FF', aspect_ratio=None, return_type='box',
+                )
 
             if st.button("Set Crop for This Mouse"):
                 try:
                     if crop_box and all(k in crop_box for k in ['left', 'top', 'width', 'height']):
-                        crop_data = {
-                            'x': int(round(crop_box['left'])),
-                            'y': int(round(crop_box['top'])),
-                            'w': int(round(crop_box['width'])),
-                            'h': int(round(crop_box['height']))
-                        }
+                        proxy_image = st.session_state.frame_images[selected_video_name]
+                        crop_data = proxy_box_to_source(
+                            crop_box, proxy_image.size,
+                            st.session_state.frame_source_sizes.get(selected_video_name, proxy_image.size)
+                        )
                         
                         if selected_video_name not in st.session_state.crop_settings:
                             st.session_state.crop_settings[selected_video_name] = {}
@@ -305,8 +325,10 @@ def crop_trim(temp_file_paths):
         folder_exists = os.path.exists(OUTPUT_DIR)
         if folder_exists:
             existing_files = []
-            for root, dirs, files in os.walk(OUTPUT_DIR):
-                existing_files.extend([f for f in files if f.endswith('.mp4')])
+            with phase("output folder scan"):
+                for root, dirs, files in os.walk(OUTPUT_DIR):
+                    existing_files.extend([f for f in files if f.endswith('.mp4')])
+                    count_fs_calls()
             
             if existing_files:
                 st.sidebar.warning(f"Folder exists with {len(existing_files)} video files!")
@@ -328,11 +350,44 @@ def crop_trim(temp_file_paths):
         else:
             final_output_dir = OUTPUT_DIR
 
+        with phase("sidebar options"):
+            encoding_options = render_encoding_options("crop_trim")
+            export_options = render_output_format("crop_trim")
+            mosaic = render_mosaic_option("crop_trim") if not export_options else False
+            scheduler_options = render_scheduler_options("crop_trim")
+            exact_timing = render_index_option("crop_trim")
+            staging_options = render_staging_options("crop_trim")
+            cache_options = render_cache_options("crop_trim")
+            activity_options = render_activity_options("crop_trim")
+
         st.sidebar.subheader("File Naming")
         
         global_prefix = st.sidebar.text_input("Output file prefix (for all videos):", "processed")
         st.sidebar.caption(f"{global_prefix}_mouseX_bin_Y.mp4 or {global_prefix}_mouseX_HY.mp4")
 
+        render_save_rig(rig_config(
+            crops=st.session_state.crop_settings.get(selected_video_name),
+            start=hms_to_seconds(start_h, start_m, start_s),
+            bin_duration=hms_to_seconds(chunk_h, chunk_m, chunk_s),
+            encoding=encoding_options
+        ), "crop_trim")
+
+        st.sidebar.subheader("Preview")
+        preview_targets = []
+        for path in temp_file_paths:
+            name = os.path.basename(path)
+            config = st.session_state.video_settings.get(name, {})
+            start_time = hms_to_seconds(config.get("start_h", 0), config.get("start_m", 0), config.get("start_s", 0))
+            bin_duration = hms_to_seconds(config.get("chunk_h", 0), config.get("chunk_m", 0), config.get("chunk_s", 0))
+            mouse_crops = [(mid, crop) for mid, crop in st.session_state.crop_settings.get(name, {}).items() if mid.isdigit() and crop]
+            for mid, crop in mouse_crops:
+                preview_targets.append(preview_target(f"{name} Mouse {mid}, start of bin 1", path, crop, start_time))
+            if mouse_crops and bin_duration > 0 and start_time + bin_duration < st.session_state.video_durations.get(name, 86400.0):
+                mid, crop = mouse_crops[0]
+                preview_targets.append(preview_target(f"{name} Mouse {mid}, bin 1 → 2 boundary", path, crop,
+                                                      start_time + bin_duration, centered=True))
+        render_preview(preview_targets, "crop_trim", scheduler_options['max_workers'], scheduler_options['owner'])
+
         st.sidebar.markdown("---")
         
         st.sidebar.header("5. Process Videos")
@@ -342,10 +397,21 @@ def crop_trim(temp_file_paths):
             
             st.subheader("Processing Videos...")
             all_output_files = []
+            jobs = []
+            video_progress = {}
+
+            indexed_durations = {}
+            if exact_timing:
+                with st.spinner("Indexing video packets..."):
+                    for path, index, error in build_indexes(temp_file_paths, scheduler_options['max_workers'], scheduler_options['owner']):
+                        if error is None:
+                            indexed_durations[path] = index['duration']
+                        else:
+                            st.warning(f"Could not index {os.path.basename(path)}, planning bins from its container duration: {error}")
 
             for video_path in temp_file_paths:
                 name = os.path.basename(video_path)
-                duration = st.session_state.video_durations.get(name, 86400.0)
+                duration = indexed_durations.get(video_path, st.session_state.video_durations.get(name, 86400.0))
                 crops = st.session_state.crop_settings.get(name, {})
                 config = st.session_state.video_settings.get(name, {})
                 
@@ -366,58 +432,147 @@ def crop_trim(temp_file_paths):
 
                 effective_duration = duration - start_time
                 num_bins = math.ceil(effective_duration / bin_duration)
-                total_operations_for_video = len(current_mouse_ids) * num_bins
                 
-                video_progress = st.progress(0)
-                video_status = st.empty()
-                operations_completed = 0
-
-                for mouse_id in current_mouse_ids:
-                    crop = crops.get(str(mouse_id))
-                    if not crop:
-                        st.warning(f"Skipping Mouse {mouse_id} in {name}: No crop data.")
-                        continue
+                progress = {'bar': st.progress(0), 'status': st.empty(), 'total': 0, 'done': 0, 'failed': 0}
 
+                if mosaic:
+                    tiles = mosaic_tiles({str(mid): crops.get(str(mid)) for mid in current_mouse_ids})
+                    video_stem = os.path.splitext(name)[0]
                     for i in range(num_bins):
                         bin_start = start_time + i * bin_duration
                         bin_end = min(bin_start + bin_duration, duration)
-                        
-                        if bin_duration == 3600: 
-                            hour_label = int(bin_start // 3600) + 1
-                            output_file = os.path.join(final_output_dir, f"{global_prefix}_mouse{mouse_id}_H{hour_label}.mp4")
+
+                        if bin_duration == 3600:
+                            output_file = os.path.join(final_output_dir, f"{global_prefix}_{video_stem}_mosaic_H{int(bin_start // 3600) + 1}.mp4")
                         else:
-                            bin_number = i + 1
-                            output_file = os.path.join(final_output_dir, f"{global_prefix}_mouse{mouse_id}_bin_{bin_number}.mp4")
-
-                        video_status.info(f"Processing Mouse {mouse_id}, bin {i+1}/{num_bins}")
-
-                        try:
-                            (
-                                ffmpeg.input(video_path, ss=bin_start, t=bin_end - bin_start)
-                                .filter('crop', crop['w'], crop['h'], crop['x'], crop['y'])
-                                .output(output_file, vcodec='libx264', acodec='aac')
-                                .overwrite_output().run(quiet=True)
-                            )
-                            all_output_files.append(output_file)
-                            operations_completed += 1
-                            
-                            video_progress.progress(operations_completed / total_operations_for_video)
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-                            operations_completed += 1
-                            video_progress.progress(operations_completed / total_operations_for_video)
-
-                video_status.success(f"Completed {name} - {operations_completed} files processed")
+                            output_file = os.path.join(final_output_dir, f"{global_prefix}_{video_stem}_mosaic_bin_{i + 1}.mp4")
+
+                        jobs.append(build_job(
+                            video_path, output_file, f"Mosaic of {len(tiles)} mice, bin {i+1}/{num_bins}",
+                            start=bin_start, duration=bin_end - bin_start,
+                            output_kwargs={'vcodec': 'libx264', 'an': None}, encoding=encoding_options,
+                            bin_index=i + 1, tiles=tiles
+                        ))
+                        progress['total'] += 1
+                else:
+                    for mouse_id in current_mouse_ids:
+                        crop = crops.get(str(mouse_id))
+                        if not crop:
+                            st.warning(f"Skipping Mouse {mouse_id} in {name}: No crop data.")
+                            continue
+
+                        for i in range(num_bins):
+                            bin_start = start_time + i * bin_duration
+                            bin_end = min(bin_start + bin_duration, duration)
+                        
+                            if bin_duration == 3600: 
+                                hour_label = int(bin_start // 3600) + 1
+                                output_file = os.path.join(final_output_dir, f"{global_prefix}_mouse{mouse_id}_H{hour_label}.mp4")
+                            else:
+                                bin_number = i + 1
+                                output_file = os.path.join(final_output_dir, f"{global_prefix}_mouse{mouse_id}_bin_{bin_number}.mp4")
+
+                            if export_options:
+                                output_file = export_output_path(output_file)
+
+                            jobs.append(build_job(
+                                video_path, output_file, f"Mouse {mouse_id}, bin {i+1}/{num_bins}",
+                                start=bin_start, duration=bin_end - bin_start, crop=crop,
+                                output_kwargs={'vcodec': 'libx264', 'acodec': 'aac'}, encoding=encoding_options,
+                                export=export_options, mouse_id=mouse_id, bin_index=i + 1
+                            ))
+                            progress['total'] += 1
+
+                if progress['total']:
+                    progress['status'].info(f"Queued {progress['total']} jobs")
+                    video_progress[video_path] = progress
                 st.write("---")
-            
-            st.success(f"All {len(all_output_files)} files processed successfully!")
 
-            total_size_mb = sum(os.path.getsize(f) for f in all_output_files) / (1024 * 1024)
+            if activity_options and jobs:
+                all_jobs = jobs
+                with st.spinner("Measuring activity in each source..."):
+                    jobs, inactive_jobs, activity_errors = apply_activity_filter(
+                        all_jobs, activity_options, scheduler_options['max_workers'], scheduler_options['owner'])
+                render_activity_report(all_jobs, inactive_jobs, activity_errors, activity_options)
+                if activity_options['action'] == SKIP_INACTIVE:
+                    for job in inactive_jobs:
+                        progress = video_progress[job['source']]
+                        progress['total'] -= 1
+                        if progress['total'] == 0:
+                            progress['bar'].progress(1.0)
+                            progress['status'].info(f"All bins of {os.path.basename(job['source'])} are inactive - skipped")
+
+            cache = OutputCache(**cache_options) if cache_options else None
+            reused_jobs = []
+            if cache and jobs:
+                jobs, reused_jobs = cache.reuse(jobs, "run_job")
+                for job in reused_jobs:
+                    all_output_files.append(job['output'])
+                    progress = video_progress[job['source']]
+                    progress['done'] += 1
+                    progress['bar'].progress(progress['done'] / progress['total'])
+                    progress['status'].info(f"Reused {job['label']} from the output cache")
+                if reused_jobs:
+                    st.info(f"{len(reused_jobs)} outputs reused from the output cache")
+
+            if export_options and staging_options:
+                st.info("Local scratch staging is not used for .npy frame export")
+            stager = ScratchStager(jobs, **staging_options) if staging_options and not export_options else None
+            run = run_frame_export if export_options else (stager.run if stager else run_job)
+            queue_status = st.empty()
+            on_wait = lambda: render_queue_status(queue_status, scheduler_options['owner'])
+            failures = []
+            for job, error in run_jobs(jobs, run=run, on_wait=on_wait,
+                                       wait_published=stager.wait_published if stager else None,
+                                       job_done=stager.job_done if stager else None, **scheduler_options):
+                progress = video_progress[job['source']]
+                progress['done'] += 1
+                progress['bar'].progress(progress['done'] / progress['total'])
+                if error is None:
+                    all_output_files.append(job['output'])
+                    progress['status'].info(f"Finished {job['label']}")
+                else:
+                    progress['failed'] += 1
+                    failures.append((job, error))
+                    st.error(f"Error in {os.path.basename(job['source'])} ({job['label']}): {describe_ffmpeg_error(error)}")
+                if progress['done'] == progress['total']:
+                    processed = progress['done'] - progress['failed']
+                    if progress['failed']:
+                        progress['status'].warning(f"Completed {os.path.basename(job['source'])} - {processed} files processed, {progress['failed']} failed")
+                    else:
+                        progress['status'].success(f"Completed {os.path.basename(job['source'])} - {processed} files processed")
+            queue_status.empty()
+
+            jobs_by_output = {job['output']: job for job in jobs + reused_jobs}
+            if stager:
+                for output_path, error in stager.finish():
+                    if output_path in all_output_files:
+                        all_output_files.remove(output_path)
+                        failures.append((jobs_by_output[output_path], error))
+                    st.error(f"Error moving {os.path.basename(output_path)} to the output folder: {error}")
+
+            if cache:
+                finished = set(all_output_files)
+                cache.store_outputs([job for job in jobs if job['output'] in finished])
+
+            mosaic_sidecars = write_mosaic_sidecars(all_output_files, failures, jobs_by_output) if mosaic else []
+
+            if failures:
+                render_failure_report(failures)
+            else:
+                st.success(f"All {len(all_output_files)} files processed successfully!")
+
+            if all_output_files:
+                manifest_path = write_manifest([jobs_by_output[f] for f in all_output_files], final_output_dir)
+                st.info(f"Run manifest written to: {manifest_path}")
+
+            written_files = [f for output in all_output_files for f in (export_files(output) if export_options else [output])]
+            total_size_mb = sum(os.path.getsize(f) for f in written_files) / (1024 * 1024)
             if total_size_mb >= ZIP_THRESHOLD_MB:
                 zip_name = os.path.basename(os.path.normpath(final_output_dir)) + ".zip"
                 zip_path = os.path.join(final_output_dir, zip_name)
                 with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for f in all_output_files:
+                    for f in written_files + mosaic_sidecars:
                         zipf.write(f, os.path.basename(f))
                 st.success(f"Videos zipped at: {zip_path}")
             else:
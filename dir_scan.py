@@ -0,0 +1,111 @@
+import os
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from video_probe import VIDEO_EXTENSIONS
+from manifest import MANIFEST_PREFIX
+from profiler import count_fs_calls
+
+SCAN_WORKERS = 16
+DEFAULT_EXCLUDES = "Cropped*, Trimmed*, CroppedTrimmed*"
+
+
+def parse_excludes(text):
+    """Folder name patterns from a comma separated list, e.g. 'Cropped*, backup'"""
+    return [pattern.strip() for pattern in text.split(',') if pattern.strip()]
+
+
+def list_directory(path, excludes=(), skip_hidden=True, skip_outputs=True):
+    """One directory's ([(subdirectory, (st_dev, st_ino))], video files), read with a single scandir.
+
+    Subdirectories matching an exclude pattern, and hidden ones with
+    skip_hidden, are left out. With skip_outputs, a folder holding a run
+    manifest is treated as an output folder: it yields nothing. Symlinked
+    folders are followed; the identities let the caller skip folders it
+    has already reached through another path.
+    """
+    subdirs, files = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if skip_hidden and entry.name.startswith('.'):
+                continue
+            if skip_outputs and entry.name.startswith(MANIFEST_PREFIX) and entry.name.endswith('.parquet'):
+                return [], []
+            if entry.is_dir():
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in excludes):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                subdirs.append((entry.path, (stat.st_dev, stat.st_ino)))
+            elif os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS and entry.is_file():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append({
+                    'name': entry.name,
+                    'path': entry.path,
+                    'size': stat.st_size / (1024**2),
+                    'bytes': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                })
+    return subdirs, files
+
+
+def scan_video_files(root_path, excludes=(), skip_hidden=True, skip_outputs=True, max_workers=SCAN_WORKERS):
+    """Walk a directory tree on a thread pool, yielding (folder path, video files, error) as each folder is read.
+
+    Every folder is listed by its own task as soon as its parent has been
+    read, so on network filesystems the round trips of sibling folders
+    overlap instead of adding up. Each folder is read once, however many
+    symlinks lead to it, so link cycles end.
+    """
+    root_stat = os.stat(root_path)
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {executor.submit(list_directory, root_path, excludes, skip_hidden, skip_outputs): root_path}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                try:
+                    subdirs, files = future.result()
+                except OSError as e:
+                    yield path, [], e
+                    continue
+                count_fs_calls(1 + len(subdirs) + len(files))
+                for subdir, identity in subdirs:
+                    if identity in visited:
+                        continue
+                    visited.add(identity)
+                    running[executor.submit(list_directory, subdir, excludes, skip_hidden, skip_outputs)] = subdir
+                yield path, files, None
+
+
+def add_to_tree(tree, root_path, folder, files):
+    """Insert a folder's files into the nested {name: subtree, '_files': [...]} tree"""
+    if not files:
+        return
+    current = tree
+    relative = os.path.relpath(folder, root_path)
+    for part in ([] if relative == '.' else relative.split(os.sep)):
+        current = current.setdefault(part, {})
+    current.setdefault('_files', []).extend(sorted(files, key=lambda file_info: file_info['name']))
+
+
+def tree_outline(tree, depth=0):
+    """Indented 'folder/ (n videos)' lines of a possibly partial tree, in name order"""
+    for name in sorted(key for key in tree if key != '_files'):
+        subtree = tree[name]
+        videos = len(subtree.get('_files', []))
+        yield "  " * depth + f"{name}/" + (f" ({videos} videos)" if videos else "")
+        yield from tree_outline(subtree, depth + 1)
+
+
+def sort_tree(tree):
+    """Copy of a tree with each folder's files first, then its subfolders by name"""
+    ordered = {'_files': tree['_files']} if '_files' in tree else {}
+    for name in sorted(key for key in tree if key != '_files'):
+        ordered[name] = sort_tree(tree[name])
+    return ordered
@@ -0,0 +1,152 @@
+import os
+import json
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from output_cache import source_fingerprint
+
+FINGERPRINT_CACHE = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "fingerprints.json")
+FINGERPRINT_WORKERS = 8
+FINGERPRINT_CACHE_ENTRIES = 100000
+FULL_HASH_BLOCK_BYTES = 8 * 1024**2
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def load_fingerprints():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                with open(FINGERPRINT_CACHE) as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                _cache = {}
+        return _cache
+
+
+def store_fingerprints(fingerprints):
+    """Add fingerprints to the cache and write it, dropping the oldest entries beyond FINGERPRINT_CACHE_ENTRIES"""
+    cache = load_fingerprints()
+    with _cache_lock:
+        cache.update(fingerprints)
+        for key in list(cache)[:max(0, len(cache) - FINGERPRINT_CACHE_ENTRIES)]:
+            del cache[key]
+        os.makedirs(os.path.dirname(FINGERPRINT_CACHE), exist_ok=True)
+        partial_path = FINGERPRINT_CACHE + ".partial"
+        with open(partial_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(partial_path, FINGERPRINT_CACHE)
+
+
+def identity_key(path, size, mtime_ns):
+    return f"{os.path.abspath(path)}|{size}|{mtime_ns}"
+
+
+def find_duplicates(files):
+    """Map each path that has identical copies to the other copies' paths.
+
+    files are dicts with 'path', 'bytes' and 'mtime_ns'. Only files that share
+    their size with another file are fingerprinted, from sampled blocks, and
+    fingerprints are cached on disk by path, size and mtime.
+    """
+    by_size = defaultdict(list)
+    for file_info in files:
+        by_size[file_info['bytes']].append(file_info)
+    candidates = [file_info for same_size in by_size.values() if len(same_size) > 1 for file_info in same_size]
+    if not candidates:
+        return {}
+
+    cache = load_fingerprints()
+    keys = {file_info['path']: identity_key(file_info['path'], file_info['bytes'], file_info['mtime_ns'])
+            for file_info in candidates}
+    missing = [path for path, key in keys.items() if key not in cache]
+    if missing:
+        def fingerprint(path):
+            try:
+                return path, source_fingerprint(path)
+            except OSError:
+                return path, None
+
+        with ThreadPoolExecutor(max_workers=min(FINGERPRINT_WORKERS, len(missing))) as executor:
+            computed = {keys[path]: digest for path, digest in executor.map(fingerprint, missing) if digest is not None}
+        store_fingerprints(computed)
+
+    by_fingerprint = defaultdict(list)
+    with _cache_lock:
+        fingerprints = {path: cache.get(key) for path, key in keys.items()}
+    for path, digest in fingerprints.items():
+        if digest is not None:
+            by_fingerprint[digest].append(path)
+    duplicates = {}
+    for paths in by_fingerprint.values():
+        for path in paths:
+            if len(paths) > 1:
+                duplicates[path] = [other for other in paths if other != path]
+    return duplicates
+
+
+def full_fingerprint(path):
+    """SHA-1 of a file's whole content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(FULL_HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def full_fingerprints(paths):
+    """Whole-content hashes of paths, cached on disk like the sampled ones; unreadable files map to None"""
+    cache = load_fingerprints()
+    keys = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        keys[path] = "full|" + identity_key(path, stat.st_size, stat.st_mtime_ns)
+    missing = [path for path, key in keys.items() if key not in cache]
+    if missing:
+        def fingerprint(path):
+            try:
+                return path, full_fingerprint(path)
+            except OSError:
+                return path, None
+
+        with ThreadPoolExecutor(max_workers=min(FINGERPRINT_WORKERS, len(missing))) as executor:
+            computed = {keys[path]: digest for path, digest in executor.map(fingerprint, missing) if digest is not None}
+        store_fingerprints(computed)
+    with _cache_lock:
+        return {path: cache.get(keys[path]) if path in keys else None for path in paths}
+
+
+def dedupe_selection(paths, duplicates, keep=()):
+    """Drop selected files that are copies of an earlier selected file; returns (kept, dropped).
+
+    duplicates come from find_duplicates' sampled fingerprints; a file is
+    only dropped once its whole content matches the earlier file's. Paths in
+    keep, such as the members of a recording session, are never dropped.
+    """
+    keep = set(keep)
+    selected = set(paths)
+    flagged = [path for path in dict.fromkeys(paths)
+               if path not in keep and any(other in selected for other in duplicates.get(path, []))]
+    candidates = set(flagged)
+    for path in flagged:
+        candidates.update(other for other in duplicates[path] if other in selected)
+    digests = full_fingerprints(sorted(candidates)) if candidates else {}
+
+    kept, dropped = [], []
+    seen_paths, seen_digests = set(), set()
+    for path in paths:
+        digest = digests.get(path)
+        if path not in keep and (path in seen_paths or (digest is not None and digest in seen_digests)):
+            dropped.append(path)
+            continue
+        kept.append(path)
+        seen_paths.add(path)
+        if digest is not None:
+            seen_digests.add(digest)
+    return kept, dropped
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import streamlit as st
+
+PARTIAL_SUFFIX = '.partial'
+SEEK_FRIENDLY_KEYFRAME_SECONDS = 1
+CONTAINER_FORMATS = {'.mp4': 'mp4', '.m4v': 'mp4', '.mov': 'mov', '.mkv': 'matroska', '.ts': 'mpegts'}
+
+
+def current_umask():
+    """The process umask, read without changing it where /proc allows, since os.umask is not thread-safe"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+OUTPUT_MODE = 0o666 & ~current_umask()
+
+
+def render_encoding_options(key_prefix):
+    """Sidebar controls for how outputs are written"""
+    fast_start = st.sidebar.checkbox(
+        "Fast-start outputs (index at front)",
+        value=True,
+        key=f"{key_prefix}_fast_start",
+        help="Moves the moov atom to the start of each file so players can begin reading without downloading it whole"
+    )
+    seek_friendly = st.sidebar.checkbox(
+        f"Seek-friendly outputs ({SEEK_FRIENDLY_KEYFRAME_SECONDS}s keyframe interval)",
+        value=False,
+        key=f"{key_prefix}_seek_friendly",
+        help="Shorter GOPs make seeking in annotation tools faster at the cost of larger files"
+    )
+    return {'fast_start': fast_start, 'seek_friendly': seek_friendly}
+
+
+def encoding_output_kwargs(fast_start=True, seek_friendly=False):
+    kwargs = {}
+    if fast_start:
+        kwargs['movflags'] = '+faststart'
+    if seek_friendly:
+        kwargs['force_key_frames'] = f"expr:gte(t,n_forced*{SEEK_FRIENDLY_KEYFRAME_SECONDS})"
+    return kwargs
+
+
+def partial_output_path(output_path):
+    """Unique hidden temp name next to the final output, so the rename stays on one filesystem.
+
+    mkstemp creates the file owner-only; it gets the mode a normally created
+    file would have, since writers overwrite it in place and the rename keeps it.
+    """
+    directory, name = os.path.split(output_path)
+    fd, partial_path = tempfile.mkstemp(prefix=f".{name}.", suffix=PARTIAL_SUFFIX, dir=directory or '.')
+    os.close(fd)
+    os.chmod(partial_path, OUTPUT_MODE)
+    return partial_path
+
+
+def run_encode(stream, output_path, fast_start=True, seek_friendly=False, quiet=True, progress=None, **output_kwargs):
+    """Encode to a temp file in the target directory and rename it into place on success.
+
+    With progress, ffmpeg keeps writing its frame count to that file while it runs.
+    """
+    partial_path = partial_output_path(output_path)
+    container = CONTAINER_FORMATS.get(os.path.splitext(output_path)[1].lower())
+    if container:
+        output_kwargs.setdefault('format', container)
+    output_kwargs.update(encoding_output_kwargs(fast_start and container != 'mpegts', seek_friendly))
+
+    try:
+        stream = stream.output(partial_path, **output_kwargs).overwrite_output()
+        if progress:
+            stream = stream.global_args('-progress', progress)
+        stream.run(quiet=quiet)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+    return output_path
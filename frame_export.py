@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import threading
+import ffmpeg
+import numpy as np
+import streamlit as st
+from jobs import job_stream
+from video_probe import probe_video
+
+MP4_FORMAT = "MP4 video"
+NPY_FORMAT = "NumPy frame chunks (.npy)"
+DEFAULT_CHUNK_FRAMES = 1000
+SIDECAR_SUFFIX = "_frames.json"
+PTS_TIME_PATTERN = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+def render_output_format(key_prefix):
+    """Sidebar controls for the output format; None for MP4, otherwise the frame export options"""
+    st.sidebar.subheader("Output Format")
+    output_format = st.sidebar.radio("Write crops as:", [MP4_FORMAT, NPY_FORMAT], key=f"{key_prefix}_output_format")
+    if output_format == MP4_FORMAT:
+        return None
+    target_width = st.sidebar.number_input(
+        "Downscale to width (px, 0 keeps crop size)", 0, 4096, 0, step=2,
+        key=f"{key_prefix}_export_width", format="%d"
+    )
+    grayscale = st.sidebar.checkbox("Grayscale", value=True, key=f"{key_prefix}_export_gray")
+    chunk_frames = st.sidebar.number_input(
+        "Frames per .npy chunk", 10, 100000, DEFAULT_CHUNK_FRAMES,
+        key=f"{key_prefix}_export_chunk", format="%d"
+    )
+    st.sidebar.caption(f"Writes <name>_chunk_00000.npy files plus a <name>{SIDECAR_SUFFIX} sidecar and <name>_index.npz")
+    return {'target_width': int(target_width), 'grayscale': grayscale, 'chunk_frames': int(chunk_frames)}
+
+
+def export_output_path(output_path):
+    """Sidecar path that stands for the export of an output that would otherwise be an MP4"""
+    return os.path.splitext(output_path)[0] + SIDECAR_SUFFIX
+
+
+def export_files(output_path):
+    """Every file an export wrote: its .npy chunks, its index and the sidecar itself"""
+    with open(output_path) as f:
+        sidecar = json.load(f)
+    directory = os.path.dirname(output_path)
+    return [os.path.join(directory, name) for name in sidecar['chunks'] + [sidecar['index']]] + [output_path]
+
+
+def export_size(width, height, target_width):
+    if not target_width or target_width >= width:
+        return width, height
+    out_w = max(2, target_width // 2 * 2)
+    out_h = max(2, int(round(height * out_w / width / 2)) * 2)
+    return out_w, out_h
+
+
+def save_array(path, array):
+    partial_path = path + ".partial"
+    with open(partial_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(partial_path, path)
+
+
+def run_frame_export(job):
+    """Decode a job's cropped window once and write it as memory-mappable .npy chunks plus a timestamp index"""
+    options = job['export']
+    info = probe_video(job['source'])
+    crop = job['crop']
+    width, height = (crop['w'], crop['h']) if crop else (info['width'], info['height'])
+    out_w, out_h = export_size(width, height, options['target_width'])
+    channels = 1 if options['grayscale'] else 3
+
+    stream = job_stream(job)
+    if (out_w, out_h) != (width, height):
+        stream = stream.filter('scale', out_w, out_h)
+    process = (
+        stream.filter('showinfo')
+        .output('pipe:', format='rawvideo', pix_fmt='gray' if channels == 1 else 'rgb24', copyts=None)
+        .global_args('-hide_banner')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    timestamps = []
+    stderr_lines = []
+
+    def read_stderr():
+        for raw_line in process.stderr:
+            line = raw_line.decode(errors='replace')
+            if 'Parsed_showinfo' in line:
+                match = PTS_TIME_PATTERN.search(line)
+                if match:
+                    timestamps.append(float(match.group(1)))
+            else:
+                stderr_lines.append(line)
+
+    stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+    stderr_reader.start()
+
+    base = job['output'][:-len(SIDECAR_SUFFIX)]
+    frame_shape = (out_h, out_w) if channels == 1 else (out_h, out_w, 3)
+    frame_bytes = out_w * out_h * channels
+    chunk_files = []
+    frame_count = 0
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * options['chunk_frames'])
+            count = len(data) // frame_bytes
+            if count == 0:
+                break
+            chunk = np.frombuffer(data, np.uint8, count * frame_bytes).reshape((count,) + frame_shape)
+            chunk_path = f"{base}_chunk_{len(chunk_files):05d}.npy"
+            save_array(chunk_path, chunk)
+            chunk_files.append(os.path.basename(chunk_path))
+            frame_count += count
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr_reader.join()
+
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', b'', "".join(stderr_lines).encode())
+
+    timestamps = np.asarray(timestamps[:frame_count], dtype=np.float64)
+    chunk_frames = options['chunk_frames']
+    positions = np.arange(frame_count)
+    fps = info.get('fps')
+    frame_index = np.round(timestamps * fps).astype(np.int64) if fps and len(timestamps) == frame_count else positions
+    index_path = f"{base}_index.npz"
+    partial_index = index_path + ".partial.npz"
+    np.savez(partial_index, timestamp=timestamps, frame_index=frame_index,
+             chunk=(positions // chunk_frames).astype(np.int32), offset=(positions % chunk_frames).astype(np.int32))
+    os.replace(partial_index, index_path)
+
+    sidecar = {
+        'source': job['source'],
+        'crop': crop,
+        'start': job['start'],
+        'duration': job['duration'],
+        'fps': fps,
+        'frame_count': frame_count,
+        'frame_shape': list(frame_shape),
+        'dtype': 'uint8',
+        'chunk_frames': chunk_frames,
+        'chunks': chunk_files,
+        'index': os.path.basename(index_path),
+    }
+    with open(job['output'] + ".partial", 'w') as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(job['output'] + ".partial", job['output'])
+    return job['output']
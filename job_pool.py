@@ -0,0 +1,128 @@
+import os
+import itertools
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+POOL_MAX_JOBS = int(os.environ.get("TAILOR_MOUSE_POOL_JOBS", max(1, (os.cpu_count() or 2) // 2)))
+POOL_USER_QUOTA = int(os.environ.get("TAILOR_MOUSE_USER_QUOTA", max(1, POOL_MAX_JOBS - 1)))
+
+
+class JobPool:
+    """Server-wide encode slots shared fairly between users.
+
+    Every job waits for a slot before it starts. When a slot frees up it goes
+    to the waiting user with the fewest running jobs (ties go to whoever was
+    served longest ago), and no user holds more than user_quota slots, so a
+    large batch cannot keep a small one waiting until it has finished.
+    """
+
+    def __init__(self, max_jobs=POOL_MAX_JOBS, user_quota=POOL_USER_QUOTA):
+        self.max_jobs = max(1, max_jobs)
+        self.user_quota = max(1, min(user_quota, self.max_jobs))
+        self.condition = threading.Condition()
+        self.running = defaultdict(int)
+        self.waiting = defaultdict(deque)
+        self.last_served = defaultdict(int)
+        self.grants = itertools.count(1)
+
+    def _next_owner(self):
+        if sum(self.running.values()) >= self.max_jobs:
+            return None
+        eligible = [owner for owner, tickets in self.waiting.items() if tickets and self.running[owner] < self.user_quota]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda owner: (self.running[owner], self.last_served[owner]))
+
+    @contextmanager
+    def slot(self, owner):
+        """Block until owner is granted a slot, and hold it for the duration of the with block"""
+        ticket = object()
+        with self.condition:
+            self.waiting[owner].append(ticket)
+            while not (self._next_owner() == owner and self.waiting[owner][0] is ticket):
+                self.condition.wait()
+            self.waiting[owner].popleft()
+            if not self.waiting[owner]:
+                del self.waiting[owner]
+            self.running[owner] += 1
+            self.last_served[owner] = next(self.grants)
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running[owner] -= 1
+                if not self.running[owner]:
+                    del self.running[owner]
+                self.condition.notify_all()
+
+    def wrap(self, owner, run):
+        """run, holding one of owner's slots while it runs; every ffmpeg call a page starts goes through here"""
+        def run_in_slot(*args, **kwargs):
+            with self.slot(owner):
+                return run(*args, **kwargs)
+        return run_in_slot
+
+    def status(self, owner):
+        """Pool-wide and per-owner counts, plus how many jobs are ahead of owner's next one"""
+        with self.condition:
+            running = dict(self.running)
+            waiting = {o: len(tickets) for o, tickets in self.waiting.items()}
+            last_served = dict(self.last_served)
+
+        ahead = 0
+        if waiting.get(owner):
+            served = defaultdict(int, running)
+            remaining = dict(waiting)
+            order = dict(last_served)
+            step = itertools.count(max(order.values(), default=0) + 1)
+            while True:
+                candidate = min((o for o, n in remaining.items() if n), key=lambda o: (served[o], order.get(o, 0)))
+                if candidate == owner:
+                    break
+                ahead += 1
+                served[candidate] += 1
+                remaining[candidate] -= 1
+                order[candidate] = next(step)
+
+        return {
+            'busy': sum(running.values()),
+            'max_jobs': self.max_jobs,
+            'users': len(set(running) | set(waiting)),
+            'running': running.get(owner, 0),
+            'queued': waiting.get(owner, 0),
+            'ahead': ahead,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """The job pool of this server process, shared by every session and watcher"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = JobPool()
+        return _pool
+
+
+def pool_owner(user_name=""):
+    """Fair-share identity: the entered user name, otherwise this browser session"""
+    if user_name.strip():
+        return f"user:{user_name.strip().lower()}"
+    ctx = get_script_run_ctx()
+    return f"session:{ctx.session_id}" if ctx else "session:unknown"
+
+
+def render_queue_status(placeholder, owner):
+    """Show the user's place in the shared queue while their jobs wait or run"""
+    status = shared_pool().status(owner)
+    text = (f"Shared job pool: {status['busy']}/{status['max_jobs']} slots busy across {status['users']} users. "
+            f"Your jobs: {status['running']} running, {status['queued']} queued")
+    if status['queued']:
+        text += f", next one has {status['ahead']} jobs ahead of it"
+    placeholder.info(text)
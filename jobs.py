@@ -0,0 +1,53 @@
+import ffmpeg
+from encoding import run_encode
+from video_probe import source_input_kwargs
+from mosaic import mosaic_layout
+
+
+def build_job(source, output, label, start=None, duration=None, crop=None, output_kwargs=None, encoding=None, export=None,
+              mouse_id=None, bin_index=None, tiles=None):
+    """Describe one ffmpeg encode: a time window of a source, optionally cropped or tiled into a mosaic"""
+    return {
+        'source': source,
+        'output': output,
+        'label': label,
+        'start': start,
+        'duration': duration,
+        'crop': crop,
+        'output_kwargs': dict(output_kwargs or {}),
+        'encoding': dict(encoding or {}),
+        'export': export,
+        'mouse_id': mouse_id,
+        'bin_index': bin_index,
+        'tiles': tiles,
+    }
+
+
+def job_stream(job):
+    input_kwargs = {}
+    if job['start'] is not None:
+        input_kwargs['ss'] = job['start']
+    if job['duration'] is not None:
+        input_kwargs['t'] = job['duration']
+
+    stream = ffmpeg.input(job['source'], **source_input_kwargs(job['source']), **input_kwargs)
+    crop = job['crop']
+    if crop:
+        stream = stream.filter('crop', crop['w'], crop['h'], crop['x'], crop['y'])
+    tiles = job['tiles']
+    if tiles:
+        width, height, positions = mosaic_layout(tiles)
+        parts = stream.filter_multi_output('split', len(tiles)) if len(tiles) > 1 else [stream]
+        crops = [parts[i].filter('crop', t['crop']['w'], t['crop']['h'], t['crop']['x'], t['crop']['y'])
+                 for i, t in enumerate(tiles)]
+        if len(crops) > 1:
+            layout = '|'.join(f"{x}_{y}" for x, y in positions)
+            stream = ffmpeg.filter(crops, 'xstack', inputs=len(crops), layout=layout, fill='black')
+        else:
+            stream = crops[0]
+        stream = stream.filter('pad', width, height, 0, 0)
+    return stream
+
+
+def run_job(job):
+    return run_encode(job_stream(job), job['output'], progress=job.get('progress'), **job['encoding'], **job['output_kwargs'])
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import pandas as pd
+from video_probe import probe_video
+from packet_index import load_index, frame_at
+
+MANIFEST_PREFIX = "manifest_"
+
+
+def manifest_rows(jobs):
+    """One row per finished job describing where its output came from and how it was made"""
+    sources = {}
+    rows = []
+    for job in jobs:
+        source = job['source']
+        if source not in sources:
+            try:
+                sources[source] = (probe_video(source), load_index(source))
+            except Exception:
+                sources[source] = ({}, None)
+        info, index = sources[source]
+        source_duration = index['duration'] if index else info.get('duration')
+        fps = info.get('fps')
+
+        start = job['start'] or 0.0
+        end = start + job['duration'] if job['duration'] is not None else source_duration
+        if end is not None and source_duration is not None:
+            end = min(end, source_duration)
+        crop = job['crop'] or {}
+        output = job['output']
+        if index:
+            start_frame = frame_at(index, start)
+            end_frame = frame_at(index, end) if end is not None else None
+        else:
+            start_frame = int(round(start * fps)) if fps else None
+            end_frame = int(round(end * fps)) if fps and end is not None else None
+
+        rows.append({
+            'output_path': output,
+            'output_name': os.path.basename(output),
+            'source_path': source,
+            'mouse_id': job.get('mouse_id'),
+            'bin_index': job.get('bin_index'),
+            'crop_x': crop.get('x'),
+            'crop_y': crop.get('y'),
+            'crop_w': crop.get('w'),
+            'crop_h': crop.get('h'),
+            'start_time': start,
+            'end_time': end,
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'duration': end - start if end is not None else None,
+            'encoder_settings': json.dumps({**job['output_kwargs'], **job['encoding']}, sort_keys=True, default=str),
+            'export_settings': json.dumps(job['export'], sort_keys=True) if job['export'] else None,
+            'mosaic_tiles': json.dumps(job['tiles'], sort_keys=True) if job.get('tiles') else None,
+            'activity': job.get('activity'),
+            'bytes': os.path.getsize(output) if os.path.exists(output) else None,
+            'wall_time': job.get('wall_time'),
+            'attempts': job.get('attempts'),
+        })
+    return rows
+
+
+def write_manifest(jobs, output_dir):
+    """Write a Parquet manifest of a run's outputs into output_dir and return its path; earlier manifests are kept"""
+    df = pd.DataFrame(manifest_rows(jobs))
+    for column in ('mouse_id', 'bin_index', 'crop_x', 'crop_y', 'crop_w', 'crop_h', 'start_frame', 'end_frame', 'bytes',
+                   'attempts'):
+        df[column] = df[column].astype('Int64')
+    for column in ('start_time', 'end_time', 'duration', 'activity', 'wall_time'):
+        df[column] = df[column].astype('float64')
+    df['created'] = pd.Timestamp.now()
+
+    stem = os.path.join(output_dir, f"{MANIFEST_PREFIX}{time.strftime('%Y%m%d_%H%M%S')}")
+    path = stem + ".parquet"
+    run = 1
+    while os.path.exists(path):
+        run += 1
+        path = f"{stem}_{run}.parquet"
+    partial_path = path + ".partial"
+    df.to_parquet(partial_path, index=False, engine='pyarrow')
+    os.replace(partial_path, path)
+    return path
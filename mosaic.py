@@ -0,0 +1,81 @@
+import os
+import json
+import math
+import streamlit as st
+
+MOSAIC_SUFFIX = "_mosaic.json"
+
+
+def render_mosaic_option(key_prefix):
+    """Sidebar control for writing every mouse of a video into one tiled video"""
+    return st.sidebar.checkbox(
+        "Mosaic: all mice in one tiled video", value=False, key=f"{key_prefix}_mosaic",
+        help="Stacks every mouse's crop into a grid that is encoded once, instead of one encode per mouse. "
+             f"A <name>{MOSAIC_SUFFIX} sidecar gives each tile's position and mouse ID, so exact per-mouse "
+             "crops can be cut from the mosaic later"
+    )
+
+
+def mosaic_tiles(crops):
+    """Tiles for the mice that have a crop, in mouse order"""
+    return sorted(({'mouse_id': int(mid), 'crop': crop} for mid, crop in crops.items() if mid.isdigit() and crop),
+                  key=lambda tile: tile['mouse_id'])
+
+
+def mosaic_layout(tiles):
+    """Place tiles top-left in equal cells of a near-square grid; returns (width, height, [(x, y)])"""
+    cell_w = max(tile['crop']['w'] for tile in tiles)
+    cell_h = max(tile['crop']['h'] for tile in tiles)
+    cell_w, cell_h = cell_w + cell_w % 2, cell_h + cell_h % 2
+    columns = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    positions = [((i % columns) * cell_w, (i // columns) * cell_h) for i in range(len(tiles))]
+    return columns * cell_w, rows * cell_h, positions
+
+
+def mosaic_sidecar_path(output_path):
+    return os.path.splitext(output_path)[0] + MOSAIC_SUFFIX
+
+
+def write_mosaic_sidecar(job):
+    """Write the tile map of a finished mosaic next to it and return the sidecar path"""
+    width, height, positions = mosaic_layout(job['tiles'])
+    sidecar = {
+        'mosaic': os.path.basename(job['output']),
+        'source': job['source'],
+        'start': job['start'],
+        'duration': job['duration'],
+        'width': width,
+        'height': height,
+        'tiles': [
+            {'mouse_id': tile['mouse_id'], 'x': x, 'y': y, 'w': tile['crop']['w'], 'h': tile['crop']['h'],
+             'source_crop': tile['crop']}
+            for tile, (x, y) in zip(job['tiles'], positions)
+        ],
+    }
+    path = mosaic_sidecar_path(job['output'])
+    partial_path = path + ".partial"
+    with open(partial_path, 'w') as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(partial_path, path)
+    return path
+
+
+def write_mosaic_sidecars(output_files, failures, jobs_by_output):
+    """Write the sidecars of the mosaics in output_files, which hold only verified outputs; returns their paths.
+
+    A mosaic whose sidecar cannot be written is moved from output_files to
+    failures, and sidecars left by earlier runs of failed mosaics are removed,
+    so every sidecar belongs to an output in the run manifest.
+    """
+    sidecars = []
+    for output in list(output_files):
+        try:
+            sidecars.append(write_mosaic_sidecar(jobs_by_output[output]))
+        except OSError as e:
+            output_files.remove(output)
+            failures.append((jobs_by_output[output], e))
+    for job, _ in failures:
+        if os.path.exists(mosaic_sidecar_path(job['output'])):
+            os.remove(mosaic_sidecar_path(job['output']))
+    return sidecars
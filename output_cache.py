@@ -0,0 +1,173 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import time
+import streamlit as st
+from encoding import partial_output_path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "cache")
+DEFAULT_CACHE_LIMIT_GB = 200
+FINGERPRINT_BLOCK_BYTES = 1024**2
+
+
+def render_cache_options(key_prefix):
+    """Sidebar controls for reusing outputs of identical earlier jobs; None when disabled"""
+    st.sidebar.subheader("Output Cache")
+    enabled = st.sidebar.checkbox(
+        "Reuse identical earlier outputs", value=False, key=f"{key_prefix}_cache",
+        help="Jobs with the same source content, crop, time window and encoder settings as an earlier one "
+             "are hard-linked (or copied) from the cache instead of being encoded again. A hard-linked output "
+             "shares its data with the cache entry, so edit a copy of it, never the file in place"
+    )
+    if not enabled:
+        return None
+    cache_dir = st.sidebar.text_input("Cache directory", DEFAULT_CACHE_DIR, key=f"{key_prefix}_cache_dir")
+    limit_gb = st.sidebar.number_input(
+        "Cache size limit (GB)", 1, 100000, DEFAULT_CACHE_LIMIT_GB,
+        key=f"{key_prefix}_cache_limit", format="%d"
+    )
+    return {'cache_dir': cache_dir, 'limit_bytes': int(limit_gb) * 1024**3}
+
+
+def source_fingerprint(path):
+    """Fast content hash: file size plus blocks from the start, middle and end"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, size // 2 - FINGERPRINT_BLOCK_BYTES // 2), max(0, size - FINGERPRINT_BLOCK_BYTES)}):
+            f.seek(offset)
+            digest.update(f.read(FINGERPRINT_BLOCK_BYTES))
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst, link=True):
+    """Place src at dst via a temp name, hard-linking with link when both are on the same filesystem"""
+    partial_path = partial_output_path(dst)
+    os.unlink(partial_path)
+    try:
+        if link:
+            try:
+                os.link(src, partial_path)
+            except OSError:
+                link = False
+        if not link:
+            shutil.copyfile(src, partial_path)
+        os.replace(partial_path, dst)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+
+
+class OutputCache:
+    """Content-addressed store of finished outputs with a size cap and least-recently-used eviction.
+
+    Entries are keyed by the source fingerprint, crop, time window, encoder
+    settings and the kind of encode that produced them. Outputs are copied into
+    the cache, so an entry never shares data with the output it came from;
+    reused outputs are hard-linked from the entry where possible and then do
+    share it. Using an entry refreshes only its access time, which linked
+    outputs would also show, and eviction removes the least recently used
+    entries first.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, limit_bytes=DEFAULT_CACHE_LIMIT_GB * 1024**3):
+        self.cache_dir = cache_dir
+        self.limit_bytes = limit_bytes
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _fingerprint(self, path):
+        stat = os.stat(path)
+        identity = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            fingerprint = self.fingerprints.get(identity)
+        if fingerprint is None:
+            fingerprint = source_fingerprint(path)
+            with self.lock:
+                self.fingerprints[identity] = fingerprint
+        return fingerprint
+
+    def job_key(self, job, variant):
+        description = {
+            'source': self._fingerprint(job['source']),
+            'start': job['start'],
+            'duration': job['duration'],
+            'crop': job['crop'],
+            'output_kwargs': job['output_kwargs'],
+            'encoding': job['encoding'],
+            'extension': os.path.splitext(job['output'])[1].lower(),
+            'variant': variant,
+        }
+        if job.get('tiles'):
+            description['tiles'] = job['tiles']
+        return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def entry_path(self, key, output):
+        return os.path.join(self.cache_dir, key[:2], key + os.path.splitext(output)[1].lower())
+
+    def touch(self, entry):
+        """Mark an entry as used now without changing its mtime"""
+        os.utime(entry, ns=(time.time_ns(), os.stat(entry).st_mtime_ns))
+
+    def fetch(self, key, output):
+        """Place a cached result at output; False if there is none"""
+        entry = self.entry_path(key, output)
+        try:
+            self.touch(entry)
+            link_or_copy(entry, output)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, output):
+        entry = self.entry_path(key, output)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        link_or_copy(output, entry, link=False)
+        self.touch(entry)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its size limit"""
+        entries = []
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.limit_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                continue
+
+    def reuse(self, jobs, variant):
+        """Satisfy jobs from the cache where possible; returns (jobs_to_run, reused_jobs)"""
+        to_run, reused = [], []
+        for job in jobs:
+            if job['export']:
+                to_run.append(job)
+                continue
+            try:
+                job['cache_key'] = self.job_key(job, variant)
+            except OSError:
+                to_run.append(job)
+                continue
+            (reused if self.fetch(job['cache_key'], job['output']) else to_run).append(job)
+        return to_run, reused
+
+    def store_outputs(self, jobs):
+        """Add the outputs of finished jobs to the cache, then evict down to the size limit"""
+        for job in jobs:
+            if job.get('cache_key') and os.path.exists(job['output']):
+                self.store(job['cache_key'], job['output'])
+        self.evict()
@@ -0,0 +1,196 @@
+import os
+import hashlib
+import tempfile
+import subprocess
+import threading
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import ffmpeg
+import numpy as np
+import streamlit as st
+from output_cache import source_fingerprint
+from job_pool import shared_pool
+from video_probe import source_input_kwargs, describe_ffmpeg_error
+
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "index")
+INDEX_VERSION = 1
+TIME_TOLERANCE = 0.001
+LOADED_INDEXES = 16
+
+_fingerprints = {}
+_build_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+
+
+def render_index_option(key_prefix):
+    """Sidebar control for planning bins from each video's packet index"""
+    return st.sidebar.checkbox(
+        "Plan bins from a packet index", value=False, key=f"{key_prefix}_packet_index",
+        help="Scans each video's packets once, cached under ~/.tailor_mouse/index, so bin counts and frame numbers "
+             "come from the real frame timestamps instead of the container duration, which can be wrong for "
+             "variable frame rate files"
+    )
+
+
+def index_path(path):
+    """Index file for a video, keyed by its content so staged copies share it"""
+    stat = os.stat(path)
+    identity = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    fingerprint = _fingerprints.get(identity)
+    if fingerprint is None:
+        fingerprint = _fingerprints[identity] = source_fingerprint(path)
+    key = hashlib.sha1(f"{fingerprint}:{INDEX_VERSION}".encode()).hexdigest()[:20]
+    return os.path.join(INDEX_DIR, key[:2], key + ".npz")
+
+
+def scan_packets(path):
+    """Frame times of the first video stream, relative to the file start, from one ffprobe pass over its packets"""
+    info = ffmpeg.probe(path, select_streams='v:0', show_entries='stream=codec_name,pix_fmt:format=start_time',
+                        **source_input_kwargs(path))
+    stream = (info.get('streams') or [{}])[0]
+    try:
+        start_time = float(info.get('format', {}).get('start_time', 0))
+    except ValueError:
+        start_time = 0.0
+
+    input_args = []
+    for key, value in source_input_kwargs(path).items():
+        input_args += [f"-{key}", str(value)]
+    # stderr goes to a file, not a pipe: a pipe nobody reads while stdout is
+    # drained would fill up on a damaged file and stall ffprobe
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,duration_time,flags',
+         '-of', 'csv=p=0', *input_args, path],
+        stdout=subprocess.PIPE, stderr=stderr_file
+    )
+    pts, durations, keyframes = array('d'), array('d'), array('d')
+    for line in process.stdout:
+        fields = line.decode(errors='replace').strip().split(',')
+        if len(fields) < 3:
+            continue
+        try:
+            t = float(fields[0]) - start_time
+        except ValueError:
+            continue
+        try:
+            durations.append(float(fields[1]))
+        except ValueError:
+            durations.append(0.0)
+        pts.append(t)
+        if 'K' in fields[2]:
+            keyframes.append(t)
+    process.wait()
+    stderr_file.seek(0)
+    stderr = stderr_file.read()
+    stderr_file.close()
+    if process.returncode:
+        raise ffmpeg.Error('ffprobe', b'', stderr)
+    if not pts:
+        raise ValueError("No video packets found")
+
+    pts, durations = np.frombuffer(pts), np.frombuffer(durations)
+    order = np.argsort(pts, kind='stable')
+    pts, durations = pts[order], durations[order]
+    frame_interval = durations[-1] or (float(np.median(np.diff(pts))) if len(pts) > 1 else 0.0)
+    return {
+        'pts': pts,
+        'keyframes': np.sort(np.frombuffer(keyframes)),
+        'duration': float(pts[-1] + frame_interval),
+        'codec_name': stream.get('codec_name', ''),
+        'pix_fmt': stream.get('pix_fmt', ''),
+    }
+
+
+@lru_cache(maxsize=LOADED_INDEXES)
+def read_index(index_file):
+    with np.load(index_file) as data:
+        return {
+            'pts': data['pts'],
+            'keyframes': data['keyframes'],
+            'duration': float(data['duration']),
+            'codec_name': str(data['codec_name']),
+            'pix_fmt': str(data['pix_fmt']),
+        }
+
+
+def load_index(path):
+    """The packet index of a video if one has been built, else None"""
+    try:
+        index_file = index_path(path)
+    except OSError:
+        return None
+    return read_index(index_file) if os.path.exists(index_file) else None
+
+
+def packet_index(path):
+    """The packet index of a video, scanning its packets the first time it is needed"""
+    index_file = index_path(path)
+    with _locks_lock:
+        lock = _build_locks[index_file]
+    with lock:
+        if not os.path.exists(index_file):
+            index = scan_packets(path)
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            partial_path = index_file + ".partial"
+            with open(partial_path, 'wb') as f:
+                np.savez(f, pts=index['pts'], keyframes=index['keyframes'], duration=index['duration'],
+                         codec_name=index['codec_name'], pix_fmt=index['pix_fmt'])
+            os.replace(partial_path, index_file)
+    return read_index(index_file)
+
+
+def frame_at(index, t):
+    """Number of the first frame shown at or after time t"""
+    return int(np.searchsorted(index['pts'], t - TIME_TOLERANCE))
+
+
+def frame_time(index, frame):
+    """Presentation time of a frame number, clamped to the last frame"""
+    return float(index['pts'][min(max(frame, 0), len(index['pts']) - 1)])
+
+
+def keyframe_before(index, t):
+    """Time of the last keyframe at or before t"""
+    keyframes = index['keyframes']
+    i = np.searchsorted(keyframes, t + TIME_TOLERANCE, side='right') - 1
+    return float(keyframes[i]) if i >= 0 else 0.0
+
+
+def keyframes_between(index, start, end):
+    """Keyframe times within [start, end]"""
+    keyframes = index['keyframes']
+    return keyframes[np.searchsorted(keyframes, start - TIME_TOLERANCE):
+                     np.searchsorted(keyframes, end + TIME_TOLERANCE, side='right')]
+
+
+def frame_input(path, t):
+    """ffmpeg input starting at the frame shown at time t, exact to the frame once the video has a packet index"""
+    index = load_index(path)
+    if index is None:
+        return ffmpeg.input(path, ss=t, **source_input_kwargs(path))
+    frame = min(frame_at(index, t), len(index['pts']) - 1)
+    keyframe = keyframe_before(index, frame_time(index, frame))
+    skip = frame - frame_at(index, keyframe)
+    stream = ffmpeg.input(path, ss=max(0.0, keyframe - TIME_TOLERANCE), **source_input_kwargs(path))
+    return stream.filter('select', f'gte(n,{skip})') if skip else stream
+
+
+def build_indexes(paths, max_workers=4, owner=None):
+    """Build missing packet indexes on a thread pool, yielding (path, index, error) as each one finishes.
+
+    With an owner, each scan waits for a slot in the server-wide job pool.
+    """
+    if not paths:
+        return
+    build = shared_pool().wrap(owner, packet_index) if owner is not None else packet_index
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        futures = {executor.submit(build, path): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, describe_ffmpeg_error(e)
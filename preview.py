@@ -0,0 +1,108 @@
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from jobs import build_job, job_stream
+from encoding import run_encode
+from job_pool import shared_pool, pool_owner
+from video_probe import describe_ffmpeg_error
+
+PREVIEW_SECONDS = 4
+PREVIEW_WIDTH = 320
+PREVIEW_COLUMNS = 3
+PREVIEW_CACHE_LIMIT_BYTES = 500 * 1024**2
+PREVIEW_OUTPUT_KWARGS = {'vcodec': 'libx264', 'preset': 'ultrafast', 'crf': 32, 'pix_fmt': 'yuv420p', 'an': None}
+
+
+@st.cache_resource
+def preview_dir():
+    """Scratch folder for preview clips, shared by all sessions of this server"""
+    return tempfile.mkdtemp(prefix="tailor_mouse_preview_")
+
+
+def preview_target(label, source, crop=None, start=0, centered=False):
+    """A clip to preview from start, or around start when centered (e.g. a bin boundary)"""
+    return {'label': label, 'source': source, 'crop': crop, 'start': max(0, start), 'centered': centered}
+
+
+def render_preview_clip(target, directory, seconds=PREVIEW_SECONDS, width=PREVIEW_WIDTH):
+    """Encode a few seconds of a target at low resolution with the fastest settings; returns the clip path"""
+    start = max(0, target['start'] - seconds / 2) if target['centered'] else target['start']
+    stat = os.stat(target['source'])
+    key = repr((target['source'], stat.st_size, stat.st_mtime_ns, target['crop'], start, seconds, width))
+    output = os.path.join(directory, hashlib.sha1(key.encode()).hexdigest()[:16] + ".mp4")
+    if os.path.exists(output):
+        os.utime(output)
+        return output
+
+    job = build_job(target['source'], output, target['label'], start=start or None, duration=seconds, crop=target['crop'])
+    stream = job_stream(job)
+    if target['crop']:
+        width = min(width, target['crop']['w'])
+    stream = stream.filter('scale', width // 2 * 2, -2)
+    run_encode(stream, output, **PREVIEW_OUTPUT_KWARGS)
+    return output
+
+
+def prune_previews(directory, limit_bytes=PREVIEW_CACHE_LIMIT_BYTES, keep=()):
+    """Remove the least recently shown clips until the folder fits limit_bytes, never removing paths in keep"""
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def render_preview(targets, key_prefix, max_workers=4, owner=None):
+    """Sidebar button that renders short low-resolution clips of every target and shows them inline"""
+    clips_key = f"{key_prefix}_preview_clips"
+    seconds = st.sidebar.number_input("Preview length (s)", 1, 30, PREVIEW_SECONDS, key=f"{key_prefix}_preview_seconds", format="%d")
+    if st.sidebar.button("Render Preview", key=f"{key_prefix}_render_preview", disabled=not targets,
+                         help="Encode a few seconds of each mouse crop at low resolution to check boxes and start times"):
+        clips = []
+        directory = preview_dir()
+        render_clip = shared_pool().wrap(owner or pool_owner(), render_preview_clip)
+        with st.spinner(f"Rendering {len(targets)} preview clips..."):
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = [(target, executor.submit(render_clip, target, directory, int(seconds))) for target in targets]
+                for target, future in futures:
+                    try:
+                        clips.append((target['label'], future.result(), None))
+                    except Exception as e:
+                        clips.append((target['label'], None, describe_ffmpeg_error(e)))
+        st.session_state[clips_key] = clips
+        prune_previews(directory, keep={path for _, path, _ in clips if path})
+
+    clips = st.session_state.get(clips_key)
+    if not clips:
+        return
+    header_col, clear_col = st.columns([4, 1])
+    with header_col:
+        st.subheader("Preview")
+    with clear_col:
+        if st.button("Clear Preview", key=f"{key_prefix}_clear_preview"):
+            st.session_state.pop(clips_key)
+            st.rerun()
+    columns = st.columns(PREVIEW_COLUMNS)
+    for i, (label, path, error) in enumerate(clips):
+        with columns[i % PREVIEW_COLUMNS]:
+            st.caption(label)
+            if error:
+                st.error(error)
+            elif os.path.exists(path):
+                st.video(path)
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+import streamlit as st
+
+PROFILE_ENV = "TAILOR_MOUSE_PROFILE"
+PROFILE_LOG = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "rerun_profile.log")
+PROFILE_LOG_BYTES = 5 * 1024**2
+PROFILE_LOG_BACKUPS = 3
+PROFILE_HISTORY = 20
+COUNTERS = ('widgets', 'fs_calls')
+
+_local = threading.local()
+_logger = None
+
+
+def profiling_enabled():
+    """Profiling is opt-in for the whole server with TAILOR_MOUSE_PROFILE=1"""
+    return os.environ.get(PROFILE_ENV) == "1"
+
+
+def _count(counter, amount):
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return
+    profile['totals'][counter] += amount
+    for record in profile['stack']:
+        record[counter] += amount
+
+
+def count_fs_calls(calls=1):
+    """Record filesystem calls made by the app's own directory scans in the current rerun's profile"""
+    _count('fs_calls', calls)
+
+
+def count_widgets(widgets=1):
+    """Record widgets created by the app's file browser tree in the current rerun's profile"""
+    _count('widgets', widgets)
+
+
+def _profile_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(PROFILE_LOG), exist_ok=True)
+        logger = logging.getLogger("tailor_mouse.profile")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(RotatingFileHandler(PROFILE_LOG, maxBytes=PROFILE_LOG_BYTES, backupCount=PROFILE_LOG_BACKUPS))
+        _logger = logger
+    return _logger
+
+
+def start_rerun():
+    """Begin profiling this script run if profiling is enabled"""
+    _local.profile = None
+    if not profiling_enabled():
+        return
+    _local.profile = {
+        'started': time.perf_counter(),
+        'phases': [],
+        'stack': [],
+        'totals': dict.fromkeys(COUNTERS, 0),
+    }
+
+
+@contextmanager
+def phase(name):
+    """Time a named phase of the current rerun; a no-op when profiling is off"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        yield
+        return
+    record = {'phase': name, 'depth': len(profile['stack']), 'seconds': 0.0, **dict.fromkeys(COUNTERS, 0)}
+    profile['phases'].append(record)
+    profile['stack'].append(record)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['seconds'] = time.perf_counter() - started
+        profile['stack'].remove(record)
+
+
+@contextmanager
+def profiled_rerun():
+    """Profile the script body; a run cut short by st.rerun or st.stop is still logged, without the panel"""
+    start_rerun()
+    try:
+        yield
+    except BaseException:
+        finish_rerun(show_panel=False)
+        raise
+    finish_rerun()
+
+
+def finish_rerun(show_panel=True):
+    """Log the rerun's breakdown and show it, with recent reruns, in a debug panel"""
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+    if profile is None:
+        return
+
+    summary = {
+        'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'seconds': round(time.perf_counter() - profile['started'], 4),
+        **profile['totals'],
+        'phases': [dict(record, seconds=round(record['seconds'], 4)) for record in profile['phases']],
+    }
+    _profile_logger().info(json.dumps(summary))
+    history = st.session_state.setdefault('rerun_profiles', [])
+    history.append(summary)
+    del history[:-PROFILE_HISTORY]
+    if not show_panel:
+        return
+
+    with st.expander(f"Rerun profile: {summary['seconds']:.2f} s", expanded=False):
+        st.caption(f"{summary['widgets']} widgets in the file browser tree, {summary['fs_calls']} filesystem calls "
+                   f"in directory scans. Log: {PROFILE_LOG}")
+        st.dataframe([
+            {"Phase": "  " * record['depth'] + record['phase'], "Seconds": f"{record['seconds']:.3f}",
+             "Widgets": record['widgets'], "FS calls": record['fs_calls']}
+            for record in summary['phases']
+        ], use_container_width=True, hide_index=True)
+        st.markdown("**Recent reruns**")
+        st.dataframe([
+            {"Time": run['time'], "Seconds": run['seconds'], "Widgets": run['widgets'], "FS calls": run['fs_calls'],
+             "Slowest phase": max(run['phases'], key=lambda r: r['seconds'])['phase'] if run['phases'] else ""}
+            for run in reversed(history)
+        ], use_container_width=True, hide_index=True)
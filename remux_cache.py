@@ -0,0 +1,228 @@
+import os
+import struct
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import ffmpeg
+from output_cache import source_fingerprint
+from encoding import partial_output_path, PARTIAL_SUFFIX
+from sessions import quote_concat_path
+from job_pool import shared_pool
+from video_probe import is_session, session_members, source_input_kwargs, describe_ffmpeg_error
+
+REMUX_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "remux")
+DEFAULT_REMUX_LIMIT_GB = 50
+REMUX_VERSION = 2
+REMUX_EXTENSION = ".mkv"
+REMUX_WORKERS = 4
+HEADER_LIST_MAX_BYTES = 1024**2
+REMUXED_SESSION_DIR = "remuxed"
+
+ASF_HEADER_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+ASF_INDEX_GUIDS = {
+    bytes.fromhex("90080033b1e5cf1189f400a0c90349cb"),  # Simple Index Object
+    bytes.fromhex("d329e2d6da35d111903400a0c90349be"),  # Index Object
+}
+
+_remux_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def avi_has_index(f):
+    """True if an AVI has an idx1 chunk or an OpenDML super index in its header list"""
+    header = f.read(12)
+    riff_end = 8 + struct.unpack('<I', header[4:8])[0]
+    offset = 12
+    while offset + 8 <= riff_end:
+        f.seek(offset)
+        chunk = f.read(12)
+        if len(chunk) < 8:
+            return False
+        fourcc, size = chunk[:4], struct.unpack('<I', chunk[4:8])[0]
+        if fourcc == b'idx1':
+            return True
+        if fourcc == b'LIST' and chunk[8:12] == b'hdrl' and b'indx' in f.read(min(size - 4, HEADER_LIST_MAX_BYTES)):
+            return True
+        offset += 8 + size + (size & 1)
+    return False
+
+
+def asf_has_index(f):
+    """True if a WMV/ASF file has a top-level index object after its data"""
+    offset = 0
+    while True:
+        f.seek(offset)
+        header = f.read(24)
+        if len(header) < 24:
+            return False
+        if header[:16] in ASF_INDEX_GUIDS:
+            return True
+        size = struct.unpack('<Q', header[16:24])[0]
+        if size < 24:
+            return False
+        offset += size
+
+
+def poorly_indexed(path):
+    """Whether seeking in a video means reading it from the start: AVI and WMV files without an index, FLV and MPEG streams"""
+    if is_session(path):
+        return any(poorly_indexed(member) for member, _ in session_members(path))
+    with open(path, 'rb') as f:
+        magic = f.read(376)
+        f.seek(0)
+        if magic[:4] == b'RIFF' and magic[8:12] == b'AVI ':
+            return not avi_has_index(f)
+        if magic[:16] == ASF_HEADER_GUID:
+            return not asf_has_index(f)
+    if magic[:3] == b'FLV' or magic[:4] == b'\x00\x00\x01\xba':
+        return True
+    return len(magic) >= 189 and magic[0] == magic[188] == 0x47
+
+
+def remux_path(path, cache_dir=REMUX_DIR):
+    """Cache file for a source, keyed by its content and named after it"""
+    key = hashlib.sha1(f"{source_fingerprint(path)}:{REMUX_VERSION}".encode()).hexdigest()[:20]
+    name = os.path.splitext(os.path.basename(path))[0] + REMUX_EXTENSION
+    return os.path.join(cache_dir, key[:2], key, name)
+
+
+def remux(path, output_path):
+    """Copy the video and audio streams into Matroska, which writes a seek index.
+
+    Streams that cannot be copied are re-encoded: video with high-quality x264,
+    audio as AAC.
+    """
+    partial_path = partial_output_path(output_path)
+    source = ffmpeg.input(path, fflags='+genpts', **source_input_kwargs(path))
+    has_audio = bool(ffmpeg.probe(path, select_streams='a', **source_input_kwargs(path)).get('streams'))
+    streams = [source['v:0']] + ([source['a']] if has_audio else [])
+    try:
+        try:
+            ffmpeg.output(*streams, partial_path, c='copy', format='matroska').overwrite_output().run(quiet=True)
+        except ffmpeg.Error:
+            (ffmpeg.output(*streams, partial_path, vcodec='libx264', preset='veryfast', crf=16, acodec='aac',
+                           format='matroska')
+             .overwrite_output().run(quiet=True))
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+
+
+def cached_remux(path, cache_dir=REMUX_DIR, limit_bytes=None, used=None):
+    """The remuxed copy of one file in the cache, created the first time.
+
+    Copies with the same content share one cache file, which is written
+    once. Before a remux, least recently used copies outside used are
+    evicted so the new one, assumed as large as its source, fits limit_bytes.
+    """
+    used = set() if used is None else used
+    output_path = remux_path(path, cache_dir)
+    with _locks_lock:
+        lock = _remux_locks[output_path]
+    with lock:
+        with _evict_lock:
+            used.add(output_path)
+        if os.path.exists(output_path):
+            os.utime(output_path)
+            return output_path
+        if limit_bytes is not None:
+            with _evict_lock:
+                evict_remuxes(limit_bytes - os.path.getsize(path), used, cache_dir)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        remux(path, output_path)
+    return output_path
+
+
+def remuxed_session(path, replacements):
+    """Copy of a session list that reads the members in replacements from their remuxes instead"""
+    lines = []
+    with open(path) as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("file "):
+                member = stripped[5:].strip()[1:-1].replace("'\\''", "'")
+                if member in replacements:
+                    line = f"file {quote_concat_path(replacements[member])}\n"
+            lines.append(line)
+    output_path = os.path.join(os.path.dirname(path), REMUXED_SESSION_DIR, os.path.basename(path))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    partial_path = partial_output_path(output_path)
+    with open(partial_path, 'w') as f:
+        f.writelines(lines)
+    os.replace(partial_path, output_path)
+    return output_path
+
+
+def seekable_source(path, cache_dir=REMUX_DIR, limit_bytes=None, used=None):
+    """A source that seeks quickly: the path itself, or its remuxed copy in the cache, created the first time.
+
+    Only the poorly indexed files of a session are remuxed; the session is
+    then read through a list that points at them, so no joined copy is written.
+    """
+    if is_session(path):
+        replacements = {member: cached_remux(member, cache_dir, limit_bytes, used)
+                        for member, _ in session_members(path) if poorly_indexed(member)}
+        return remuxed_session(path, replacements) if replacements else path
+    if not poorly_indexed(path):
+        return path
+    return cached_remux(path, cache_dir, limit_bytes, used)
+
+
+def evict_remuxes(limit_bytes, keep=(), cache_dir=REMUX_DIR):
+    """Remove the least recently used remuxes until the cache fits limit_bytes, never removing paths in keep.
+
+    Remuxes still being written count towards the total but are not removed.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for root, dirs, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit_bytes:
+            break
+        if os.path.abspath(path) in keep or path.endswith(PARTIAL_SUFFIX):
+            continue
+        try:
+            os.unlink(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+        total -= size
+
+
+def seekable_sources(paths, limit_bytes=DEFAULT_REMUX_LIMIT_GB * 1024**3, cache_dir=REMUX_DIR, max_workers=REMUX_WORKERS,
+                     owner=None):
+    """Replace poorly indexed sources by cached remuxes, in order; returns (sources, errors).
+
+    Remuxes run on a thread pool, each in a slot of the server-wide job pool
+    when an owner is given, and the cache is brought under limit_bytes
+    before each one. A source that cannot be remuxed is kept as it is and
+    reported in errors.
+    """
+    if not paths:
+        return [], []
+    sources, errors, used = {}, [], set()
+    make_seekable = shared_pool().wrap(owner, seekable_source) if owner is not None else seekable_source
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        futures = {executor.submit(make_seekable, path, cache_dir, limit_bytes, used): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                sources[path] = future.result()
+            except Exception as e:
+                sources[path] = path
+                errors.append(f"Could not remux {os.path.basename(path)}: {describe_ffmpeg_error(e)}")
+    sources = [sources[path] for path in paths]
+    with _evict_lock:
+        evict_remuxes(limit_bytes, keep=used, cache_dir=cache_dir)
+    return sources, errors
@@ -0,0 +1,87 @@
+import os
+import json
+import math
+import streamlit as st
+from jobs import build_job
+
+RIG_CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "rigs")
+
+
+def list_rigs():
+    if not os.path.isdir(RIG_CONFIG_DIR):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(RIG_CONFIG_DIR) if f.endswith('.json'))
+
+
+def load_rig(name):
+    with open(os.path.join(RIG_CONFIG_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def save_rig(name, config):
+    os.makedirs(RIG_CONFIG_DIR, exist_ok=True)
+    path = os.path.join(RIG_CONFIG_DIR, f"{name}.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(config, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def rig_config(crops=None, start=0, bin_duration=0, encoding=None):
+    """Crop boxes per mouse and/or start and bin length in seconds; bin_duration 0 keeps the whole video"""
+    return {
+        'crops': {str(mid): crop for mid, crop in (crops or {}).items() if crop},
+        'start': start,
+        'bin_duration': bin_duration,
+        'encoding': dict(encoding or {}),
+    }
+
+
+def render_save_rig(config, key_prefix):
+    """Sidebar control to save the current crop and bin settings as a named rig configuration"""
+    st.sidebar.subheader("Save Rig Configuration")
+    rig_name = st.sidebar.text_input("Rig name", key=f"{key_prefix}_rig_name",
+                                     help="Saved rigs can be applied automatically in Watch Folder mode")
+    if st.sidebar.button("Save Rig Configuration", key=f"{key_prefix}_save_rig", disabled=not rig_name.strip()):
+        save_rig(rig_name.strip(), config)
+        st.sidebar.success(f"Saved rig '{rig_name.strip()}'")
+
+
+def plan_rig_jobs(path, duration, rig, output_dir):
+    """Encode jobs for one recording under a rig configuration"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    crops = rig.get('crops') or {None: None}
+    start_time = rig.get('start', 0)
+    bin_duration = rig.get('bin_duration', 0)
+    output_kwargs = {'vcodec': 'libx264', 'an': None}
+
+    if start_time >= duration:
+        return []
+    if bin_duration > 0:
+        windows = [(start_time + i * bin_duration, i + 1) for i in range(math.ceil((duration - start_time) / bin_duration))]
+    else:
+        windows = [(start_time, None)]
+
+    jobs = []
+    for mouse_id, crop in crops.items():
+        mouse_part = f"_mouse{mouse_id}" if mouse_id is not None else ""
+        for bin_start, bin_number in windows:
+            if bin_number is None:
+                output_name = f"{stem}{mouse_part}.mp4"
+                window = None
+            elif bin_duration == 3600:
+                output_name = f"{stem}{mouse_part}_H{int(bin_start // 3600) + 1}.mp4"
+                window = min(bin_duration, duration - bin_start)
+            else:
+                output_name = f"{stem}{mouse_part}_bin_{bin_number}.mp4"
+                window = min(bin_duration, duration - bin_start)
+
+            label = f"{os.path.basename(path)}{' Mouse ' + str(mouse_id) if mouse_id is not None else ''}"
+            if bin_number is not None:
+                label += f", bin {bin_number}/{len(windows)}"
+            jobs.append(build_job(
+                path, os.path.join(output_dir, output_name), label,
+                start=bin_start or None,
+                duration=window, crop=crop, output_kwargs=output_kwargs, encoding=rig.get('encoding'),
+                mouse_id=mouse_id, bin_index=bin_number
+            ))
+    return jobs
@@ -0,0 +1,183 @@
+import os
+import time
+import streamlit as st
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from jobs import run_job
+from job_pool import shared_pool, pool_owner, POOL_MAX_JOBS
+from video_probe import is_session, session_members
+from autotune import Autotuner, host_settings
+from verify import verify_output
+
+DEFAULT_MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_READERS_PER_DEVICE = 2
+DEFAULT_RETRIES = 2
+VERIFY_WORKERS = 2
+WAIT_POLL_SECONDS = 2
+
+
+def render_scheduler_options(key_prefix):
+    """Sidebar controls for how many jobs run at once"""
+    st.sidebar.subheader("Parallel Processing")
+    max_workers = st.sidebar.number_input(
+        "Concurrent encode jobs", 1, 64, DEFAULT_MAX_WORKERS,
+        key=f"{key_prefix}_max_workers", format="%d"
+    )
+    readers_per_device = st.sidebar.number_input(
+        "Max concurrent readers per storage device", 1, 64, DEFAULT_READERS_PER_DEVICE,
+        key=f"{key_prefix}_readers_per_device", format="%d",
+        help="Keep this low for spinning disks and NAS shares, where parallel random reads collapse throughput"
+    )
+    autotune = st.sidebar.checkbox(
+        "Auto-tune concurrency", value=False, key=f"{key_prefix}_autotune",
+        help="Adjusts the number of concurrent jobs and ffmpeg threads per job while the batch runs, from measured "
+             "throughput, CPU use and I/O wait, starting from the job count above or the setting picked last time "
+             "for similar jobs on this host"
+    )
+    if autotune:
+        for workload, settings in sorted(host_settings().items()):
+            st.sidebar.caption(f"Tuned for {workload}: {settings['jobs']} jobs × {settings['threads']} threads")
+    verify = st.sidebar.checkbox(
+        "Verify outputs", value=True, key=f"{key_prefix}_verify",
+        help="Checks each output while the next jobs encode: that it has a video stream, that its length matches "
+             "the planned bin and that its last seconds decode. Outputs that fail are deleted and encoded again"
+    )
+    retries = st.sidebar.number_input(
+        "Retries per failed job", 0, 10, DEFAULT_RETRIES, key=f"{key_prefix}_retries", format="%d",
+        help="How many more times a job is run when its encode fails or its output does not verify"
+    )
+    user_name = st.sidebar.text_input(
+        "Your name (shared job queue)", key=f"{key_prefix}_pool_user",
+        help=f"Jobs of everyone using this server share {POOL_MAX_JOBS} encode slots; free slots go to whoever has the fewest running"
+    )
+    return {'max_workers': int(max_workers), 'readers_per_device': int(readers_per_device), 'owner': pool_owner(user_name),
+            'autotune': autotune, 'verify': verify, 'retries': int(retries)}
+
+
+def source_device(path):
+    try:
+        if is_session(path):
+            path = session_members(path)[0][0]
+        return os.stat(path).st_dev
+    except (OSError, IndexError):
+        return None
+
+
+def order_jobs(jobs):
+    """Group jobs by source file, keeping each group in time order"""
+    by_source = OrderedDict()
+    for job in jobs:
+        by_source.setdefault(job['source'], []).append(job)
+    for source_jobs in by_source.values():
+        source_jobs.sort(key=lambda job: job['start'] or 0)
+    return by_source
+
+
+def run_jobs(jobs, max_workers=DEFAULT_MAX_WORKERS, readers_per_device=DEFAULT_READERS_PER_DEVICE, run=run_job,
+             owner=None, on_wait=None, autotune=False, verify=False, retries=0, wait_published=None, job_done=None):
+    """Run jobs concurrently, yielding (job, error) as each one finishes.
+
+    Jobs of a source that is already being read are started first, so bins of
+    one file run close together and share the page cache, and no device gets
+    more than readers_per_device jobs reading from it at once. With an owner,
+    each job also waits for a slot in the server-wide job pool. on_wait is
+    called every few seconds from the calling thread while jobs are pending.
+    With autotune, max_workers is only the starting point: an Autotuner
+    changes the job limit and ffmpeg threads per job as the batch runs.
+
+    With verify, each output is checked on a separate thread pool while the
+    next jobs encode, after wait_published(output) when outputs are moved
+    into place in the background. A job whose encode or check fails is put
+    back in the queue up to retries more times; only its last outcome is
+    yielded, and job['attempts'] counts its runs. job_done(job) is called
+    once per job, when that last outcome is known.
+    """
+    tuner = Autotuner(jobs, max_workers) if autotune and jobs else None
+    if tuner:
+        encode = run
+        run = lambda job: tuner.run(encode, job)
+    if owner is not None:
+        run = shared_pool().wrap(owner, run)
+    pending = OrderedDict((source, deque(source_jobs)) for source, source_jobs in order_jobs(jobs).items())
+    devices = {source: source_device(source) for source in pending}
+    active_devices = defaultdict(int)
+    active_sources = defaultdict(int)
+    max_workers = max(1, max_workers)
+    readers_per_device = max(1, readers_per_device)
+
+    def next_job():
+        candidates = [source for source in pending if active_devices[devices[source]] < readers_per_device]
+        if not candidates:
+            return None
+        warm = [source for source in candidates if active_sources[source]]
+        source = (warm or candidates)[0]
+        job = pending[source].popleft()
+        if not pending[source]:
+            del pending[source]
+        return job
+
+    def timed_run(job):
+        started = time.monotonic()
+        try:
+            return run(job)
+        finally:
+            job['wall_time'] = time.monotonic() - started
+
+    def verify_job(job):
+        if wait_published:
+            wait_published(job['output'])
+        verify_output(job)
+
+    def requeue(job, error):
+        """Put a failed job back at the front of its source's queue; False once it is out of retries"""
+        if error is None or job['attempts'] > retries:
+            return False
+        pending.setdefault(job['source'], deque()).appendleft(job)
+        return True
+
+    for job in jobs:
+        job['attempts'] = 0
+    running = {}
+    verifying = {}
+    poll = on_wait or tuner
+    try:
+        with ThreadPoolExecutor(max_workers=tuner.max_jobs if tuner else max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as verifier:
+            while pending or running or verifying:
+                while len(running) < (tuner.limit if tuner else max_workers):
+                    job = next_job()
+                    if job is None:
+                        break
+                    active_devices[devices[job['source']]] += 1
+                    active_sources[job['source']] += 1
+                    job['attempts'] += 1
+                    running[executor.submit(timed_run, job)] = job
+
+                done, _ = wait(list(running) + list(verifying), timeout=WAIT_POLL_SECONDS if poll else None,
+                               return_when=FIRST_COMPLETED)
+                if on_wait:
+                    on_wait()
+                for future in done:
+                    if future in verifying:
+                        job = verifying.pop(future)
+                        error = future.exception()
+                        if not requeue(job, error):
+                            if job_done:
+                                job_done(job)
+                            yield job, error
+                        continue
+                    job = running.pop(future)
+                    active_devices[devices[job['source']]] -= 1
+                    active_sources[job['source']] -= 1
+                    error = future.exception()
+                    if error is None and verify:
+                        verifying[verifier.submit(verify_job, job)] = job
+                    elif not requeue(job, error):
+                        if job_done:
+                            job_done(job)
+                        yield job, error
+                if tuner:
+                    tuner.observe()
+    finally:
+        if tuner:
+            tuner.save()
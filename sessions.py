@@ -0,0 +1,116 @@
+import os
+import re
+import json
+import hashlib
+from collections import defaultdict
+from video_probe import SESSION_EXTENSION, probe_videos
+
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".tailor_mouse", "sessions")
+ROLLOVER_SUFFIX = re.compile(r'([-_. ]+\d+)+$')
+TIMESTAMP_SUFFIX = re.compile(r'\d{8,}$')
+FPS_TOLERANCE = 0.01
+
+
+def session_prefix(path):
+    """Recording name without its rollover counter or timestamp, e.g. cam1_20240101_003000.mp4 -> cam1.
+
+    Only numbers after a separator, or a run of eight or more digits such as
+    cam20240101003000, are stripped, so cam1 and cam2 stay apart.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    prefix = ROLLOVER_SUFFIX.sub('', stem)
+    if prefix == stem:
+        prefix = TIMESTAMP_SUFFIX.sub('', stem)
+    return prefix or os.path.basename(os.path.dirname(path)) or "session"
+
+
+def natural_key(path):
+    """Sort key that orders cam_9 before cam_10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', os.path.basename(path))]
+
+
+def group_sessions(paths):
+    """Group rolled-over files by folder, extension and name prefix; returns [(name, paths in recording order)]"""
+    groups = defaultdict(list)
+    for path in paths:
+        groups[(os.path.dirname(path), os.path.splitext(path)[1].lower(), session_prefix(path))].append(path)
+    return [(prefix, sorted(members, key=natural_key)) for (_, _, prefix), members in sorted(groups.items())]
+
+
+def quote_concat_path(path):
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+def session_list_path(name, paths):
+    """Where the concat list for these files lives; a new list is written whenever a file changes"""
+    identity = []
+    for path in paths:
+        stat = os.stat(path)
+        identity.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    key = hashlib.sha1(json.dumps(identity).encode()).hexdigest()[:16]
+    return os.path.join(SESSION_DIR, key, name + SESSION_EXTENSION), identity
+
+
+def session_mismatches(infos):
+    """Descriptions of the stream settings that differ between files; the concat demuxer needs them all equal"""
+    mismatches = []
+    for label, key in (("resolutions", lambda info: f"{info['width']}x{info['height']}"),
+                       ("codecs", lambda info: info['codec_name']), ("pixel formats", lambda info: info['pix_fmt'])):
+        values = sorted({key(info) for info in infos})
+        if len(values) > 1:
+            mismatches.append(f"{label} ({', '.join(values)})")
+    rates = sorted({info['fps'] for info in infos if info['fps']})
+    unknown = any(not info['fps'] for info in infos)
+    if rates and (unknown or rates[-1] - rates[0] > FPS_TOLERANCE):
+        mismatches.append(f"frame rates ({', '.join([f'{rate:.3f}' for rate in rates] + (['unknown'] if unknown else []))})")
+    return mismatches
+
+
+def build_session(name, paths):
+    """Write a concat list that plays the files back to back as one recording, and return its path.
+
+    Every file gets a duration line, so the session's total length and the
+    file that holds any session time are known without opening the files,
+    and seeks go straight to the right one. Raises ValueError if the files
+    cannot be joined.
+    """
+    list_path, identity = session_list_path(name, paths)
+    if os.path.exists(list_path):
+        return list_path
+
+    infos = {}
+    for path, info, error in probe_videos(paths):
+        if error is not None:
+            raise ValueError(f"Could not read {os.path.basename(path)}: {error}")
+        infos[path] = info
+    mismatches = session_mismatches([infos[path] for path in paths])
+    if mismatches:
+        raise ValueError(f"Files of session {name} cannot be joined, they have different {'; '.join(mismatches)}")
+
+    lines = ["ffconcat version 1.0"]
+    for path, (abs_path, size, mtime_ns) in zip(paths, identity):
+        lines.append(f"# size {size} mtime_ns {mtime_ns}")
+        lines.append(f"file {quote_concat_path(abs_path)}")
+        lines.append(f"duration {infos[path]['duration']:.6f}")
+
+    os.makedirs(os.path.dirname(list_path), exist_ok=True)
+    partial_path = list_path + ".partial"
+    with open(partial_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(partial_path, list_path)
+    return list_path
+
+
+def build_sessions(paths):
+    """Replace every group of two or more rolled-over files with one session; returns (sources, errors)"""
+    sources, errors = [], []
+    for name, members in group_sessions(paths):
+        if len(members) == 1:
+            sources.extend(members)
+            continue
+        try:
+            sources.append(build_session(name, members))
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+            sources.extend(members)
+    return sources, errors
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import ffmpeg
+import streamlit as st
+from encoding import run_encode
+from jobs import run_job
+from packet_index import packet_index, frame_at, keyframes_between
+from video_probe import is_session
+
+SMART_CUT_ENCODERS = {'h264': 'libx264'}
+SEGMENT_FORMAT = 'mpegts'
+SMART_CUT_EXTENSION = '.ts'
+
+
+def render_smart_cut_option(key_prefix):
+    """Sidebar control for cutting bins with stream copy between their edge keyframes"""
+    smart_cut = st.sidebar.checkbox(
+        "Smart cut (re-encode only bin edges, writes .ts files)", value=False, key=f"{key_prefix}_smart_cut",
+        help="Re-encodes the partial GOP at the start and end of each bin and copies everything in between. "
+             "Cuts stay exact and long bins finish at close to copy speed. H.264 sources only; "
+             "bins fall back to a full re-encode with seek-friendly outputs or on other codecs. "
+             "Outputs are MPEG-TS (.ts) files, which repeat the stream headers in-band, so players decode "
+             "across the joins between re-encoded and copied parts"
+    )
+    if smart_cut:
+        st.sidebar.caption(f"All bins of this run are written as {SMART_CUT_EXTENSION} instead of .mp4, "
+                           "including bins that fall back to a full re-encode")
+    return smart_cut
+
+
+def plan_smart_cut(index, start, end):
+    """Split [start, end) into a re-encoded head, a copied middle and a re-encoded tail.
+
+    Segments are (mode, seek time, frame count); counting frames in the
+    packet index instead of passing durations keeps every cut on the same
+    frame a full re-encode would use. Returns None if no whole GOP fits
+    inside the window.
+    """
+    inside = keyframes_between(index, start, end)
+    if len(inside) < 2:
+        return None
+    first, last = float(inside[0]), float(inside[-1])
+    start_frame, first_frame, last_frame, end_frame = (frame_at(index, t) for t in (start, first, last, end))
+    return [('encode', start, first_frame - start_frame), ('copy', first, last_frame - first_frame),
+            ('encode', last, end_frame - last_frame)]
+
+
+def run_smart_cut(job):
+    """Cut a bin at exact times, re-encoding only the partial GOPs at its edges.
+
+    The x264 edges and the source's middle have different SPS/PPS. An MP4
+    holds a single avcC, so job['output'] should be a SMART_CUT_EXTENSION
+    file: MPEG-TS carries each part's parameter sets with its keyframes.
+    """
+    if job['crop'] or job.get('inactive') or job['encoding'].get('seek_friendly') or is_session(job['source']):
+        return run_job(job)
+
+    source = job['source']
+    start = job['start'] or 0.0
+    index = packet_index(source)
+    end = min(start + job['duration'], index['duration']) if job['duration'] is not None else index['duration']
+    encoder = SMART_CUT_ENCODERS.get(index['codec_name'])
+    if encoder is None:
+        return run_job(job)
+    plan = plan_smart_cut(index, start, end)
+    if plan is None:
+        return run_job(job)
+
+    encode_kwargs = dict(job['output_kwargs'], vcodec=encoder, an=None, format=SEGMENT_FORMAT)
+    if index['pix_fmt']:
+        encode_kwargs['pix_fmt'] = index['pix_fmt']
+
+    with tempfile.TemporaryDirectory(prefix=".smartcut_", dir=os.path.dirname(job['output']) or '.') as work_dir:
+        segments = []
+        for i, (mode, segment_start, frame_count) in enumerate(plan):
+            if frame_count <= 0:
+                continue
+            segment_path = os.path.join(work_dir, f"{i}.ts")
+            stream = ffmpeg.input(source, ss=segment_start)
+            if mode == 'copy':
+                stream = stream.output(segment_path, c='copy', an=None, format=SEGMENT_FORMAT, **{'frames:v': frame_count})
+            else:
+                stream = stream.output(segment_path, **encode_kwargs, **{'frames:v': frame_count})
+            stream.overwrite_output().run(quiet=True)
+            segments.append(segment_path)
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, 'w') as f:
+            f.writelines(f"file '{path}'\n" for path in segments)
+        return run_encode(ffmpeg.input(list_path, format='concat', safe=0), job['output'], fast_start=False, c='copy')
@@ -0,0 +1,247 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import streamlit as st
+from encoding import partial_output_path
+from jobs import run_job
+from scheduler import order_jobs
+from video_probe import probe_video, file_size_mb
+
+DEFAULT_SCRATCH_DIR = os.path.join(tempfile.gettempdir(), "tailor_mouse_scratch")
+DEFAULT_SCRATCH_LIMIT_GB = 50
+MAX_PENDING_MOVES = 32
+
+
+def render_staging_options(key_prefix):
+    """Sidebar controls for staging sources and outputs on local disk; None when disabled"""
+    st.sidebar.subheader("Local Scratch Staging")
+    enabled = st.sidebar.checkbox(
+        "Stage through local scratch disk",
+        value=False,
+        key=f"{key_prefix}_staging",
+        help="Copies each source to local disk before its jobs and encodes there, moving outputs to the output folder in the background"
+    )
+    if not enabled:
+        return None
+    scratch_dir = st.sidebar.text_input("Scratch directory", DEFAULT_SCRATCH_DIR, key=f"{key_prefix}_scratch_dir")
+    limit_gb = st.sidebar.number_input(
+        "Scratch space limit (GB)", 1, 10000, DEFAULT_SCRATCH_LIMIT_GB,
+        key=f"{key_prefix}_scratch_limit", format="%d"
+    )
+    return {'scratch_dir': scratch_dir, 'limit_bytes': int(limit_gb) * 1024**3}
+
+
+def publish_file(local_path, output_path):
+    """Copy a finished local file to its final path under a temp name, then rename it into place"""
+    partial_path = partial_output_path(output_path)
+    try:
+        shutil.copyfile(local_path, partial_path)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+    os.unlink(local_path)
+
+
+class ScratchStager:
+    """Stages job sources on local scratch and publishes outputs in the background.
+
+    A staged source is kept until job_done has been called for each of its
+    jobs, so retries of a failed job still read the local copy.
+
+    Scratch usage (staged sources plus outputs waiting to be moved) is kept
+    under limit_bytes, counting outputs still being encoded by their
+    estimated size. Jobs never wait for space: a source that cannot be
+    staged right away is read from its original location instead, and an
+    output that does not fit is written straight to the output folder.
+    """
+
+    def __init__(self, jobs, scratch_dir=DEFAULT_SCRATCH_DIR, limit_bytes=DEFAULT_SCRATCH_LIMIT_GB * 1024**3, run=run_job):
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix="run_", dir=scratch_dir)
+        self.limit_bytes = limit_bytes
+        self.run_local = run
+        self.used_bytes = 0
+        self.lock = threading.Condition()
+        self.sources = {}
+        self.durations = {}
+        self.remaining_jobs = {}
+        for source, source_jobs in order_jobs(jobs).items():
+            self.remaining_jobs[source] = len(source_jobs)
+
+        self.move_errors = {}
+        self.published = {}
+        self.moves = queue.Queue(maxsize=MAX_PENDING_MOVES)
+        self.closing = False
+        self.mover = threading.Thread(target=self._move_outputs, daemon=True)
+        self.mover.start()
+        self.prefetcher = threading.Thread(target=self._prefetch, daemon=True)
+        self.prefetcher.start()
+
+    def _source_size(self, source):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return None
+
+    def _claim(self, source, wait):
+        """Reserve scratch space for a source; returns its staging entry, or None to read it in place"""
+        with self.lock:
+            while True:
+                if source in self.sources:
+                    return self.sources[source]
+                if self.remaining_jobs.get(source, 0) <= 0:
+                    return None
+                size = self._source_size(source)
+                if self.closing or size is None or size > self.limit_bytes:
+                    return None
+                if self.used_bytes + size <= self.limit_bytes:
+                    break
+                if not wait:
+                    return None
+                self.lock.wait()
+
+            self.used_bytes += size
+            local_dir = tempfile.mkdtemp(dir=self.root)
+            entry = {
+                'path': os.path.join(local_dir, os.path.basename(source)),
+                'size': size,
+                'ready': threading.Event(),
+                'failed': False,
+                'released': False,
+            }
+            self.sources[source] = entry
+
+        try:
+            shutil.copyfile(source, entry['path'])
+        except OSError:
+            entry['failed'] = True
+            self._release_source(source)
+        finally:
+            entry['ready'].set()
+        return entry
+
+    def _release_source(self, source):
+        with self.lock:
+            entry = self.sources.get(source)
+            if entry is None or entry['released']:
+                return
+            entry['released'] = True
+            self.used_bytes -= entry['size']
+            self.lock.notify_all()
+        if os.path.exists(entry['path']):
+            os.unlink(entry['path'])
+
+    def _prefetch(self):
+        for source in list(self.remaining_jobs):
+            if self.closing:
+                return
+            self._claim(source, wait=True)
+
+    def _local_source(self, source):
+        entry = self._claim(source, wait=False)
+        if entry is None:
+            return source
+        entry['ready'].wait()
+        with self.lock:
+            staged = not entry['failed'] and not entry['released']
+        return entry['path'] if staged else source
+
+    def job_done(self, job):
+        """Called once per job when it will not run again; the last job of a source frees its staged copy"""
+        source = job['source']
+        with self.lock:
+            self.remaining_jobs[source] -= 1
+            done = self.remaining_jobs[source] == 0
+        if done:
+            self._release_source(source)
+
+    def _output_estimate(self, job):
+        """Expected output size: the source's bytes per second over the job's time window"""
+        source = job['source']
+        if source not in self.durations:
+            try:
+                self.durations[source] = probe_video(source)['duration']
+            except Exception:
+                self.durations[source] = 0
+        duration = self.durations[source]
+        size = file_size_mb(source) * 1024**2
+        if job['duration'] is None or duration <= 0:
+            return int(size)
+        return int(size * min(1.0, job['duration'] / duration))
+
+    def run(self, job):
+        """Run one job against the staged source, writing its output to scratch.
+
+        Scratch space for the output is reserved from an estimate before the
+        encode and corrected to the real size afterwards. When the estimate
+        does not fit, the output is written straight to the output folder.
+        """
+        estimate = self._output_estimate(job)
+        with self.lock:
+            reserved = self.used_bytes + estimate <= self.limit_bytes
+            if reserved:
+                self.used_bytes += estimate
+        if not reserved:
+            self.run_local(dict(job, source=self._local_source(job['source'])))
+            return job['output']
+
+        try:
+            local_output_dir = tempfile.mkdtemp(dir=self.root)
+            local_output = os.path.join(local_output_dir, os.path.basename(job['output']))
+            self.run_local(dict(job, source=self._local_source(job['source']), output=local_output))
+            size = os.path.getsize(local_output)
+        except BaseException:
+            with self.lock:
+                self.used_bytes -= estimate
+                self.lock.notify_all()
+            raise
+
+        with self.lock:
+            self.used_bytes += size - estimate
+            self.published[job['output']] = threading.Event()
+        self.moves.put((local_output, job['output'], size))
+        return job['output']
+
+    def _move_outputs(self):
+        while True:
+            item = self.moves.get()
+            if item is None:
+                return
+            local_output, output_path, size = item
+            try:
+                publish_file(local_output, output_path)
+                self.move_errors.pop(output_path, None)
+            except Exception as e:
+                self.move_errors[output_path] = e
+            finally:
+                with self.lock:
+                    self.used_bytes -= size
+                    self.lock.notify_all()
+                    published = self.published.get(output_path)
+                if published:
+                    published.set()
+
+    def wait_published(self, output_path):
+        """Block until a job's output has been moved to its final path, raising the error if the move failed"""
+        with self.lock:
+            published = self.published.get(output_path)
+        if published:
+            published.wait()
+        error = self.move_errors.pop(output_path, None)
+        if error is not None:
+            raise error
+
+    def finish(self):
+        """Wait for background moves, clean up scratch and return [(output_path, error)] for failed moves"""
+        with self.lock:
+            self.closing = True
+            self.lock.notify_all()
+        self.moves.put(None)
+        self.mover.join()
+        self.prefetcher.join()
+        shutil.rmtree(self.root, ignore_errors=True)
+        return list(self.move_errors.items())
@@ -0,0 +1,27 @@
+import numpy as np
+from activity import window_activity, crop_key
+
+
+def test_window_activity_averages_samples_inside_each_window():
+    times = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    scores = np.array([1.0, 3.0, 5.0, 7.0, 9.0])
+    result = window_activity(times, scores, [(1.0, 2.0), (3.0, 5.0), (0.0, np.inf)])
+    np.testing.assert_allclose(result, [2.0, 7.0, 5.0])
+
+
+def test_window_activity_is_nan_for_windows_without_samples():
+    times = np.array([1.0, 2.0])
+    scores = np.array([4.0, 6.0])
+    result = window_activity(times, scores, [(10.0, 20.0), (1.0, 1.0)])
+    assert np.isnan(result[0])
+    assert result[1] == 4.0
+
+
+def test_window_activity_with_no_samples_at_all():
+    result = window_activity(np.zeros(0), np.zeros(0), [(0.0, 10.0)])
+    assert np.isnan(result).all()
+
+
+def test_crop_key_identifies_full_frame_and_crops():
+    assert crop_key(None) == crop_key(None)
+    assert crop_key({'x': 0, 'y': 0, 'w': 10, 'h': 10}) != crop_key(None)
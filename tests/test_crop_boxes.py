@@ -0,0 +1,32 @@
+import numpy as np
+from crop_boxes import even_crop_box, proxy_box_to_source
+from arena_detection import find_runs
+
+
+def test_even_crop_box_rounds_to_even_offsets_and_sizes():
+    assert even_crop_box(11, 7, 101, 51) == {'x': 12, 'y': 8, 'w': 100, 'h': 50}
+
+
+def test_even_crop_box_clamps_to_frame():
+    box = even_crop_box(-5, -3, 700, 500, frame_width=641, frame_height=480)
+    assert box == {'x': 0, 'y': 0, 'w': 640, 'h': 480}
+
+
+def test_even_crop_box_keeps_a_minimal_box():
+    assert even_crop_box(10, 10, 0, 0) == {'x': 10, 'y': 10, 'w': 2, 'h': 2}
+
+
+def test_proxy_box_to_source_scales_back_up():
+    box = {'left': 10, 'top': 20, 'width': 100, 'height': 50}
+    assert proxy_box_to_source(box, (960, 540), (1920, 1080)) == {'x': 20, 'y': 40, 'w': 200, 'h': 100}
+
+
+def test_find_runs_keeps_runs_of_min_length():
+    active = np.array([1, 1, 0, 1, 1, 1, 0, 0, 1], dtype=bool)
+    assert [(int(s), int(e)) for s, e in find_runs(active, 2)] == [(0, 2), (3, 6)]
+
+
+def test_find_runs_handles_runs_at_both_ends_and_empty_input():
+    active = np.array([1, 1, 1, 0, 1, 1, 1], dtype=bool)
+    assert [(int(s), int(e)) for s, e in find_runs(active, 3)] == [(0, 3), (4, 7)]
+    assert find_runs(np.zeros(0, dtype=bool), 1) == []
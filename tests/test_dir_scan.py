@@ -0,0 +1,54 @@
+import os
+import dir_scan
+from dir_scan import list_directory, scan_video_files, add_to_tree, tree_outline
+
+
+class VanishingEntry:
+    """A directory entry whose file is deleted between the listing and its stat"""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self):
+        return False
+
+    def is_file(self):
+        return True
+
+    def stat(self):
+        raise FileNotFoundError(self.path)
+
+
+def test_list_directory_skips_files_that_vanish_mid_scan(tmp_path, monkeypatch):
+    for name in ("keep.mp4", "gone.mp4"):
+        (tmp_path / name).write_bytes(b"x")
+    scandir = os.scandir
+
+    class Entries:
+        def __init__(self, path):
+            self.entries = scandir(path)
+
+        def __enter__(self):
+            return [VanishingEntry(entry) if entry.name == "gone.mp4" else entry for entry in self.entries]
+
+        def __exit__(self, *exc):
+            self.entries.close()
+
+    monkeypatch.setattr(dir_scan.os, 'scandir', Entries)
+    subdirs, files = list_directory(str(tmp_path))
+    assert subdirs == []
+    assert [file_info['name'] for file_info in files] == ["keep.mp4"]
+
+
+def test_tree_outline_lists_folders_found_so_far(tmp_path):
+    (tmp_path / "b" / "day1").mkdir(parents=True)
+    (tmp_path / "b" / "day1" / "cam1.mp4").write_bytes(b"x")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "cam2.avi").write_bytes(b"x")
+    tree = {}
+    for folder, files, error in scan_video_files(str(tmp_path)):
+        assert error is None
+        add_to_tree(tree, str(tmp_path), folder, files)
+    assert list(tree_outline(tree)) == ["a/ (1 videos)", "b/", "  day1/ (1 videos)"]
@@ -0,0 +1,59 @@
+import threading
+import time
+from job_pool import JobPool
+
+
+def hold_slots(pool, owner, count, release):
+    """Start count threads that each take one of owner's slots and keep it until release is set"""
+    started = []
+    for _ in range(count):
+        thread = threading.Thread(target=pool.wrap(owner, lambda: release.wait()), daemon=True)
+        thread.start()
+        started.append(thread)
+    return started
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_user_quota_caps_one_owner():
+    pool = JobPool(max_jobs=4, user_quota=2)
+    release = threading.Event()
+    threads = hold_slots(pool, 'a', 3, release)
+    wait_for(lambda: pool.status('a')['running'] == 2)
+    assert pool.status('a')['queued'] == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert pool.status('a')['running'] == 0
+
+
+def test_free_slot_goes_to_owner_with_fewest_running():
+    pool = JobPool(max_jobs=2, user_quota=2)
+    release_a = threading.Event()
+    hold_slots(pool, 'a', 2, release_a)
+    wait_for(lambda: pool.status('a')['running'] == 2)
+
+    order = []
+    blocker = threading.Event()
+    for owner in ('a', 'b'):
+        threading.Thread(target=pool.wrap(owner, lambda owner=owner: (order.append(owner), blocker.wait())),
+                         daemon=True).start()
+        wait_for(lambda owner=owner: pool.status(owner)['queued'] == 1)
+    assert pool.status('b')['ahead'] == 0
+    assert pool.status('a')['ahead'] == 1
+
+    release_a.set()
+    wait_for(lambda: len(order) == 2)
+    assert order == ['b', 'a']
+    blocker.set()
+
+
+def test_wrap_passes_arguments_and_result():
+    pool = JobPool(max_jobs=1)
+    assert pool.wrap('a', lambda x, y=0: x + y)(1, y=2) == 3
+    assert pool.status('a')['running'] == 0
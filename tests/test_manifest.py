@@ -0,0 +1,53 @@
+import os
+import pandas as pd
+import watch_folder
+from jobs import build_job
+from manifest import write_manifest, MANIFEST_PREFIX
+
+
+def manifests(directory):
+    return sorted(f for f in os.listdir(directory) if f.startswith(MANIFEST_PREFIX) and f.endswith('.parquet'))
+
+
+def make_output(tmp_path, name):
+    output = tmp_path / name
+    output.write_bytes(b"x" * 10)
+    return build_job(str(tmp_path / "cam1.mp4"), str(output), "Bin 1", start=0.0, duration=1.0,
+                     output_kwargs={'vcodec': 'libx264'})
+
+
+def test_manifests_written_in_the_same_second_are_kept(tmp_path):
+    first = write_manifest([make_output(tmp_path, "a.mp4")], str(tmp_path))
+    second = write_manifest([make_output(tmp_path, "b.mp4")], str(tmp_path))
+    assert first != second
+    assert len(manifests(tmp_path)) == 2
+    assert list(pd.read_parquet(second)['output_name']) == ["b.mp4"]
+
+
+def test_watch_folder_batch_writes_a_manifest(tmp_path, monkeypatch):
+    watch_dir, output_dir = tmp_path / "watch", tmp_path / "out"
+    watch_dir.mkdir()
+    recording = str(watch_dir / "cam1.mp4")
+    monkeypatch.setattr(watch_folder, 'load_rig', lambda name: {'bin_duration': 0})
+    monkeypatch.setattr(watch_folder, 'probe_video', lambda path: {'duration': 2.0})
+    monkeypatch.setattr(watch_folder, 'plan_rig_jobs', lambda path, duration, rig, out: [
+        build_job(path, os.path.join(out, f"cam1_bin_{i}.mp4"), f"Bin {i}", start=float(i), duration=1.0,
+                  output_kwargs={'vcodec': 'libx264'})
+        for i in range(2)
+    ])
+
+    def run_jobs(jobs, **options):
+        for job in jobs:
+            with open(job['output'], 'wb') as f:
+                f.write(b"x")
+            yield job, None
+
+    monkeypatch.setattr(watch_folder, 'run_jobs', run_jobs)
+    watcher = watch_folder.FolderWatcher(str(watch_dir), "rig", str(output_dir))
+    watcher.recordings[recording] = {'state': 'ready', 'detail': "", 'fingerprint': [1, 2]}
+    watcher._process_batch([(recording, True)])
+
+    written = manifests(output_dir)
+    assert len(written) == 1
+    assert sorted(pd.read_parquet(output_dir / written[0])['output_name']) == ["cam1_bin_0.mp4", "cam1_bin_1.mp4"]
+    assert watcher.recordings[recording]['state'] == 'done'
@@ -0,0 +1,24 @@
+from mosaic import mosaic_tiles, mosaic_layout
+
+
+def crop(w, h):
+    return {'x': 0, 'y': 0, 'w': w, 'h': h}
+
+
+def test_mosaic_tiles_skips_mice_without_crops_in_mouse_order():
+    tiles = mosaic_tiles({'10': crop(10, 10), '2': crop(20, 20), '3': None, 'note': crop(5, 5)})
+    assert [tile['mouse_id'] for tile in tiles] == [2, 10]
+
+
+def test_mosaic_layout_uses_a_near_square_grid_of_even_cells():
+    tiles = [{'mouse_id': i, 'crop': crop(101, 51)} for i in range(5)]
+    width, height, positions = mosaic_layout(tiles)
+    assert (width, height) == (3 * 102, 2 * 52)
+    assert positions == [(0, 0), (102, 0), (204, 0), (0, 52), (102, 52)]
+
+
+def test_mosaic_layout_cells_fit_the_largest_crop():
+    tiles = [{'mouse_id': 1, 'crop': crop(40, 30)}, {'mouse_id': 2, 'crop': crop(20, 60)}]
+    width, height, positions = mosaic_layout(tiles)
+    assert (width, height) == (80, 60)
+    assert positions == [(0, 0), (40, 0)]
@@ -0,0 +1,43 @@
+import numpy as np
+from packet_index import frame_at, frame_time, keyframe_before, keyframes_between
+
+
+def make_index():
+    pts = np.array([0.0, 0.04, 0.08, 0.12, 0.2, 0.24, 0.28, 0.32])
+    return {'pts': pts, 'keyframes': np.array([0.0, 0.12, 0.28]), 'duration': 0.36}
+
+
+def test_frame_at_is_first_frame_at_or_after_t():
+    index = make_index()
+    assert frame_at(index, 0.0) == 0
+    assert frame_at(index, 0.08) == 2
+    assert frame_at(index, 0.1) == 3
+    assert frame_at(index, 0.16) == 4
+    assert frame_at(index, 1.0) == 8
+
+
+def test_frame_at_tolerates_rounding_in_times():
+    index = make_index()
+    assert frame_at(index, 0.0800001) == 2
+    assert frame_at(index, 0.0799999) == 2
+
+
+def test_frame_time_clamps_to_last_frame():
+    index = make_index()
+    assert frame_time(index, 4) == 0.2
+    assert frame_time(index, 100) == 0.32
+    assert frame_time(index, -1) == 0.0
+
+
+def test_keyframe_before():
+    index = make_index()
+    assert keyframe_before(index, 0.1) == 0.0
+    assert keyframe_before(index, 0.12) == 0.12
+    assert keyframe_before(index, 0.27) == 0.12
+    assert keyframe_before(index, 5.0) == 0.28
+
+
+def test_keyframes_between_is_inclusive():
+    index = make_index()
+    assert list(keyframes_between(index, 0.12, 0.28)) == [0.12, 0.28]
+    assert list(keyframes_between(index, 0.13, 0.27)) == []
@@ -0,0 +1,46 @@
+import os
+from sessions import session_prefix, natural_key, group_sessions, session_mismatches
+
+
+def test_session_prefix_strips_rollover_counters_and_timestamps():
+    assert session_prefix("/data/cam1_20240101_003000.mp4") == "cam1"
+    assert session_prefix("/data/cam2-0003.avi") == "cam2"
+    assert session_prefix("/data/cam20240101003000.mp4") == "cam"
+
+
+def test_session_prefix_keeps_numbers_without_separator():
+    assert session_prefix("/data/rig7.mp4") == "rig7"
+    assert session_prefix("/data/cam1.mp4") != session_prefix("/data/cam2.mp4")
+
+
+def test_natural_key_orders_numbers_numerically():
+    paths = ["cam_10.mp4", "cam_9.mp4", "cam_1.mp4"]
+    assert sorted(paths, key=natural_key) == ["cam_1.mp4", "cam_9.mp4", "cam_10.mp4"]
+
+
+def test_group_sessions_groups_by_folder_extension_and_prefix():
+    paths = [
+        os.path.join("a", "cam1_10.mp4"), os.path.join("a", "cam1_9.mp4"), os.path.join("a", "cam2_1.mp4"),
+        os.path.join("a", "cam1_1.avi"), os.path.join("b", "cam1_1.mp4"),
+    ]
+    groups = group_sessions(paths)
+    assert sorted(members for _, members in groups) == sorted([
+        [os.path.join("a", "cam1_9.mp4"), os.path.join("a", "cam1_10.mp4")],
+        [os.path.join("a", "cam2_1.mp4")],
+        [os.path.join("a", "cam1_1.avi")],
+        [os.path.join("b", "cam1_1.mp4")],
+    ])
+    assert {name for name, _ in groups} == {"cam1", "cam2"}
+
+
+def stream_info(**changes):
+    return dict({'width': 640, 'height': 480, 'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'fps': 30.0}, **changes)
+
+
+def test_session_mismatches_accepts_matching_files():
+    assert session_mismatches([stream_info(), stream_info(fps=30.001)]) == []
+
+
+def test_session_mismatches_reports_codec_pixel_format_and_frame_rate():
+    mismatches = session_mismatches([stream_info(), stream_info(codec_name='hevc', pix_fmt='yuvj420p', fps=25.0)])
+    assert [text.split(' (')[0] for text in mismatches] == ["codecs", "pixel formats", "frame rates"]
@@ -0,0 +1,58 @@
+import shutil
+import subprocess
+import numpy as np
+import pytest
+import packet_index
+from jobs import build_job
+from smart_cut import plan_smart_cut, run_smart_cut, SMART_CUT_EXTENSION
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")),
+                                  reason="ffmpeg and ffprobe are needed to cut and decode a real video")
+
+
+def make_index(fps=10, seconds=30, gop_seconds=2):
+    pts = np.arange(fps * seconds) / fps
+    return {'pts': pts, 'keyframes': pts[::fps * gop_seconds], 'duration': seconds}
+
+
+def test_plan_splits_into_head_middle_and_tail():
+    index = make_index()
+    plan = plan_smart_cut(index, 3.0, 13.0)
+    assert plan == [('encode', 3.0, 10), ('copy', 4.0, 80), ('encode', 12.0, 10)]
+
+
+def test_plan_frame_counts_cover_the_whole_window():
+    index = make_index()
+    plan = plan_smart_cut(index, 3.3, 13.7)
+    assert sum(frames for _, _, frames in plan) == 104
+
+
+def test_plan_on_keyframes_has_empty_head():
+    index = make_index()
+    plan = plan_smart_cut(index, 4.0, 12.0)
+    assert plan[0] == ('encode', 4.0, 0)
+    assert plan[1] == ('copy', 4.0, 80)
+
+
+def test_plan_is_none_without_a_whole_gop():
+    index = make_index()
+    assert plan_smart_cut(index, 4.5, 7.5) is None
+
+
+@needs_ffmpeg
+def test_smart_cut_bin_decodes_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(packet_index, 'INDEX_DIR', str(tmp_path / "index"))
+    source = str(tmp_path / "source.mp4")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25", "-t", "8",
+                    "-c:v", "libx264", "-g", "25", "-pix_fmt", "yuv420p", source], check=True)
+    output = str(tmp_path / ("bin" + SMART_CUT_EXTENSION))
+    job = build_job(source, output, "Bin 1", start=1.5, duration=4.0, output_kwargs={'vcodec': 'libx264', 'an': None})
+    run_smart_cut(job)
+
+    decode = subprocess.run(["ffmpeg", "-v", "error", "-xerror", "-i", output, "-f", "null", "-"],
+                            capture_output=True, text=True)
+    assert decode.returncode == 0 and not decode.stderr
+    frames = subprocess.run(["ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+                             "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", output],
+                            capture_output=True, text=True, check=True)
+    assert int(frames.stdout.strip()) == 100
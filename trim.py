@@ -1,8 +1,21 @@
 import streamlit as st
 import os
-import ffmpeg
 import math
 import zipfile
+from encoding import render_encoding_options
+from smart_cut import render_smart_cut_option, run_smart_cut, SMART_CUT_EXTENSION
+from jobs import build_job, run_job
+from rig_configs import render_save_rig, rig_config
+from manifest import write_manifest
+from scheduler import render_scheduler_options, run_jobs
+from profiler import phase, count_fs_calls
+from job_pool import render_queue_status
+from staging import render_staging_options, ScratchStager
+from verify import render_failure_report
+from output_cache import render_cache_options, OutputCache
+from packet_index import render_index_option, build_indexes
+from activity import render_activity_options, apply_activity_filter, render_activity_report, SKIP_INACTIVE
+from video_probe import describe_ffmpeg_error, probe_video
 
 def hms_to_seconds(h, m, s):
     return h * 3600 + m * 60 + s
@@ -50,7 +63,7 @@ def trim(temp_file_paths):
             name = os.path.basename(path)
             if name not in st.session_state.video_settings:
                 try:
-                    duration = float(ffmpeg.probe(path)['format']['duration'])
+                    duration = probe_video(path)['duration']
                 except:
                     duration = 86400.0
                 st.session_state.video_settings[name] = {
@@ -147,8 +160,10 @@ def trim(temp_file_paths):
         folder_exists = os.path.exists(output_base_path)
         if folder_exists:
             existing_files = []
-            for root, dirs, files in os.walk(output_base_path):
-                existing_files.extend([f for f in files if f.endswith('.mp4')])
+            with phase("output folder scan"):
+                for root, dirs, files in os.walk(output_base_path):
+                    existing_files.extend([f for f in files if f.endswith(('.mp4', SMART_CUT_EXTENSION))])
+                    count_fs_calls()
             
             if existing_files:
                 st.sidebar.warning(f"Folder exists with {len(existing_files)} files!")
@@ -170,6 +185,16 @@ def trim(temp_file_paths):
         else:
             final_output_path = output_base_path
 
+        with phase("sidebar options"):
+            encoding_options = render_encoding_options("trim")
+            smart_cut = render_smart_cut_option("trim")
+            extension = SMART_CUT_EXTENSION if smart_cut else ".mp4"
+            exact_timing = render_index_option("trim")
+            scheduler_options = render_scheduler_options("trim")
+            staging_options = render_staging_options("trim")
+            cache_options = render_cache_options("trim")
+            activity_options = render_activity_options("trim")
+
         st.sidebar.subheader("File Naming")
         
         if "prefix_settings" not in st.session_state:
@@ -199,7 +224,7 @@ def trim(temp_file_paths):
             if new_prefix != current_prefix:
                 st.session_state.prefix_settings[video_name] = new_prefix
             
-            st.sidebar.caption(f"{new_prefix}_bin_X.mp4 or {new_prefix}_HX.mp4")
+            st.sidebar.caption(f"{new_prefix}_bin_X{extension} or {new_prefix}_HX{extension}")
             
             all_prefixes.append(new_prefix)
         
@@ -223,6 +248,12 @@ def trim(temp_file_paths):
         else:
             naming_strategy = "Fix prefixes manually (recommended)"
 
+        render_save_rig(rig_config(
+            start=hms_to_seconds(start_h, start_m, start_s),
+            bin_duration=hms_to_seconds(chunk_h, chunk_m, chunk_s),
+            encoding=encoding_options
+        ), "trim")
+
         st.sidebar.markdown("---")
         
         st.sidebar.header("3. Process Videos")
@@ -238,6 +269,17 @@ def trim(temp_file_paths):
             
             st.subheader("Trimming Process")
             all_output_files = []
+            jobs = []
+            video_progress = {}
+
+            indexed_durations = {}
+            if exact_timing:
+                with st.spinner("Indexing video packets..."):
+                    for path, index, error in build_indexes(temp_file_paths, scheduler_options['max_workers'], scheduler_options['owner']):
+                        if error is None:
+                            indexed_durations[path] = index['duration']
+                        else:
+                            st.warning(f"Could not index {os.path.basename(path)}, planning bins from its container duration: {error}")
             
             if naming_strategy == "Use continuous bin numbering across all videos":
                 global_bin_counter = 1
@@ -256,9 +298,10 @@ def trim(temp_file_paths):
                         continue
 
                     try:
-                        duration = float(ffmpeg.probe(path)['format']['duration'])
+                        duration = probe_video(path)['duration']
                     except:
                         duration = 86400.0
+                    duration = indexed_durations.get(path, duration)
 
                     if start_time >= duration:
                         st.warning(f"Skipping {name}: start time exceeds duration.")
@@ -269,8 +312,8 @@ def trim(temp_file_paths):
 
                     st.write(f"**{name}**: {num_bins} bins from {seconds_to_hms(start_time)} (prefix: {video_prefix}) [Bins {global_bin_counter}-{global_bin_counter + num_bins - 1}]")
 
-                    video_progress = st.progress(0)
-                    bin_status = st.empty()
+                    video_progress[path] = {'bar': st.progress(0), 'status': st.empty(), 'total': num_bins, 'done': 0, 'failed': 0}
+                    video_progress[path]['status'].info(f"Queued {num_bins} bins")
 
                     for i in range(num_bins):
                         bin_start = start_time + i * bin_duration
@@ -278,27 +321,21 @@ def trim(temp_file_paths):
                         
                         if bin_duration == 3600:  
                             hour_label = int(bin_start // 3600) + 1  
-                            output_name = f"{video_prefix}_H{hour_label}.mp4"
+                            output_name = f"{video_prefix}_H{hour_label}{extension}"
                         else:
-                            output_name = f"{video_prefix}_bin_{global_bin_counter}.mp4"
+                            output_name = f"{video_prefix}_bin_{global_bin_counter}{extension}"
                         
                         output_path = os.path.join(final_output_path, output_name)
 
-                        bin_status.info(f"Bin {global_bin_counter} → {seconds_to_hms(bin_start)} to {seconds_to_hms(bin_end)}")
-
-                        (
-                            ffmpeg
-                            .input(path, ss=bin_start, t=bin_duration)
-                            .output(output_path, vcodec='libx264', an=None)
-                            .overwrite_output()
-                            .run()
-                        )
-
-                        all_output_files.append(output_path)
-                        video_progress.progress((i + 1) / num_bins)
+                        jobs.append(build_job(
+                            path, output_path,
+                            f"Bin {global_bin_counter} → {seconds_to_hms(bin_start)} to {seconds_to_hms(bin_end)}",
+                            start=bin_start, duration=bin_duration,
+                            output_kwargs={'vcodec': 'libx264', 'an': None}, encoding=encoding_options,
+                            bin_index=global_bin_counter
+                        ))
                         global_bin_counter += 1
 
-                    bin_status.success(f"Completed: {name}")
                     st.write("---")
             else:
                 used_filenames = set()
@@ -317,9 +354,10 @@ def trim(temp_file_paths):
                         continue
 
                     try:
-                        duration = float(ffmpeg.probe(path)['format']['duration'])
+                        duration = probe_video(path)['duration']
                     except:
                         duration = 86400.0
+                    duration = indexed_durations.get(path, duration)
 
                     if start_time >= duration:
                         st.warning(f"Skipping {name}: start time exceeds duration.")
@@ -330,8 +368,8 @@ def trim(temp_file_paths):
 
                     st.write(f"**{name}**: {num_bins} bins from {seconds_to_hms(start_time)} (prefix: {video_prefix})")
 
-                    video_progress = st.progress(0)
-                    bin_status = st.empty()
+                    video_progress[path] = {'bar': st.progress(0), 'status': st.empty(), 'total': num_bins, 'done': 0, 'failed': 0}
+                    video_progress[path]['status'].info(f"Queued {num_bins} bins")
 
                     for i in range(num_bins):
                         bin_start = start_time + i * bin_duration
@@ -339,37 +377,102 @@ def trim(temp_file_paths):
                         
                         if bin_duration == 3600:  
                             hour_label = int(bin_start // 3600) + 1  
-                            base_output_name = f"{video_prefix}_H{hour_label}.mp4"
+                            base_output_name = f"{video_prefix}_H{hour_label}{extension}"
                         else:
                             bin_number = i + 1  
-                            base_output_name = f"{video_prefix}_bin_{bin_number}.mp4"
+                            base_output_name = f"{video_prefix}_bin_{bin_number}{extension}"
                         
                         output_name = base_output_name
                         counter = 1
                         while output_name in used_filenames:
                             name_without_ext = os.path.splitext(base_output_name)[0]
-                            output_name = f"{name_without_ext}_{counter}.mp4"
+                            output_name = f"{name_without_ext}_{counter}{extension}"
                             counter += 1
                         
                         used_filenames.add(output_name)
                         output_path = os.path.join(final_output_path, output_name)
 
-                        bin_status.info(f"Bin {i+1}/{num_bins} → {seconds_to_hms(bin_start)} to {seconds_to_hms(bin_end)}")
+                        jobs.append(build_job(
+                            path, output_path,
+                            f"Bin {i+1}/{num_bins} → {seconds_to_hms(bin_start)} to {seconds_to_hms(bin_end)}",
+                            start=bin_start, duration=bin_duration,
+                            output_kwargs={'vcodec': 'libx264', 'an': None}, encoding=encoding_options,
+                            bin_index=i + 1
+                        ))
 
-                        (
-                            ffmpeg
-                            .input(path, ss=bin_start, t=bin_duration)
-                            .output(output_path, vcodec='libx264', an=None)
-                            .overwrite_output()
-                            .run()
-                        )
-
-                        all_output_files.append(output_path)
-                        video_progress.progress((i + 1) / num_bins)
-
-                    bin_status.success(f"Completed: {name}")
                     st.write("---")
 
+            if activity_options and jobs:
+                all_jobs = jobs
+                with st.spinner("Measuring activity in each source..."):
+                    jobs, inactive_jobs, activity_errors = apply_activity_filter(
+                        all_jobs, activity_options, scheduler_options['max_workers'], scheduler_options['owner'])
+                render_activity_report(all_jobs, inactive_jobs, activity_errors, activity_options)
+                if activity_options['action'] == SKIP_INACTIVE:
+                    for job in inactive_jobs:
+                        progress = video_progress[job['source']]
+                        progress['total'] -= 1
+                        if progress['total'] == 0:
+                            progress['bar'].progress(1.0)
+                            progress['status'].info(f"All bins of {os.path.basename(job['source'])} are inactive - skipped")
+
+            encode = run_smart_cut if smart_cut else run_job
+            cache = OutputCache(**cache_options) if cache_options else None
+            reused_jobs = []
+            if cache and jobs:
+                jobs, reused_jobs = cache.reuse(jobs, encode.__name__)
+                for job in reused_jobs:
+                    all_output_files.append(job['output'])
+                    progress = video_progress[job['source']]
+                    progress['done'] += 1
+                    progress['bar'].progress(progress['done'] / progress['total'])
+                    progress['status'].info(f"Reused {job['label']} from the output cache")
+                if reused_jobs:
+                    st.info(f"{len(reused_jobs)} outputs reused from the output cache")
+
+            stager = ScratchStager(jobs, run=encode, **staging_options) if staging_options else None
+            queue_status = st.empty()
+            on_wait = lambda: render_queue_status(queue_status, scheduler_options['owner'])
+            failures = []
+            for job, error in run_jobs(jobs, run=stager.run if stager else encode, on_wait=on_wait,
+                                       wait_published=stager.wait_published if stager else None,
+                                       job_done=stager.job_done if stager else None, **scheduler_options):
+                progress = video_progress[job['source']]
+                progress['done'] += 1
+                progress['bar'].progress(progress['done'] / progress['total'])
+                name = os.path.basename(job['source'])
+                if error is None:
+                    all_output_files.append(job['output'])
+                    progress['status'].info(f"{name}: {job['label']} done")
+                else:
+                    progress['failed'] += 1
+                    failures.append((job, error))
+                    st.error(f"Error trimming {name} ({job['label']}): {describe_ffmpeg_error(error)}")
+                if progress['done'] == progress['total']:
+                    if progress['failed']:
+                        progress['status'].warning(f"Completed: {name} - {progress['failed']} of {progress['total']} bins failed")
+                    else:
+                        progress['status'].success(f"Completed: {name}")
+            queue_status.empty()
+
+            if stager:
+                jobs_by_output = {job['output']: job for job in jobs}
+                for output_path, error in stager.finish():
+                    if output_path in all_output_files:
+                        all_output_files.remove(output_path)
+                        failures.append((jobs_by_output[output_path], error))
+                    st.error(f"Error moving {os.path.basename(output_path)} to the output folder: {error}")
+            render_failure_report(failures)
+
+            if cache:
+                finished = set(all_output_files)
+                cache.store_outputs([job for job in jobs if job['output'] in finished])
+
+            if all_output_files:
+                jobs_by_output = {job['output']: job for job in jobs + reused_jobs}
+                manifest_path = write_manifest([jobs_by_output[f] for f in all_output_files], final_output_path)
+                st.info(f"Run manifest written to: {manifest_path}")
+
             total_size_mb = sum(os.path.getsize(f) for f in all_output_files) / (1024 * 1024)
             if total_size_mb >= ZIP_THRESHOLD_MB:
                 zip_name = os.path.basename(os.path.normpath(final_output_path)) + ".zip"
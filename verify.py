@@ -0,0 +1,99 @@
+import os
+import json
+import ffmpeg
+import streamlit as st
+from functools import lru_cache
+from video_probe import probe_video, describe_ffmpeg_error
+
+DURATION_TOLERANCE_SECONDS = 0.5
+DURATION_TOLERANCE_FRACTION = 0.01
+TAIL_SECONDS = 5
+
+
+class VerificationError(Exception):
+    """An output was written but is missing, truncated or does not decode"""
+
+
+@lru_cache(maxsize=256)
+def _source_duration(path, size, mtime_ns):
+    return probe_video(path)['duration']
+
+
+def source_duration(path):
+    """Duration of a job's source, probed once per version of the file"""
+    stat = os.stat(path)
+    return _source_duration(path, stat.st_size, stat.st_mtime_ns)
+
+
+def planned_duration(job):
+    """Seconds of video a job should have written, allowing for bins that run past the end of the source"""
+    start = job['start'] or 0
+    end = source_duration(job['source'])
+    if job['duration'] is not None:
+        end = min(end, start + job['duration'])
+    return max(0.0, end - start)
+
+
+def verify_tail(path):
+    """Decode the last few seconds of a video, which fails for outputs cut off mid-GOP"""
+    try:
+        (ffmpeg.input(path, sseof=-TAIL_SECONDS)
+         .output('-', format='null')
+         .global_args('-hide_banner', '-v', 'error', '-xerror')
+         .run(quiet=True))
+    except ffmpeg.Error as e:
+        lines = [line for line in (e.stderr or b'').decode(errors='replace').splitlines() if line.strip()]
+        raise VerificationError(f"last {TAIL_SECONDS} s do not decode: {lines[0] if lines else e}")
+
+
+def check_output(job):
+    output = job['output']
+    if not os.path.exists(output):
+        raise VerificationError("output file is missing")
+    if os.path.getsize(output) == 0:
+        raise VerificationError("output file is empty")
+    if job['export']:
+        try:
+            with open(output) as f:
+                json.load(f)
+        except ValueError:
+            raise VerificationError("frame export index is truncated")
+        return
+
+    try:
+        info = probe_video(output)
+    except ffmpeg.Error:
+        raise VerificationError("output cannot be opened")
+    except (ValueError, KeyError):
+        raise VerificationError("output has no readable video stream")
+    expected = planned_duration(job)
+    tolerance = max(DURATION_TOLERANCE_SECONDS, expected * DURATION_TOLERANCE_FRACTION)
+    if abs(info['duration'] - expected) > tolerance:
+        raise VerificationError(f"output is {info['duration']:.2f} s long, expected {expected:.2f} s")
+    verify_tail(output)
+
+
+def verify_output(job):
+    """Check that a finished job's output exists, has a video stream of the planned length and decodes to the end.
+
+    A failed output is deleted, so a retry starts clean and no corrupt file is
+    left behind. Raises VerificationError.
+    """
+    try:
+        check_output(job)
+    except VerificationError:
+        if os.path.exists(job['output']):
+            os.remove(job['output'])
+        raise
+
+
+def render_failure_report(failures):
+    """Table of the jobs that still failed after their retries; failures are (job, error) pairs"""
+    if not failures:
+        return
+    st.error(f"{len(failures)} outputs failed and were not written")
+    st.dataframe([
+        {'source': os.path.basename(job['source']), 'job': job['label'], 'output': os.path.basename(job['output']),
+         'attempts': job.get('attempts'), 'error': describe_ffmpeg_error(error)}
+        for job, error in failures
+    ], use_container_width=True, hide_index=True)
@@ -0,0 +1,182 @@
+import os
+import time
+import ffmpeg
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from profiler import phase
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v'}
+SESSION_EXTENSION = '.ffconcat'
+PROBE_WORKERS = 8
+TABLE_REFRESH_SECONDS = 0.5
+
+
+def is_session(path):
+    """True for a concat list that plays several recording files back to back"""
+    return path.lower().endswith(SESSION_EXTENSION)
+
+
+def source_input_kwargs(path):
+    """Input options ffmpeg and ffprobe need to read a source; sessions go through the concat demuxer"""
+    return {'f': 'concat', 'safe': 0} if is_session(path) else {}
+
+
+def session_members(path):
+    """[(file, duration)] of a session, in playback order"""
+    members = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("file "):
+                members.append([line[5:].strip()[1:-1].replace("'\\''", "'"), None])
+            elif line.startswith("duration ") and members:
+                members[-1][1] = float(line[9:])
+    return [tuple(member) for member in members]
+
+
+def probe_video(path):
+    """Probe duration, resolution, frame rate and pixel format of a single video file"""
+    info = ffmpeg.probe(path, **source_input_kwargs(path))
+    video_stream = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), None)
+    if video_stream is None:
+        raise ValueError("No video stream found")
+    return {
+        'duration': float(info['format']['duration']),
+        'width': int(video_stream['width']),
+        'height': int(video_stream['height']),
+        'fps': parse_frame_rate(video_stream.get('avg_frame_rate')) or parse_frame_rate(video_stream.get('r_frame_rate')),
+        'codec_name': video_stream.get('codec_name', ''),
+        'pix_fmt': video_stream.get('pix_fmt', ''),
+    }
+
+
+def parse_frame_rate(rate):
+    """Frame rate from an ffprobe ratio such as '30000/1001'; None when unknown"""
+    try:
+        num, den = (float(part) for part in str(rate).split('/'))
+        return num / den if num and den else None
+    except ValueError:
+        return None
+
+
+def describe_ffmpeg_error(error):
+    """Short, human readable message for a failed ffmpeg call"""
+    if isinstance(error, ffmpeg.Error) and error.stderr:
+        lines = [line for line in error.stderr.decode(errors='replace').splitlines() if line.strip()]
+        if lines:
+            return lines[-1]
+    return str(error) or type(error).__name__
+
+
+def probe_videos(paths, max_workers=PROBE_WORKERS):
+    """Probe videos on a bounded thread pool, yielding (path, info, error) as each one finishes"""
+    if not paths:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        futures = {executor.submit(probe_video, path): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, describe_ffmpeg_error(e)
+
+
+def init_probe_state():
+    for state_key in ['video_durations', 'video_resolutions', 'probe_errors', 'probe_error_identities']:
+        if state_key not in st.session_state:
+            st.session_state[state_key] = {}
+
+
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def needs_probe(path):
+    """True if a file has no probe result, or failed to probe and has changed since (e.g. it was still being copied)"""
+    file_name = os.path.basename(path)
+    if file_name in st.session_state.video_durations:
+        return False
+    if file_name not in st.session_state.probe_errors:
+        return True
+    if st.session_state.probe_error_identities.get(file_name) == file_identity(path):
+        return False
+    st.session_state.probe_errors.pop(file_name)
+    return True
+
+
+def store_probe_result(path, info, error):
+    file_name = os.path.basename(path)
+    if error is not None:
+        st.session_state.probe_errors[file_name] = error
+        st.session_state.probe_error_identities[file_name] = file_identity(path)
+        return
+    st.session_state.probe_errors.pop(file_name, None)
+    st.session_state.video_durations[file_name] = info['duration']
+    st.session_state.video_resolutions[file_name] = (info['width'], info['height'])
+
+
+def probe_columns(file_name):
+    """Duration, Resolution and Status cells for the file info table"""
+    if file_name in st.session_state.probe_errors:
+        return {"Duration": "Unknown", "Resolution": "Unknown",
+                "Status": f"Error: {st.session_state.probe_errors[file_name]}"}
+    if file_name not in st.session_state.video_durations:
+        return {"Duration": "…", "Resolution": "…", "Status": "Probing..."}
+    resolution = st.session_state.video_resolutions.get(file_name)
+    return {
+        "Duration": f"{st.session_state.video_durations[file_name]:.1f}s",
+        "Resolution": f"{resolution[0]}x{resolution[1]}" if resolution else "Unknown",
+        "Status": "OK",
+    }
+
+
+def file_size_mb(path):
+    try:
+        if is_session(path):
+            return sum(os.path.getsize(member) for member, _ in session_members(path)) / (1024 * 1024)
+        return os.path.getsize(path) / (1024 * 1024)
+    except OSError:
+        return 0
+
+
+def render_probed_table(paths, build_row):
+    """Render the file table at once and fill in probe results as they arrive"""
+    init_probe_state()
+    with phase("table render"):
+        placeholder = st.empty()
+        rows = {path: build_row(path) for path in paths}
+        placeholder.dataframe(list(rows.values()), use_container_width=True, hide_index=True)
+
+    pending = [path for path in paths if needs_probe(path)]
+    last_refresh = time.monotonic()
+    with phase("probe"):
+        for path, info, error in probe_videos(pending):
+            store_probe_result(path, info, error)
+            rows[path] = build_row(path)
+            if time.monotonic() - last_refresh >= TABLE_REFRESH_SECONDS:
+                placeholder.dataframe(list(rows.values()), use_container_width=True, hide_index=True)
+                last_refresh = time.monotonic()
+
+    if pending:
+        placeholder.dataframe(list(rows.values()), use_container_width=True, hide_index=True)
+
+
+def probe_written_duration(path, from_time=0.0):
+    """End time of the last video packet in a file that may still be growing, scanning packets from from_time on"""
+    info = ffmpeg.probe(path, select_streams='v:0', show_entries='packet=pts_time,duration_time',
+                        read_intervals=f"{max(0.0, from_time)}%")
+    written = 0.0
+    for packet in info.get('packets', []):
+        try:
+            written = max(written, float(packet['pts_time']) + float(packet.get('duration_time', 0) or 0))
+        except (KeyError, ValueError):
+            continue
+    if written == 0.0:
+        written = float(info.get('format', {}).get('duration', 0) or 0)
+    return written
+
@@ -0,0 +1,366 @@
+import os
+import json
+import queue
+import threading
+import time
+import streamlit as st
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileSystemEventHandler
+from rig_configs import list_rigs, load_rig, plan_rig_jobs
+from scheduler import render_scheduler_options, run_jobs
+from manifest import write_manifest
+from video_probe import VIDEO_EXTENSIONS, probe_video, probe_written_duration, describe_ffmpeg_error
+
+DEFAULT_STABLE_SECONDS = 30
+POLL_SECONDS = 2
+LEDGER_NAME = ".tailor_mouse_watch.json"
+GROWABLE_EXTENSIONS = {'.mp4', '.mkv', '.mov'}
+DEFAULT_FOLLOW_INTERVAL = 300
+FOLLOW_SAFETY_SECONDS = 10
+
+
+class RecordingHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+    def on_closed(self, event):
+        self.watcher.touch(event.src_path, closed=True)
+
+
+class FolderWatcher:
+    """Watches a directory and processes each new recording with a saved rig configuration once it stops growing.
+
+    With follow_growing, bins of recordings that are still being written
+    (fragmented MP4/MKV) are produced as soon as their window is complete,
+    and the final pass only encodes what is left. With polling, the folder
+    is rescanned every few seconds instead of relying on kernel
+    notifications, which never arrive for files written to an NFS/SMB share
+    by other machines.
+    """
+
+    def __init__(self, directory, rig_name, output_dir, stable_seconds=DEFAULT_STABLE_SECONDS, scheduler_options=None,
+                 follow_growing=False, follow_interval=DEFAULT_FOLLOW_INTERVAL, polling=True):
+        self.directory = os.path.abspath(directory)
+        self.rig_name = rig_name
+        self.rig = load_rig(rig_name)
+        self.output_dir = os.path.abspath(output_dir)
+        self.stable_seconds = stable_seconds
+        self.scheduler_options = dict(scheduler_options or {}, owner=f"watch:{self.directory}")
+        self.follow_growing = follow_growing and self.rig.get('bin_duration', 0) > 0
+        self.follow_interval = follow_interval
+        self.lock = threading.Lock()
+        self.recordings = {}
+        self.manifest_status = ""
+        self.ready = queue.Queue()
+        self.stop_event = threading.Event()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.ledger_path = os.path.join(self.output_dir, LEDGER_NAME)
+        self.ledger = self._load_ledger()
+
+        self.observer = PollingObserver(timeout=POLL_SECONDS) if polling else Observer()
+        self.observer.schedule(RecordingHandler(self), self.directory, recursive=True)
+        self.threads = [
+            threading.Thread(target=self._check_stability, daemon=True),
+            threading.Thread(target=self._process_ready, daemon=True),
+        ]
+
+    def _load_ledger(self):
+        """{recording: {'fingerprint', 'outputs'}}; ledgers written before growing recordings were followed held only fingerprints"""
+        try:
+            with open(self.ledger_path) as f:
+                ledger = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(ledger, dict):
+            return {}
+        return {path: entry if isinstance(entry, dict) else {'fingerprint': entry, 'outputs': []}
+                for path, entry in ledger.items()}
+
+    def _ledger_entry(self, path):
+        return self.ledger.setdefault(path, {'fingerprint': None, 'outputs': []})
+
+    def _save_ledger(self):
+        with open(self.ledger_path + ".tmp", 'w') as f:
+            json.dump(self.ledger, f, indent=2)
+        os.replace(self.ledger_path + ".tmp", self.ledger_path)
+
+    def start(self, include_existing=False):
+        self.observer.start()
+        for thread in self.threads:
+            thread.start()
+        if include_existing:
+            for root, dirs, files in os.walk(self.directory):
+                for f in files:
+                    self.touch(os.path.join(root, f))
+
+    def stop(self):
+        self.stop_event.set()
+        self.observer.stop()
+        self.observer.join()
+        self.ready.put(None)
+
+    def is_running(self):
+        return not self.stop_event.is_set()
+
+    def touch(self, path, closed=False):
+        """Register activity on a file; it is processed after its size has been stable long enough"""
+        path = os.path.abspath(path)
+        if os.path.splitext(path)[1].lower() not in VIDEO_EXTENSIONS:
+            return
+        if path.startswith(self.output_dir + os.sep) or os.path.basename(path).startswith('.'):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+
+        fingerprint = [stat.st_size, stat.st_mtime]
+        with self.lock:
+            if self.ledger.get(path, {}).get('fingerprint') == fingerprint:
+                return
+            recording = self.recordings.get(path)
+            if recording is None or (recording['state'] in ('done', 'failed') and recording['fingerprint'] != fingerprint):
+                recording = {'state': 'waiting', 'detail': "", 'fingerprint': None, 'stable_since': time.monotonic(),
+                             'closed': False, 'busy': False, 'last_follow': time.monotonic(), 'written': 0.0}
+                self.recordings[path] = recording
+            if recording['state'] == 'waiting':
+                recording['closed'] = recording['closed'] or closed
+
+    def _check_stability(self):
+        while not self.stop_event.wait(POLL_SECONDS):
+            now = time.monotonic()
+            with self.lock:
+                waiting = [(path, rec) for path, rec in self.recordings.items() if rec['state'] == 'waiting']
+            for path, recording in waiting:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    with self.lock:
+                        self.recordings.pop(path, None)
+                    continue
+                fingerprint = [stat.st_size, stat.st_mtime]
+                with self.lock:
+                    if recording['busy']:
+                        continue
+                    if fingerprint != recording['fingerprint']:
+                        recording['fingerprint'] = fingerprint
+                        recording['stable_since'] = now
+                        if not recording['detail'].startswith("Following"):
+                            recording['detail'] = f"{stat.st_size / (1024**2):.1f} MB, still being written"
+                        if (self.follow_growing and os.path.splitext(path)[1].lower() in GROWABLE_EXTENSIONS
+                                and now - recording['last_follow'] >= self.follow_interval):
+                            recording['busy'] = True
+                            self.ready.put((path, False))
+                        continue
+                    stable_for = now - recording['stable_since']
+                    if stat.st_size > 0 and (stable_for >= self.stable_seconds or (recording['closed'] and stable_for >= POLL_SECONDS)):
+                        recording['state'] = 'queued'
+                        recording['detail'] = ""
+                        self.ready.put((path, True))
+
+    def _process_ready(self):
+        while True:
+            item = self.ready.get()
+            if item is None:
+                return
+            batch = [item]
+            while not self.ready.empty():
+                next_item = self.ready.get()
+                if next_item is None:
+                    self.ready.put(None)
+                    break
+                batch.append(next_item)
+            self._process_batch(batch)
+
+    def _set_state(self, path, state, detail=""):
+        with self.lock:
+            self.recordings[path]['state'] = state
+            self.recordings[path]['detail'] = detail
+
+    def _plan_growing(self, path):
+        """Jobs for bins of a growing recording whose whole window has already been written"""
+        with self.lock:
+            known = self.recordings[path]['written']
+        written = probe_written_duration(path, known - FOLLOW_SAFETY_SECONDS)
+        with self.lock:
+            recording = self.recordings[path]
+            recording['written'] = max(recording['written'], written)
+            complete_until = recording['written'] - FOLLOW_SAFETY_SECONDS
+        bin_duration = self.rig['bin_duration']
+        return [job for job in plan_rig_jobs(path, complete_until, self.rig, self.output_dir) if job['duration'] == bin_duration]
+
+    def _finish_following(self, path, detail):
+        with self.lock:
+            recording = self.recordings[path]
+            recording['busy'] = False
+            recording['last_follow'] = time.monotonic()
+            recording['detail'] = detail
+
+    def _process_batch(self, items):
+        jobs = []
+        for path, final in items:
+            with self.lock:
+                produced = set(self._ledger_entry(path)['outputs'])
+            try:
+                if final:
+                    recording_jobs = plan_rig_jobs(path, probe_video(path)['duration'], self.rig, self.output_dir)
+                else:
+                    recording_jobs = self._plan_growing(path)
+            except Exception as e:
+                if final:
+                    self._set_state(path, 'failed', f"Probe failed: {describe_ffmpeg_error(e)}")
+                else:
+                    self._finish_following(path, f"Following: could not read written length ({describe_ffmpeg_error(e)})")
+                continue
+
+            recording_jobs = [job for job in recording_jobs if os.path.basename(job['output']) not in produced]
+            if not recording_jobs:
+                if final and not produced:
+                    self._set_state(path, 'failed', "Start time exceeds duration")
+                elif final:
+                    self._complete(path)
+                else:
+                    self._finish_following(path, f"Following: {len(produced)} outputs produced while recording")
+                continue
+            with self.lock:
+                self.recordings[path].update({'state': 'processing' if final else 'waiting', 'final': final,
+                                              'total': len(recording_jobs), 'done': 0, 'errors': []})
+            jobs.extend(recording_jobs)
+
+        finished_jobs = []
+        for job, error in run_jobs(jobs, **self.scheduler_options):
+            path = job['source']
+            with self.lock:
+                recording = self.recordings[path]
+                recording['done'] += 1
+                if error is None:
+                    finished_jobs.append(job)
+                    self._ledger_entry(path)['outputs'].append(os.path.basename(job['output']))
+                    self._save_ledger()
+                else:
+                    recording['errors'].append(f"{job['label']}: {describe_ffmpeg_error(error)}")
+                recording['detail'] = f"{recording['done']}/{recording['total']} outputs"
+                finished = recording['done'] == recording['total']
+            if not finished:
+                continue
+            if not recording['final']:
+                with self.lock:
+                    produced = len(self._ledger_entry(path)['outputs'])
+                self._finish_following(path, f"Following: {produced} outputs produced while recording")
+            elif recording['errors']:
+                self._set_state(path, 'failed', "; ".join(recording['errors']))
+            else:
+                self._complete(path)
+
+        if finished_jobs:
+            self._write_manifest(finished_jobs)
+
+    def _write_manifest(self, jobs):
+        """Record a batch's outputs in a run manifest, as the Crop and Trim pages do for each run"""
+        try:
+            manifest_path = write_manifest(jobs, self.output_dir)
+        except Exception as e:
+            status = f"Could not write the run manifest: {e}"
+        else:
+            status = f"Last run manifest: {manifest_path}"
+        with self.lock:
+            self.manifest_status = status
+
+    def _complete(self, path):
+        with self.lock:
+            entry = self._ledger_entry(path)
+            entry['fingerprint'] = self.recordings[path]['fingerprint']
+            self._save_ledger()
+        self._set_state(path, 'done', f"{len(entry['outputs'])} outputs")
+
+    def status_rows(self):
+        with self.lock:
+            return [
+                {"Recording": os.path.relpath(path, self.directory), "State": rec['state'], "Detail": rec['detail']}
+                for path, rec in sorted(self.recordings.items())
+            ]
+
+
+@st.cache_resource
+def watcher_registry():
+    """Watchers shared by all sessions of this server, keyed by watched directory"""
+    return {}
+
+
+def render_watch_folder(directory):
+    """Page for starting, monitoring and stopping a folder watcher"""
+    registry = watcher_registry()
+    watch_dir = os.path.abspath(directory) if directory else ""
+    watcher = registry.get(watch_dir)
+    if watcher is not None and not watcher.is_running():
+        registry.pop(watch_dir)
+        watcher = None
+
+    if watcher is None:
+        rigs = list_rigs()
+        if not rigs:
+            st.info("Save a rig configuration from the Crop, Trim or Crop and Trim page first")
+            return
+        if not os.path.isdir(watch_dir):
+            st.warning("Enter an existing directory to watch")
+            return
+
+        rig_name = st.selectbox("Rig configuration", rigs)
+        output_dir = st.text_input("Full output folder path", os.path.join(os.path.expanduser("~"), "Videos", "Watched"))
+        stable_seconds = st.number_input("Seconds a file must stop growing before processing", 1, 3600,
+                                         DEFAULT_STABLE_SECONDS, format="%d")
+        include_existing = st.checkbox("Also process recordings already in the folder", value=False)
+        follow_growing = st.checkbox(
+            "Produce bins while recordings are still being written", value=False,
+            help="For fragmented MP4/MKV recordings and rigs with a bin duration: each bin is encoded once its whole window has been written"
+        )
+        follow_interval = DEFAULT_FOLLOW_INTERVAL
+        if follow_growing:
+            follow_interval = st.number_input("Seconds between checks of growing recordings", 10, 3600,
+                                              DEFAULT_FOLLOW_INTERVAL, format="%d")
+        polling = st.checkbox(
+            "Folder is on a network share", value=True,
+            help="Rescan the folder every few seconds. Needed for NFS/SMB shares written by other machines, whose changes the local kernel never reports"
+        )
+        scheduler_options = render_scheduler_options("watch")
+
+        if st.button("Start Watching", type="primary"):
+            watcher = FolderWatcher(watch_dir, rig_name, output_dir, int(stable_seconds), scheduler_options,
+                                    follow_growing, int(follow_interval), polling)
+            watcher.start(include_existing)
+            registry[watch_dir] = watcher
+            st.rerun()
+        return
+
+    st.success(f"Watching `{watcher.directory}` with rig **{watcher.rig_name}** → `{watcher.output_dir}`")
+    col_refresh, col_stop = st.columns([1, 1])
+    with col_refresh:
+        if st.button("Refresh Status"):
+            st.rerun()
+    with col_stop:
+        if st.button("Stop Watching"):
+            watcher.stop()
+            registry.pop(watch_dir, None)
+            st.rerun()
+
+    rows = watcher.status_rows()
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("No new recordings detected yet")
+    if watcher.manifest_status:
+        st.caption(watcher.manifest_status)